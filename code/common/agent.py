@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Test agent for the sec, insec and python-processor containers.
+
+Started once per container (by its configure script, or on demand by
+tests/agent_client.py), it listens on a Unix socket and answers one JSON
+object per line with one JSON line. Benchmarks drive senders, receivers
+and the processor through it instead of a `docker exec` per run:
+
+  {"cmd": "ping"}
+  {"cmd": "start", "name": "rx", "argv": [...], "env": {...}, "ready": "regex", "timeout": 30}
+        start a component; returns once a line of its output matches
+        `ready` (at once without it), with the seconds that took
+  {"cmd": "wait", "name": "rx", "timeout": 60}    wait for it to exit → rc, output
+  {"cmd": "stop", "name": "rx", "timeout": 10}    SIGTERM, SIGKILL after timeout → rc, output
+  {"cmd": "status"}                               components and their state
+  {"cmd": "exec", "argv": [...], "timeout": 30}   run to completion → rc, output
+  {"cmd": "call", "path": "/code/sec/covert_sender.py", "func": "...", "kwargs": {...}}
+        call a function in the agent's own, already warm interpreter;
+        returns its result, what it printed and the seconds spent in the
+        call itself
+
+Every reply has "ok" (with "error" when false) and "agent_s", the time
+the agent spent on the request.
+
+`agent.py --attach` relays stdin/stdout to the running agent, so the
+host keeps one `docker exec -i` session open for a whole sweep.
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import contextlib
+import subprocess
+import socketserver
+import importlib.util
+
+SOCKET_PATH = os.getenv("AGENT_SOCKET", "/tmp/middlebox-agent.sock")
+
+
+class Component:
+    """A subprocess started by the agent; a reader thread collects its output."""
+
+    def __init__(self, argv, env=None, cwd=None, ready=None):
+        self.proc = subprocess.Popen(
+            argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, cwd=cwd, start_new_session=True,
+            env=dict(os.environ, PYTHONUNBUFFERED="1", **(env or {})))
+        self.started = time.monotonic()
+        self.lines = []
+        self.pattern = re.compile(ready) if ready else None
+        self.matched = self.pattern is None
+        self.ready = threading.Event()
+        if self.matched:
+            self.ready.set()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.append(line)
+            if not self.matched and self.pattern.search(line):
+                self.matched = True
+                self.ready.set()
+        self.ready.set()  # exited: wake a start() still waiting
+
+    def running(self):
+        return self.proc.poll() is None
+
+    def signal(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def finish(self):
+        """Exit code and full output; only after the process exited."""
+        self.reader.join(timeout=1)
+        return {"rc": self.proc.returncode, "output": "".join(self.lines),
+                "runtime_s": round(time.monotonic() - self.started, 6)}
+
+
+class Agent:
+    def __init__(self):
+        self.components = {}
+        self.modules = {}
+        self.lock = threading.Lock()       # components
+        self.call_lock = threading.Lock()  # stdout redirection is process-wide
+
+    def handle(self, req):
+        start = time.perf_counter()
+        fn = getattr(self, f"cmd_{req.get('cmd')}", None)
+        if fn is None:
+            reply = {"ok": False, "error": f"unknown command {req.get('cmd')!r}"}
+        else:
+            try:
+                reply = fn(**{k: v for k, v in req.items() if k != "cmd"})
+                reply.setdefault("ok", True)
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        reply["agent_s"] = round(time.perf_counter() - start, 6)
+        return reply
+
+    def cmd_ping(self):
+        return {"host": socket.gethostname(), "pid": os.getpid()}
+
+    def cmd_status(self):
+        with self.lock:
+            return {"components": {name: {"pid": c.proc.pid, "running": c.running(),
+                                          "ready": c.matched, "rc": c.proc.returncode}
+                                   for name, c in self.components.items()}}
+
+    def cmd_start(self, name, argv, env=None, cwd=None, ready=None, timeout=30):
+        with self.lock:
+            old = self.components.pop(name, None)
+        if old is not None and old.running():
+            self._stop(old, 10)
+        comp = Component(argv, env, cwd, ready)
+        with self.lock:
+            self.components[name] = comp
+        comp.ready.wait(timeout)
+        if not comp.matched:
+            if comp.running():
+                self._stop(comp, 5)
+                return {"ok": False, "error": f"{name} not ready after {timeout}s", **comp.finish()}
+            comp.proc.wait()
+            return {"ok": False, "error": f"{name} exited before it was ready", **comp.finish()}
+        return {"pid": comp.proc.pid, "ready_s": round(time.monotonic() - comp.started, 6)}
+
+    def cmd_wait(self, name, timeout=None):
+        comp = self._get(name)
+        try:
+            comp.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return {"ok": False, "error": f"{name} still running after {timeout}s"}
+        return comp.finish()
+
+    def cmd_stop(self, name, timeout=10):
+        comp = self._get(name)
+        self._stop(comp, timeout)
+        return comp.finish()
+
+    def cmd_exec(self, argv, env=None, timeout=30):
+        res = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                             env=dict(os.environ, **(env or {})), timeout=timeout)
+        return {"rc": res.returncode, "output": res.stdout}
+
+    def cmd_call(self, path, func, args=(), kwargs=None):
+        module = self.modules.get(path)
+        if module is None:
+            spec = importlib.util.spec_from_file_location(
+                os.path.splitext(os.path.basename(path))[0], path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self.modules[path] = module
+        fn = getattr(module, func)
+        out = io.StringIO()
+        with self.call_lock, contextlib.redirect_stdout(out):
+            start = time.perf_counter()
+            result = fn(*args, **(kwargs or {}))
+            elapsed = time.perf_counter() - start
+        return {"result": result, "output": out.getvalue(), "elapsed_s": elapsed}
+
+    def _get(self, name):
+        with self.lock:
+            if name not in self.components:
+                raise KeyError(f"no component {name!r}")
+            return self.components[name]
+
+    def _stop(self, comp, timeout):
+        if comp.running():
+            comp.signal(signal.SIGTERM)
+            try:
+                comp.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                comp.signal(signal.SIGKILL)
+                comp.proc.wait()
+
+    def shutdown(self):
+        with self.lock:
+            comps = list(self.components.values())
+        for comp in comps:
+            self._stop(comp, 5)
+
+
+class Session(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                reply = self.server.agent.handle(json.loads(line))
+            except ValueError as e:
+                reply = {"ok": False, "error": f"bad request: {e}"}
+            self.wfile.write((json.dumps(reply, default=list) + "\n").encode())
+
+
+def serve(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.ThreadingUnixStreamServer(path, Session)
+    server.daemon_threads = True
+    server.agent = Agent()
+
+    def on_term(_sig, _frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, on_term)
+    print(f"[Agent] listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.agent.shutdown()
+        server.server_close()
+        os.unlink(path)
+
+
+def attach(path):
+    """Relay stdin to the agent and its replies to stdout."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError as e:
+        print(f"[Agent] not running at {path}: {e}", file=sys.stderr)
+        return 1
+
+    def replies():
+        for line in sock.makefile("rb"):
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+        os._exit(0)
+    threading.Thread(target=replies, daemon=True).start()
+    for line in sys.stdin.buffer:
+        sock.sendall(line)
+    sock.shutdown(socket.SHUT_WR)
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test agent for the middlebox containers")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket to listen on / attach to")
+    parser.add_argument("--attach", action="store_true",
+                        help="relay stdin/stdout to the running agent")
+    args = parser.parse_args()
+    sys.exit(attach(args.socket) if args.attach else serve(args.socket))
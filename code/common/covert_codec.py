@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Encodings for the IP ID covert channel, shared by code/sec/covert_sender.py
+and code/insec/covert_receiver.py (mounted at /code/common in both).
+
+An encoder turns a message into packets, each a (ip_id, icmp_id,
+icmp_seq) triple: the IP ID carries the data, the ICMP echo identifier
+and sequence number carry framing. The sequence number is the packet's
+index (mod 2^16) with every codec, so captures can be matched against
+the sender's manifest. A decoder is fed the same triples in arrival
+order.
+
+  ascii   one character per packet, IP ID = its code (the original
+          channel); the receiver keeps only 32..126
+  raw16   two message bytes per IP ID, decoded in arrival order; no
+          framing, so a lost packet shifts everything after it. The ICMP
+          identifier only carries FLAG_ZERO
+  framed  two message bytes per IP ID; every message starts with a
+          length word. The ICMP sequence number places each packet, so
+          losses and reordering are detected. The ICMP identifier holds
+          flags and the FEC group size. With fec=G, each G data packets
+          are followed by an XOR parity packet that repairs one loss in
+          the group.
+
+No raw16 or framed packet has IP ID 0: with IP_HDRINCL the kernel fills
+in its own IP ID when it is 0, so a zero word (two NUL bytes, the
+length of an empty message, a parity word) is sent as ZERO_STANDIN with
+FLAG_ZERO set in the ICMP identifier, and the decoders turn it back into
+0. An ascii NUL is sent as IP ID 0; the receiver drops it either way.
+
+score() counts the correctly decoded bits against the message that was
+sent; divided by the capture time it gives the channel's goodput.
+"""
+
+CODECS = ("ascii", "raw16", "framed")
+
+# ICMP identifier of framed packets: FEC group size << 8 | flags
+FLAG_FIRST = 0x01   # length word starting a message
+FLAG_PARITY = 0x02  # XOR of the group's data words
+FLAG_ZERO = 0x04    # the word is 0; the IP ID holds ZERO_STANDIN (raw16 too)
+ZERO_STANDIN = 0xFFFF
+
+
+def _escape(word, icmp_id):
+    """(ip_id, icmp_id) to send `word` with, never IP ID 0."""
+    if word:
+        return word, icmp_id
+    return ZERO_STANDIN, icmp_id | FLAG_ZERO
+
+
+def _words(message):
+    """Message bytes as big-endian 16-bit words, zero-padded."""
+    if len(message) % 2:
+        message += b"\0"
+    return [(message[i] << 8) | message[i + 1] for i in range(0, len(message), 2)]
+
+
+def encode(message, codec="framed", fec=0, repeat=1):
+    """
+    Packets (ip_id, icmp_id, icmp_seq) sending `message` (bytes)
+    `repeat` times; framed sends each repetition as its own message.
+    """
+    if codec == "ascii":
+        return [(b, 0, i & 0xFFFF) for i, b in enumerate(message * repeat)]
+    if codec == "raw16":
+        return [(*_escape(w, 0), i & 0xFFFF) for i, w in enumerate(_words(message) * repeat)]
+    if codec != "framed":
+        raise ValueError(f"unknown codec {codec!r}; use one of {CODECS}")
+    if len(message) > 0xFFFF:
+        raise ValueError("framed messages are limited to 65535 bytes")
+    if not 0 <= fec <= 255:
+        raise ValueError("fec group size must be 0..255")
+    data = []
+    for _ in range(repeat):
+        data.append((len(message), FLAG_FIRST))
+        data.extend((w, 0) for w in _words(message))
+    packets = []
+    parity = 0
+    for i, (word, flags) in enumerate(data):
+        packets.append((*_escape(word, (fec << 8) | flags), len(packets) & 0xFFFF))
+        parity ^= word
+        if fec and (i % fec == fec - 1 or i == len(data) - 1):
+            packets.append((*_escape(parity, (fec << 8) | FLAG_PARITY), len(packets) & 0xFFFF))
+            parity = 0
+    return packets
+
+
+def packet_bits(message, codec="framed", fec=0, repeat=1):
+    """
+    Message bits carried by each packet of encode(message, ...): 0 for
+    length and parity words, 8 for a word that ends an odd-length message.
+    """
+    if codec == "ascii":
+        return [8] * (len(message) * repeat)
+    tail = [16] * (len(message) // 2) + ([8] if len(message) % 2 else [])
+    if codec == "raw16":
+        return tail * repeat
+    bits = []
+    for _ip_id, icmp_id, _seq in encode(message, codec, fec, repeat):
+        if icmp_id & (FLAG_FIRST | FLAG_PARITY):
+            bits.append(0)
+            if icmp_id & FLAG_FIRST:
+                word = 0
+        else:
+            bits.append(tail[word])
+            word += 1
+    return bits
+
+
+class StreamDecoder:
+    """ascii / raw16: concatenate the IP IDs in arrival order."""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.data = bytearray()
+        self.packets = 0
+        self.rejected = 0
+
+    def feed(self, ip_id, icmp_id=0, icmp_seq=0):
+        """Returns the decoded character for ascii (None if rejected)."""
+        self.packets += 1
+        if self.codec == "raw16":
+            if icmp_id & FLAG_ZERO:
+                ip_id = 0
+            self.data += bytes((ip_id >> 8, ip_id & 0xFF))
+            return None
+        if 32 <= ip_id < 127:
+            self.data.append(ip_id)
+            return chr(ip_id)
+        self.rejected += 1
+        return None
+
+    def messages(self):
+        return [bytes(self.data)]
+
+    def stats(self):
+        return {"packets": self.packets, "rejected": self.rejected}
+
+
+class FramedDecoder:
+    """
+    Places packets by sequence number (16-bit, unwrapped against the
+    highest seen), repairs one lost data word per FEC group, then splits
+    the word stream into messages at the length words.
+    """
+
+    codec = "framed"
+
+    def __init__(self):
+        self.slots = {}   # unwrapped sequence number → (ip_id, flags)
+        self.fec = 0
+        self.top = None
+        self.packets = 0
+        self.duplicates = 0
+
+    def feed(self, ip_id, icmp_id=0, icmp_seq=0):
+        self.packets += 1
+        self.fec = icmp_id >> 8
+        if self.top is None:
+            seq = icmp_seq
+        else:
+            # nearest unwrapped value to the highest sequence number seen
+            seq = self.top + ((icmp_seq - self.top + 0x8000) & 0xFFFF) - 0x8000
+        if seq in self.slots:
+            self.duplicates += 1
+            return
+        if icmp_id & FLAG_ZERO:
+            ip_id = 0
+        self.slots[seq] = (ip_id, icmp_id & (FLAG_FIRST | FLAG_PARITY))
+        if self.top is None or seq > self.top:
+            self.top = seq
+
+    def _data_words(self):
+        """[(word or None, flags)] in data order after FEC repair, plus repair count."""
+        if not self.slots:
+            return [], 0
+        end = max(self.slots) + 1
+        step = self.fec + 1 if self.fec else end + 1
+        words, repaired = [], 0
+        for start in range(0, end, step):
+            group = [self.slots.get(s) for s in range(start, min(start + step, end))]
+            data, parity = (group[:-1], group[-1]) if self.fec and len(group) > 1 else (group, None)
+            if parity is not None and not parity[1] & FLAG_PARITY:
+                data, parity = group, None  # short trailing group without its parity yet
+            missing = [i for i, d in enumerate(data) if d is None]
+            if len(missing) == 1 and parity is not None:
+                x = parity[0]
+                for d in data:
+                    if d is not None:
+                        x ^= d[0]
+                # flags of the lost packet are unknown; a length word is
+                # recognized by position below
+                data[missing[0]] = (x, None)
+                repaired += 1
+            words.extend((d[0], d[1]) if d is not None else (None, None) for d in data)
+        return words, repaired
+
+    def messages(self):
+        """Decoded messages; bytes of words that were lost for good are zero."""
+        return [m for m, _known in self._messages()[0]]
+
+    def _messages(self):
+        """([(message, per-byte known flags)], repaired words)."""
+        words, repaired = self._data_words()
+        out = []
+        i = 0
+        while i < len(words):
+            length, flags = words[i]
+            if length is None or (flags is not None and not flags & FLAG_FIRST):
+                # lost length word (or out of step): resume at the next one
+                i += 1
+                while i < len(words) and not (words[i][1] or 0) & FLAG_FIRST:
+                    i += 1
+                continue
+            body = words[i + 1:i + 1 + (length + 1) // 2]
+            msg = bytearray()
+            known = []
+            for w, _flags in body:
+                msg += b"\0\0" if w is None else bytes((w >> 8, w & 0xFF))
+                known += [w is not None] * 2
+            out.append((bytes(msg[:length]), known[:length]))
+            i += 1 + len(body)
+        return out, repaired
+
+    def stats(self):
+        _msgs, repaired = self._messages()
+        expected = (max(self.slots) + 1) if self.slots else 0
+        return {"packets": self.packets, "lost": expected - len(self.slots),
+                "repaired": repaired, "duplicates": self.duplicates}
+
+
+def make_decoder(codec):
+    if codec == "framed":
+        return FramedDecoder()
+    if codec in ("ascii", "raw16"):
+        return StreamDecoder(codec)
+    raise ValueError(f"unknown codec {codec!r}; use one of {CODECS}")
+
+
+def score(decoder, message):
+    """Correctly decoded bits: decoded bytes equal to `message` at the same position."""
+    if isinstance(decoder, FramedDecoder):
+        msgs, _ = decoder._messages()
+        return sum(8 * sum(1 for j, b in enumerate(m[:len(message)]) if known[j] and b == message[j])
+                   for m, known in msgs)
+    # raw16 repetitions are padded to whole words
+    unit = bytes(message) + (b"\0" if decoder.codec == "raw16" and len(message) % 2 else b"")
+    data = decoder.messages()[0]
+    return 8 * sum(1 for i, b in enumerate(data)
+                   if i % len(unit) < len(message) and b == unit[i % len(unit)])
@@ -1,10 +1,54 @@
 #!/usr/bin/env python3
 from scapy.all import sniff, IP, ICMP
+from struct import pack, pack_into, unpack_from
 import argparse
+import ctypes
+import select
+import socket
+import mmap
+import time
+import csv
+import sys
+import os
 
-received_chars = []
+# shared encoder/decoder (code/common, mounted at /code/common)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from covert_codec import CODECS, make_decoder, score
 
-def process_packet(pkt):
+MARKER = b"CovertChannel"
+# only echo requests: insec's own echo replies carry the same payload
+SCAPY_FILTER = "icmp[icmptype] == icmp-echo"
+
+decoder = make_decoder("ascii")
+captured = 0
+first_ts = last_ts = None
+received = None  # (capture time, ip_id, icmp_id, icmp_seq) per packet with --log
+
+def record(ip_id, icmp_id=0, icmp_seq=0, ts=None, quiet=False):
+    """Feed one covert packet's IP ID (and ICMP id/seq framing) to the decoder."""
+    global captured, first_ts, last_ts
+    captured += 1
+    if ts is not None:
+        if first_ts is None:
+            first_ts = ts
+        last_ts = ts
+    if received is not None:
+        received.append((ts, ip_id, icmp_id, icmp_seq))
+    try:
+        ch = decoder.feed(ip_id, icmp_id, icmp_seq)
+        if quiet:
+            return
+        if decoder.codec != "ascii":
+            print(f"Received packet with IP ID: {ip_id} | ICMP id: {icmp_id:#06x} seq: {icmp_seq}")
+        # Check if the value is in a reasonable ASCII range.
+        elif ch is not None:
+            print(f"Received packet with IP ID: {ip_id} (character: {ch})")
+        else:
+            print(f"Received packet with modified IP ID (out of ASCII range): {ip_id}")
+    except Exception as e:
+        print("Error decoding character:", e)
+
+def process_packet(pkt, quiet=False):
     """
     Check if the ICMP payload contains the marker "CovertChannel" and, if so,
     extract and decode the IP ID field as the covert character.
@@ -13,33 +57,181 @@ def process_packet(pkt):
         # Extract the raw payload bytes from the ICMP layer.
         payload_bytes = bytes(pkt[ICMP].payload)
         # Check if our unique marker is present.
-        if b"CovertChannel" in payload_bytes:
-            ip_id = pkt[IP].id
-            try:
-                # Check if the value is in a reasonable ASCII range.
-                if 32 <= ip_id < 127:
-                    ch = chr(ip_id)
-                    received_chars.append(ch)
-                    print(f"Received packet with IP ID: {ip_id} (character: {ch})")
-                else:
-                    print(f"Received packet with modified IP ID (out of ASCII range): {ip_id}")
-            except Exception as e:
-                print("Error decoding character:", e)
+        if MARKER in payload_bytes:
+            record(pkt[IP].id, pkt[ICMP].id, pkt[ICMP].seq, float(pkt.time), quiet)
         else:
             # Ignore packets that do not contain the marker.
             pass
 
-def main(interface, packet_count):
+# ─── AF_PACKET ring backend ────────────────────────────────────────
+SOL_PACKET = 263
+SO_ATTACH_FILTER = 26
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_USER = 1
+ETH_P_IP = 0x0800
+SNAPLEN = 256
+
+# Classic BPF: incoming (not PACKET_OUTGOING) IPv4 ICMP echo requests,
+# first fragments only, truncated to SNAPLEN bytes
+ICMP_ECHO_BPF = [
+    (0x20, 0, 0, 0xFFFFF004),  # ld  pkttype (SKF_AD_OFF + SKF_AD_PKTTYPE)
+    (0x15, 10, 0, 4),          # jeq PACKET_OUTGOING → drop
+    (0x28, 0, 0, 12),          # ldh [12]          ethertype
+    (0x15, 0, 8, ETH_P_IP),    # jneq IPv4         → drop
+    (0x30, 0, 0, 23),          # ldb [23]          protocol
+    (0x15, 0, 6, 1),           # jneq ICMP         → drop
+    (0x28, 0, 0, 20),          # ldh [20]          fragment offset
+    (0x45, 4, 0, 0x1FFF),      # jset 0x1fff       → drop
+    (0xB1, 0, 0, 14),          # ldxb 4*([14]&0xf) IP header length
+    (0x50, 0, 0, 14),          # ldb [x+14]        ICMP type
+    (0x15, 0, 1, 8),           # jneq echo request → drop
+    (0x06, 0, 0, SNAPLEN),     # ret SNAPLEN
+    (0x06, 0, 0, 0),           # drop
+]
+
+class PacketRing:
+    """
+    AF_PACKET socket with the BPF filter above and a TPACKET_V3
+    memory-mapped receive ring. The kernel fills whole blocks of frames
+    (a block is handed over when full or after `block_timeout_ms`); the
+    reader walks a block in place and returns it in one step.
+    """
+
+    def __init__(self, iface, block_size=1 << 20, block_nr=16, block_timeout_ms=10):
+        # no protocol yet: nothing is queued before the filter is attached
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        prog = b"".join(pack("HBBI", *ins) for ins in ICMP_ECHO_BPF)
+        insns = ctypes.create_string_buffer(prog)
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER,
+                             pack("HL", len(ICMP_ECHO_BPF), ctypes.addressof(insns)))
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        frame_size = 2048
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, pack(
+            "7I", block_size, block_nr, frame_size, block_size * block_nr // frame_size,
+            block_timeout_ms, 0, 0))
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.ring = mmap.mmap(self.sock.fileno(), block_size * block_nr,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.view = memoryview(self.ring)
+        self.sock.bind((iface, ETH_P_IP))
+        self.poll = select.poll()
+        self.poll.register(self.sock, select.POLLIN | select.POLLERR)
+        self.block = 0
+
+    def frames(self, deadline=None):
+        """Yield (timestamp, frame memoryview) until `deadline` (time.monotonic())."""
+        view = self.view
+        while True:
+            off = self.block * self.block_size
+            # tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+            if not unpack_from("I", view, off + 8)[0] & TP_STATUS_USER:
+                wait = -1 if deadline is None else int((deadline - time.monotonic()) * 1000)
+                if deadline is not None and wait <= 0:
+                    return
+                self.poll.poll(wait)
+                continue
+            num_pkts, pkt = unpack_from("II", view, off + 12)
+            pkt += off
+            for _ in range(num_pkts):
+                # tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+                nxt, sec, nsec, snaplen, _len, _st, mac = unpack_from("IIIIIIH", view, pkt)
+                yield sec + nsec * 1e-9, view[pkt + mac:pkt + mac + snaplen]
+                pkt += nxt
+            pack_into("I", view, off + 8, 0)  # TP_STATUS_KERNEL: hand the block back
+            self.block = (self.block + 1) % self.block_nr
+
+    def drops(self):
+        """Frames the kernel dropped because the ring was full (since the last call)."""
+        _packets, drops, _freezes = unpack_from("III", self.sock.getsockopt(
+            SOL_PACKET, PACKET_STATISTICS, 12))
+        return drops
+
+    def close(self):
+        self.view.release()
+        self.ring.close()
+        self.sock.close()
+
+def capture_ring(ring, packet_count, timeout=None, quiet=False):
+    """Decode IP ID, ICMP id/seq and marker straight from the frame bytes (Ethernet + IPv4 + ICMP)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for ts, frame in ring.frames(deadline):
+        icmp = 14 + (frame[14] & 0x0F) * 4
+        if MARKER in bytes(frame[icmp + 8:]):
+            record((frame[18] << 8) | frame[19], (frame[icmp + 4] << 8) | frame[icmp + 5],
+                   (frame[icmp + 6] << 8) | frame[icmp + 7], ts, quiet)
+            if packet_count and captured >= packet_count:
+                return
+
+def write_log(path, rows):
+    """Per received packet: kernel capture time (wall clock) and header fields."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["t_recv", "ip_id", "icmp_id", "icmp_seq"])
+        writer.writerows((f"{ts:.6f}", ip_id, icmp_id, seq) for ts, ip_id, icmp_id, seq in rows)
+
+def main(interface, packet_count, backend="ring", timeout=None, quiet=False,
+         codec="ascii", expect=None, log=None):
+    global decoder, captured, first_ts, last_ts, received
+    decoder = make_decoder(codec)
+    captured = 0
+    first_ts = last_ts = None
+    received = [] if log else None
     print(f"Sniffing for covert channel packets on interface {interface}...")
-    sniff(iface=interface, filter="icmp", prn=process_packet, count=packet_count)
-    covert_message = "".join(received_chars)
+    ring = None
+    if backend == "ring":
+        try:
+            ring = PacketRing(interface)
+        except (OSError, AttributeError) as e:
+            print(f"AF_PACKET ring unavailable ({e}); falling back to Scapy sniff")
+    drops = None
+    if ring is not None:
+        # the socket and filter are in place: nothing sent from here on is missed
+        print("Capture ready (ring)", flush=True)
+        try:
+            capture_ring(ring, packet_count, timeout, quiet)
+            drops = ring.drops()
+        finally:
+            ring.close()
+    else:
+        sniff(iface=interface, filter=SCAPY_FILTER, count=packet_count, timeout=timeout,
+              prn=lambda pkt: process_packet(pkt, quiet),
+              started_callback=lambda: print("Capture ready (scapy)", flush=True))
+    if log:
+        write_log(log, received)
+    print(f"Captured {captured} covert packets "
+          f"({'ring' if ring is not None else 'scapy'}"
+          f"{f', {drops} kernel drops' if drops is not None else ''})")
+    if codec != "ascii":
+        print(f"Decoder ({codec}): {decoder.stats()}")
+    if expect is not None:
+        bits = score(decoder, expect.encode())
+        elapsed = (last_ts - first_ts) if captured > 1 else 0.0
+        rate = f"{bits / elapsed:.1f} bps" if elapsed > 0 else "n/a"
+        print(f"Goodput: {rate} ({bits} correct bits in {elapsed:.3f}s)")
     print("\n=== Covert Message Received ===")
-    print(covert_message)
+    for message in decoder.messages():
+        print(message.decode(errors="replace"))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Covert Channel Receiver using IP ID field")
     parser.add_argument("--iface", type=str, default="eth0", help="Interface to sniff on")
     parser.add_argument("--count", type=int, default=10, help="Number of packets to capture")
+    parser.add_argument("--backend", choices=["ring", "scapy"], default="ring",
+                        help="ring: AF_PACKET + BPF + mmap ring; scapy: sniff() (fallback)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Stop after this many seconds even if --count is not reached")
+    parser.add_argument("--quiet", action="store_true", help="Do not print every packet")
+    parser.add_argument("--codec", choices=CODECS, default="ascii",
+                        help="Encoding used by the sender (see code/common/covert_codec.py)")
+    parser.add_argument("--expect", type=str, default=None,
+                        help="Message the sender sent; report goodput in correctly decoded bits/s")
+    parser.add_argument("--log", type=str, default=None,
+                        help="Write every packet's capture time and header fields to this CSV")
     args = parser.parse_args()
-    
-    main(args.iface, args.count)
+
+    main(args.iface, args.count, args.backend, args.timeout, args.quiet, args.codec, args.expect,
+         args.log)
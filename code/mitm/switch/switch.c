@@ -35,6 +35,18 @@
  * 9. Handles NATS messages and prints Ethernet packet details.
  * 10. Cleans up NATS connections and subscriptions on program exit.
  * 
+ * Tracing: with TRACE_FILE set, every TRACE_SAMPLE-th captured frame is published with an
+ * "Mb-Trace: <id> <ingress ns>" NATS header. The python-processor adds its stage timings
+ * ("Mb-Proc", see code/python-processor/tracing.py) to the frame it forwards, and the switch
+ * appends one trace_record per returning frame to TRACE_FILE
+ * (read by code/python-processor/trace_report.py).
+ * 
+ * Flow partitioning: with FLOW_PARTITIONS=N (> 0), a captured frame is published on
+ * "inpktsec.<p>" / "inpktinsec.<p>" instead, where p = flow_partition(frame, N) is a
+ * direction-independent hash of its addresses, protocol and TCP/UDP ports. Every frame of a
+ * flow gets the same p, so sharded processors (code/python-processor/launcher.py) can each
+ * subscribe to their own partitions. launcher.flow_partition is the same function in Python.
+ * 
  * @functions
  * - int main()
  *   - Entry point of the program. Initializes raw sockets, binds them to interfaces, and creates threads for packet capturing.
@@ -62,6 +74,18 @@
  *   - Configures NATS connection and subscriptions.
  *   - @return true if configuration is successful, false otherwise.
  * 
+ * - void configure_tracing()
+ *   - Opens TRACE_FILE (if set) and reads TRACE_SAMPLE.
+ * 
+ * - void configure_partitions()
+ *   - Reads FLOW_PARTITIONS.
+ * 
+ * - uint32_t flow_partition(const unsigned char *buffer, int size, uint32_t partitions)
+ *   - Partition of the frame's flow, 0 for non-IP or truncated frames.
+ * 
+ * - void write_trace_record(const char *trace, const char *proc, int64_t egress_ns, int size, int direction)
+ *   - Appends one frame's timings, from its headers and the egress time, to the trace file.
+ * 
  * - char *get_interface_for_subnet(char *subnet)
  *   - Gets the interface name for a given subnet.
  *   - @param subnet Subnet in CIDR notation.
@@ -89,6 +113,10 @@
 #include <pthread.h>
 #include <netpacket/packet.h>
 #include <stdbool.h>
+#include <stdint.h>
+#include <inttypes.h>
+#include <time.h>
+#include <signal.h>
 #include <nats/nats.h>
 
 #define BUF_SIZE 65536
@@ -111,6 +139,28 @@ void query_mac_address(char *interface, char *host_ip, unsigned char *mac_addres
 void query_mac_address_with_arp(char *interface, char *host_ip, unsigned char *mac_address);
 void query_mac_address_with_arp_query(char *interface, char *host_ip, unsigned char *mac_address);
 void print_packet(unsigned char *buffer, int size, char *iface, bool is_outgoing);
+void configure_tracing();
+void configure_partitions();
+uint32_t flow_partition(const unsigned char *buffer, int size, uint32_t partitions);
+void write_trace_record(const char *trace, const char *proc, int64_t egress_ns, int size, int direction);
+
+// One traced frame in TRACE_FILE; times are ns since the epoch, durations ns
+typedef struct {
+    uint64_t id;
+    int64_t direction;      // 0: sec -> insec, 1: insec -> sec
+    int64_t size;           // bytes
+    int64_t mean_delay_us;  // processor's configured mean delay
+    int64_t ingress_ns;     // switch: frame captured
+    int64_t proc_in_ns;     // processor: frame received from NATS
+    int64_t parse_ns;
+    int64_t mitigate_ns;
+    int64_t detect_ns;
+    int64_t delay_ns;       // drawn random delay
+    int64_t queue_ns;       // time in the delay queue
+    int64_t publish_ns;     // delay queue to NATS client
+    int64_t proc_total_ns;  // processor: receipt to hand-off
+    int64_t egress_ns;      // switch: frame sent out
+} trace_record;
 
 // NOT A GOOD EXERCISE TO USE GLOBAL VARIABLES
 // But for the sake of simplicity, we are using them here
@@ -125,6 +175,21 @@ char *nats_url;
 natsConnection *conn = NULL;
 natsOptions *opts = NULL;
 
+FILE *trace_file = NULL;
+uint64_t trace_sample = 1;
+uint64_t trace_next_id = 0;
+time_t trace_last_flush = 0;
+pthread_mutex_t trace_lock = PTHREAD_MUTEX_INITIALIZER;
+
+uint32_t flow_partitions = 0;
+uint32_t crc32_table[256];
+
+static int64_t now_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_REALTIME, &ts);
+    return (int64_t)ts.tv_sec * 1000000000LL + ts.tv_nsec;
+}
+
 
 int main() {
 
@@ -161,6 +226,9 @@ int main() {
         printf("NATS configuration successful\n");
     }
 
+    configure_tracing();
+    configure_partitions();
+
     pthread_t thread1, thread2;
 
     if (pthread_create(&thread1, NULL, capture_packets, (void *)ethsec) < 0) {
@@ -212,22 +280,108 @@ void *capture_packets(void *arg) {
 }
 
 
+// Publish with an "Mb-Trace: <id> <ingress ns>" header
+natsStatus publish_traced(const char *subject, unsigned char *buffer, int size, uint64_t id, int64_t ingress_ns) {
+    natsMsg *m = NULL;
+    char value[64];
+    natsStatus s = natsMsg_Create(&m, subject, NULL, (const char *)buffer, size);
+    snprintf(value, sizeof(value), "%" PRIu64 " %" PRId64, id, ingress_ns);
+    if (s == NATS_OK) {
+        s = natsMsgHeader_Set(m, "Mb-Trace", value);
+    }
+    if (s == NATS_OK) {
+        s = natsConnection_PublishMsg(conn, m);
+    }
+    natsMsg_Destroy(m);
+    return s;
+}
+
+// zlib-compatible CRC-32 of `len` bytes, continuing from `crc` (zlib.crc32(data, crc))
+static uint32_t crc32_update(uint32_t crc, const unsigned char *data, int len) {
+    crc = ~crc;
+    for (int i = 0; i < len; i++) {
+        crc = crc32_table[(crc ^ data[i]) & 0xFF] ^ (crc >> 8);
+    }
+    return ~crc;
+}
+
+// Keep in sync with flow_partition() in code/python-processor/launcher.py
+uint32_t flow_partition(const unsigned char *buffer, int size, uint32_t partitions) {
+    int off = 14;
+    int addr_len, l4;
+    uint8_t proto;
+    bool first_fragment = true;
+    unsigned char a[18], b[18], key[36];
+    if (size < 14) {
+        return 0;
+    }
+    uint16_t ethertype = (buffer[12] << 8) | buffer[13];
+    while (ethertype == 0x8100 || ethertype == 0x88A8 || ethertype == 0x9100) {
+        if (size < off + 4) {
+            return 0;
+        }
+        ethertype = (buffer[off + 2] << 8) | buffer[off + 3];
+        off += 4;
+    }
+    if (ethertype == 0x0800) {
+        if (size < off + 20) {
+            return 0;
+        }
+        addr_len = 4;
+        proto = buffer[off + 9];
+        memcpy(a, buffer + off + 12, 4);
+        memcpy(b, buffer + off + 16, 4);
+        l4 = off + (buffer[off] & 0x0F) * 4;
+        first_fragment = (((buffer[off + 6] & 0x1F) << 8) | buffer[off + 7]) == 0;
+    } else if (ethertype == 0x86DD) {
+        if (size < off + 40) {
+            return 0;
+        }
+        addr_len = 16;
+        proto = buffer[off + 6];
+        memcpy(a, buffer + off + 8, 16);
+        memcpy(b, buffer + off + 24, 16);
+        l4 = off + 40;
+    } else {
+        return 0;
+    }
+    // address + port of each end; ports stay 0 without a TCP/UDP header
+    memset(a + addr_len, 0, 2);
+    memset(b + addr_len, 0, 2);
+    if (first_fragment && (proto == IPPROTO_TCP || proto == IPPROTO_UDP) && size >= l4 + 4) {
+        memcpy(a + addr_len, buffer + l4, 2);
+        memcpy(b + addr_len, buffer + l4 + 2, 2);
+    }
+    int n = addr_len + 2;
+    // lower end first, so both directions of a flow hash together
+    bool swap = memcmp(a, b, n) > 0;
+    memcpy(key, swap ? b : a, n);
+    memcpy(key + n, swap ? a : b, n);
+    return crc32_update(proto, key, 2 * n) % partitions;
+}
+
 void handle_packet_from_interface(unsigned char *buffer, int size, char *in_iface) {
     
     natsStatus s;
+    int64_t ingress_ns = trace_file != NULL ? now_ns() : 0;
+    const char *subject = strcmp(in_iface, ethsec) == 0 ? "inpktsec" : "inpktinsec";
+    char partitioned[32];
+    if (flow_partitions > 0) {
+        snprintf(partitioned, sizeof(partitioned), "%s.%" PRIu32, subject,
+                 flow_partition(buffer, size, flow_partitions));
+        subject = partitioned;
+    }
     print_packet(buffer, size, in_iface, false);
-    if (strcmp(in_iface, ethsec) == 0) {
-        // Publish the packet to NATS
-        s = natsConnection_Publish(conn, "inpktsec", buffer, size);
-        if (s != NATS_OK) {
-            fprintf(stderr, "Error publishing packet to NATS: %s\n", natsStatus_GetText(s));
-        }
-    } else {                
-        s = natsConnection_Publish(conn, "inpktinsec", buffer, size);
-        if (s != NATS_OK) {
-            fprintf(stderr, "Error publishing packet to NATS: %s\n", natsStatus_GetText(s));
-        }
-    }    
+    // Publish the packet to NATS
+    uint64_t id = trace_file != NULL ? __atomic_fetch_add(&trace_next_id, 1, __ATOMIC_RELAXED) : 0;
+    if (trace_file != NULL && id % trace_sample == 0) {
+        s = publish_traced(subject, buffer, size, id, ingress_ns);
+    } else {
+        s = natsConnection_Publish(conn, subject, buffer, size);
+    }
+    if (s != NATS_OK) {
+        fprintf(stderr, "Error publishing packet to NATS: %s\n", natsStatus_GetText(s));
+    }
 }
 
 
@@ -236,7 +390,9 @@ void handle_packet_from_nats(natsConnection *nc, natsSubscription *sub, natsMsg
     int size = natsMsg_GetDataLength(msg);
     struct ethhdr *eth = (struct ethhdr *)buffer;
     char * outiface;
+    int direction = 0;
     if (strcmp(natsMsg_GetSubject(msg), "outpktsec") == 0) {
+        direction = 1;
         memcpy(eth->h_dest, mac_secure_net_host, 6);
         //memcpy(eth->h_source, mac_ethsec, 6);
 
@@ -253,6 +409,15 @@ void handle_packet_from_nats(natsConnection *nc, natsSubscription *sub, natsMsg
         }
     }
 
+    if (trace_file != NULL) {
+        const char *trace = NULL;
+        const char *proc = NULL;
+        if (natsMsgHeader_Get(msg, "Mb-Trace", &trace) == NATS_OK &&
+            natsMsgHeader_Get(msg, "Mb-Proc", &proc) == NATS_OK) {
+            write_trace_record(trace, proc, now_ns(), size, direction);
+        }
+    }
+
     print_packet(buffer, size, outiface, true);
 
     natsMsg_Destroy(msg);
@@ -429,6 +594,77 @@ bool configure_nats() {
     return configured;
 }
 
+// Flush what is buffered when the switch is stopped
+void stop_tracing(int sig) {
+    if (trace_file != NULL && pthread_mutex_trylock(&trace_lock) == 0) {
+        fflush(trace_file);
+    }
+    _exit(0);
+}
+
+void configure_tracing() {
+    char *path = getenv("TRACE_FILE");
+    if (path == NULL || path[0] == '\0') {
+        return;
+    }
+    char *sample = getenv("TRACE_SAMPLE");
+    if (sample != NULL && strtoull(sample, NULL, 10) > 0) {
+        trace_sample = strtoull(sample, NULL, 10);
+    }
+    trace_file = fopen(path, "wb");
+    if (trace_file == NULL) {
+        perror("Cannot open TRACE_FILE; tracing disabled");
+        return;
+    }
+    setvbuf(trace_file, NULL, _IOFBF, 1 << 16);
+    signal(SIGINT, stop_tracing);
+    signal(SIGTERM, stop_tracing);
+    printf("Tracing 1 in %" PRIu64 " frames to %s\n", trace_sample, path);
+}
+
+void configure_partitions() {
+    char *partitions = getenv("FLOW_PARTITIONS");
+    if (partitions == NULL || strtoul(partitions, NULL, 10) == 0) {
+        return;
+    }
+    for (uint32_t i = 0; i < 256; i++) {
+        uint32_t c = i;
+        for (int k = 0; k < 8; k++) {
+            c = c & 1 ? 0xEDB88320u ^ (c >> 1) : c >> 1;
+        }
+        crc32_table[i] = c;
+    }
+    flow_partitions = (uint32_t)strtoul(partitions, NULL, 10);
+    printf("Publishing on inpktsec.<p>/inpktinsec.<p> over %" PRIu32 " flow partitions\n", flow_partitions);
+}
+
+void write_trace_record(const char *trace, const char *proc, int64_t egress_ns, int size, int direction) {
+    trace_record r;
+    memset(&r, 0, sizeof(r));
+    if (sscanf(trace, "%" SCNu64 " %" SCNd64, &r.id, &r.ingress_ns) != 2) {
+        return;
+    }
+    if (sscanf(proc, "%" SCNd64 " %" SCNd64 " %" SCNd64 " %" SCNd64 " %" SCNd64
+                     " %" SCNd64 " %" SCNd64 " %" SCNd64 " %" SCNd64,
+               &r.proc_in_ns, &r.parse_ns, &r.mitigate_ns, &r.detect_ns, &r.delay_ns,
+               &r.queue_ns, &r.publish_ns, &r.proc_total_ns, &r.mean_delay_us) != 9) {
+        return;
+    }
+    r.direction = direction;
+    r.size = size;
+    r.egress_ns = egress_ns;
+
+    pthread_mutex_lock(&trace_lock);
+    fwrite(&r, sizeof(r), 1, trace_file);
+    // at most a second of records is lost if the switch is killed
+    time_t now = time(NULL);
+    if (now != trace_last_flush) {
+        fflush(trace_file);
+        trace_last_flush = now;
+    }
+    pthread_mutex_unlock(&trace_lock);
+}
+
 // Function to get the interface name for a given subnet
 char *get_interface_for_subnet(char *subnet) {
     FILE *fp;
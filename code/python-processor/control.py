@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Live reconfiguration of a running processor over NATS.
+
+main.py subscribes to CONTROL_SUBJECT (default "processor.control"; every
+shard of launcher.py does too) and answers each JSON request on its
+reply subject. Any subset of:
+
+  {"delay":      {"dist": "exponential", "mean_ms": 50, "sd_ms": 12.5, "shape": 2.5},
+   "mitigation": {"active": true, "rules": [["ip_id", "random"], ["ttl", "64"]]},
+                 (or "policy": a policy file path; active without rules or
+                 policy randomizes the IP ID only)
+   "window":     {"size": 20, "window_ms": 0},
+   "markers":    ["CovertChannel", "hex:deadbeef"],
+   "if_version": 3}
+
+Fields left out of "delay" and "window" keep their current value. The
+new components are all built first, then swapped in at once between two
+frames: a bad request changes nothing, and frames already waiting in the
+delay queue leave at the deadline they were given. A new window starts
+empty; window decision counts and per-marker hits carry on. With "if_version"
+the change is refused unless the processor is at that version.
+
+Each successful change bumps the processor's config version. The reply:
+
+  {"ok": true, "version": 4, "shard": null, "config": {...}, "apply_s": 0.0012}
+  {"ok": false, "version": 3, "shard": null, "error": "..."}
+
+An empty request only returns the current config. From inside the
+processor container:
+
+    python3 control.py --mean-delay-ms 50 --delay-dist exponential
+    python3 control.py --mitigate 1 --policy /code/python-processor/mitigation_policy.txt
+    python3 control.py --show --expect 4      # four launcher.py workers
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from detector import SlidingWindowDetector
+from matcher import MarkerMatcher
+from mitigation import MitigationPolicy, load_policy
+from randpool import make_delay_pool, seed_for
+
+CONTROL_SUBJECT = "processor.control"
+DELAY_KEYS = ("dist", "mean_ms", "sd_ms", "shape")
+
+
+def _marker(text):
+    return bytes.fromhex(text[4:]) if text.startswith("hex:") else text.encode()
+
+
+def _marker_text(marker):
+    try:
+        text = marker.decode()
+        if not text.startswith("hex:"):
+            return text
+    except UnicodeDecodeError:
+        pass
+    return "hex:" + marker.hex()
+
+
+class Controller:
+    """
+    Applies control requests to `pipeline`. `delays` is the running delay
+    RandomPool, drawn with `delay` = {"dist", "mean_ms", "sd_ms", "shape"};
+    new pools get `seed` (see randpool.seed_for) and `block`. New
+    mitigation policies draw IP IDs from `ip_ids`.
+    """
+
+    def __init__(self, pipeline, delays, delay, ip_ids, seed=None, shard=None,
+                 block=65536, log=print):
+        self.pipeline = pipeline
+        self.delays = delays
+        self.delay_config = dict(delay)
+        self.ip_ids = ip_ids
+        self.seed = seed
+        self.shard = shard
+        self.block = block
+        self.log = log
+        self.version = 0
+        self.rejected = 0
+
+    def config(self):
+        p = self.pipeline
+        return {
+            "delay": dict(self.delay_config),
+            "mitigation": p.policy.rules if p.policy is not None else None,
+            "window": {"size": p.detector.size, "window_ms": p.detector.window_ms},
+            "markers": [_marker_text(m) for m in p.matcher.patterns],
+        }
+
+    def apply(self, req):
+        """Apply one request (a dict); returns the reply."""
+        start = time.perf_counter()
+        p = self.pipeline
+        swap = {}
+        try:
+            unknown = set(req) - {"delay", "mitigation", "window", "markers", "if_version"}
+            if unknown:
+                raise ValueError(f"unknown fields {sorted(unknown)}")
+            if req.get("if_version") is not None and req["if_version"] != self.version:
+                raise ValueError(f"config is at version {self.version}, not {req['if_version']}")
+
+            # build everything first; any error leaves the running config alone
+            if "delay" in req:
+                delay = dict(self.delay_config)
+                for key, value in req["delay"].items():
+                    if key not in DELAY_KEYS:
+                        raise ValueError(f"unknown delay field {key!r}")
+                    delay[key] = value
+                if float(delay["mean_ms"]) < 0:
+                    raise ValueError("delay mean_ms must be >= 0")
+                if delay.get("sd_ms") is not None and float(delay["sd_ms"]) < 0:
+                    raise ValueError("delay sd_ms must be >= 0")
+                pool = make_delay_pool(
+                    delay["dist"], float(delay["mean_ms"]), sd_ms=delay.get("sd_ms"),
+                    shape=float(delay.get("shape", 2.5)), block=self.block,
+                    seed=seed_for(self.seed, f"delay.{self.version + 1}", self.shard))
+                swap["delay"] = (delay, pool)
+            if "mitigation" in req:
+                m = req["mitigation"]
+                policy = None
+                if m.get("active"):
+                    if m.get("rules"):
+                        rules = [tuple(rule) for rule in m["rules"]]
+                    elif m.get("policy"):
+                        rules = load_policy(m["policy"])
+                    else:
+                        rules = [("ip_id", "random")]
+                    policy = MitigationPolicy(rules, rand=self.ip_ids.getrandbits)
+                swap["mitigation"] = policy
+            if "window" in req:
+                window = {"size": p.detector.size, "window_ms": p.detector.window_ms}
+                window.update(req["window"])
+                size, window_ms = int(window["size"]), int(window["window_ms"])
+                if size < 1:
+                    raise ValueError("window size must be >= 1")
+                if window_ms < 0:
+                    raise ValueError("window_ms must be >= 0")
+                swap["window"] = SlidingWindowDetector(size=size, window_ms=window_ms)
+            if "markers" in req:
+                markers = list(dict.fromkeys(_marker(m) for m in req["markers"]))
+                if not markers or not all(markers):
+                    # an empty pattern matches every packet
+                    raise ValueError("markers must be a non-empty list of non-empty patterns")
+                swap["markers"] = MarkerMatcher(markers)
+        except Exception as e:
+            self.rejected += 1
+            if "delay" in swap:
+                swap["delay"][1].close()
+            return {"ok": False, "version": self.version, "shard": self.shard,
+                    "error": f"{type(e).__name__}: {e}"}
+
+        # swap: plain assignments, no await, so no frame sees half a change
+        if "delay" in swap:
+            delay, pool = swap["delay"]
+            old, self.delays = self.delays, pool
+            self.delay_config = delay
+            p.delay = pool.draw
+            p.mean_delay_ms = float(delay["mean_ms"])
+            old.close()
+        if "mitigation" in swap:
+            p.policy = swap["mitigation"]
+            p.mitigate = p.policy is not None
+        if "window" in swap:
+            p.detector = swap["window"]
+        if "markers" in swap:
+            p.set_matcher(swap["markers"])
+        if swap:
+            self.version += 1
+            self.log(f"[Control] v{self.version}: {', '.join(swap)} changed → {self.config()}")
+        return {"ok": True, "version": self.version, "shard": self.shard, "config": self.config(),
+                "apply_s": round(time.perf_counter() - start, 6)}
+
+    async def handle(self, msg):
+        """NATS callback for CONTROL_SUBJECT."""
+        try:
+            req = json.loads(msg.data or b"{}")
+            if not isinstance(req, dict):
+                raise ValueError("request must be a JSON object")
+            reply = self.apply(req)
+        except ValueError as e:
+            self.rejected += 1
+            reply = {"ok": False, "version": self.version, "shard": self.shard,
+                     "error": f"bad request: {e}"}
+        if msg.reply:
+            await msg.respond(json.dumps(reply).encode())
+
+    def close(self):
+        self.delays.close()
+
+
+async def send(req, nats_url, subject=CONTROL_SUBJECT, expect=1, timeout=2.0):
+    """Publish one request; returns the replies of up to `expect` processors."""
+    from nats.aio.client import Client as NATS
+
+    nc = NATS()
+    await nc.connect(nats_url)
+    replies = []
+    done = asyncio.Event()
+
+    async def on_reply(msg):
+        if not msg.data:
+            return  # the server's "no responders" status
+        replies.append(json.loads(msg.data))
+        if len(replies) >= expect:
+            done.set()
+
+    inbox = nc.new_inbox()
+    await nc.subscribe(inbox, cb=on_reply)
+    await nc.publish(subject, json.dumps(req).encode(), reply=inbox)
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    await nc.close()
+    return replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconfigure running processors")
+    parser.add_argument("--nats", default=os.getenv("NATS_SURVEYOR_SERVERS", "nats://nats:4222"))
+    parser.add_argument("--subject", default=os.getenv("CONTROL_SUBJECT", CONTROL_SUBJECT))
+    parser.add_argument("--expect", type=int, default=1, help="number of processors to wait for")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--show", action="store_true", help="only print the current config")
+    parser.add_argument("--delay-dist")
+    parser.add_argument("--mean-delay-ms", type=float)
+    parser.add_argument("--delay-sd-ms", type=float)
+    parser.add_argument("--delay-pareto-shape", type=float)
+    parser.add_argument("--mitigate", type=int, choices=(0, 1))
+    parser.add_argument("--policy", help="mitigation policy file (in the processor container)")
+    parser.add_argument("--window", type=int, help="detection window size in packets")
+    parser.add_argument("--window-ms", type=int, help="time-based detection window (0: count-based)")
+    parser.add_argument("--markers", help="comma-separated marker set ('hex:' for raw bytes)")
+    parser.add_argument("--if-version", type=int)
+    args = parser.parse_args()
+
+    req = {}
+    if not args.show:
+        delay = {key: value for key, value in (
+            ("dist", args.delay_dist), ("mean_ms", args.mean_delay_ms),
+            ("sd_ms", args.delay_sd_ms), ("shape", args.delay_pareto_shape)) if value is not None}
+        if delay:
+            req["delay"] = delay
+        if args.mitigate is not None:
+            req["mitigation"] = {"active": bool(args.mitigate), "policy": args.policy}
+        window = {key: value for key, value in (("size", args.window), ("window_ms", args.window_ms))
+                  if value is not None}
+        if window:
+            req["window"] = window
+        if args.markers is not None:
+            req["markers"] = [m.strip() for m in args.markers.split(",") if m.strip()]
+        if args.if_version is not None:
+            req["if_version"] = args.if_version
+
+    replies = asyncio.run(send(req, args.nats, args.subject, args.expect, args.timeout))
+    for reply in replies:
+        print(json.dumps(reply))
+    if len(replies) < args.expect:
+        print(f"only {len(replies)} of {args.expect} processors answered", file=sys.stderr)
+    sys.exit(0 if len(replies) >= args.expect and all(r["ok"] for r in replies) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Phase 3 sliding-window marker detector.
+
+Each packet is reduced to one flag ("did it carry the marker?"). The
+window keeps a running marker count so the per-packet decision is O(1)
+whatever the window size.
+
+Two window kinds are supported:
+  * count-based: the last `size` packets, stored as one byte each in a
+    fixed bytearray ring;
+  * time-based:  the last `window_ms` milliseconds; only the arrival times
+    of marker packets are kept, so memory follows the marker rate rather
+    than the packet rate.
+"""
+import time
+from array import array
+from collections import deque
+
+
+class SlidingWindowDetector:
+    """
+    Window decision = "at least one marker packet in the window".
+
+    update() returns None until the first window is complete (`size`
+    packets seen, or `window_ms` elapsed since the first packet), then the
+    decision for the window ending at the current packet; `window_start`
+    is then the arrival time of its oldest packet (count-based) or
+    `window_ms` before the current one (time-based).
+    """
+
+    def __init__(self, size=20, window_ms=0):
+        if size < 1:
+            raise ValueError("detector window must hold at least 1 packet")
+        if window_ms < 0:
+            raise ValueError("detector window_ms must not be negative")
+        self.size = size
+        self.window_ms = window_ms
+        self.marker_count = 0
+        self.packets = 0
+        self._now = 0.0
+        if window_ms:
+            self._span = window_ms / 1000.0
+            self._markers = deque()
+            self._first = None
+        else:
+            self._ring = bytearray(size)
+            self._times = array("d", bytes(8 * size))  # arrival time per slot
+            self._pos = 0
+
+    @property
+    def decision(self):
+        return self.marker_count > 0
+
+    @property
+    def window_start(self):
+        if self.window_ms:
+            return self._now - self._span
+        return self._times[self._pos]
+
+    def update(self, is_marker, now=None):
+        self.packets += 1
+        if now is None:
+            now = time.monotonic()
+        self._now = now
+        if self.window_ms:
+            return self._update_time(is_marker, now)
+        return self._update_count(is_marker, now)
+
+    def _update_count(self, is_marker, now):
+        ring = self._ring
+        pos = self._pos
+        flag = 1 if is_marker else 0
+        self.marker_count += flag - ring[pos]
+        ring[pos] = flag
+        self._times[pos] = now
+        pos += 1
+        self._pos = 0 if pos == self.size else pos
+        if self.packets < self.size:
+            return None
+        return self.marker_count > 0
+
+    def _update_time(self, is_marker, now):
+        markers = self._markers
+        if self._first is None:
+            self._first = now
+        if is_marker:
+            markers.append(now)
+        horizon = now - self._span
+        while markers and markers[0] <= horizon:
+            markers.popleft()
+        self.marker_count = len(markers)
+        if now - self._first < self._span:
+            return None
+        return self.marker_count > 0
+
+    def __repr__(self):
+        kind = f"{self.window_ms}ms" if self.window_ms else f"{self.size} pkts"
+        return f"SlidingWindowDetector({kind}, markers={self.marker_count})"
+
+
+class Confusion:
+    """Cumulative confusion counts of a detector scored against ground truth."""
+
+    __slots__ = ("TP", "FP", "TN", "FN")
+
+    def __init__(self):
+        self.TP = self.FP = self.TN = self.FN = 0
+
+    def add(self, decision, true_label):
+        if decision and true_label:
+            self.TP += 1
+        elif decision:
+            self.FP += 1
+        elif not true_label:
+            self.TN += 1
+        else:
+            self.FN += 1
+
+    def as_dict(self):
+        return {"TP": self.TP, "FP": self.FP, "TN": self.TN, "FN": self.FN}
+
+    def row(self, now):
+        """One detection_metrics row: window_end, TP, FP, TN, FN, Precision, Recall, F1."""
+        TP, FP, TN, FN = self.TP, self.FP, self.TN, self.FN
+        precision = TP / (TP + FP) if (TP + FP) else 0.0
+        recall    = TP / (TP + FN) if (TP + FN) else 0.0
+        f1        = (2 * precision * recall / (precision + recall)
+                     if (precision + recall) else 0.0)
+        return (now, TP, FP, TN, FN, round(precision, 3), round(recall, 3), round(f1, 3))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Egress stage between the processor and NATS.
+
+Outgoing frames go straight to the NATS client, whose pending buffer
+already coalesces them into socket writes. That buffer is watched after
+every frame:
+
+  * above `high_water` bytes the ingress side is paused (wait_ready()
+    blocks) until a NATS flush round-trip has drained the buffer;
+  * above `max_queued` bytes new frames are dropped and counted instead
+    of growing memory without limit.
+
+Client-side slow-consumer errors are counted through on_error(), and the
+NATS server's own slow-consumer counter (e.g. the switch falling behind
+on outpktsec/outpktinsec) can be polled from its monitoring endpoint.
+"""
+import json
+import asyncio
+import urllib.request
+from nats.errors import SlowConsumerError
+
+
+class Egress:
+
+    def __init__(self, nc, high_water=4 * 1024 * 1024, max_queued=16 * 1024 * 1024,
+                 flush_timeout=5.0, log=print):
+        self.nc = nc
+        self.high_water = high_water
+        self.max_queued = max_queued
+        self.flush_timeout = flush_timeout
+        self.log = log
+        self._open = asyncio.Event()
+        self._open.set()
+
+        # accounting
+        self.published = 0
+        self.out_by_subject = {}
+        self.dropped = 0
+        self.pauses = 0
+        self.paused_s = 0.0
+        self.slow_consumers = 0
+        self.server_slow_consumers = 0
+
+    @property
+    def queued_bytes(self):
+        return self.nc.pending_data_size
+
+    async def publish(self, subject, data, trace=None):
+        """
+        Hand one frame to the client; same signature as nc.publish so it
+        can replace it. A tracing.Trace is sent as NATS headers.
+        """
+        nc = self.nc
+        if nc.pending_data_size + len(data) > self.max_queued:
+            self.dropped += 1
+            return
+        if trace is None:
+            await nc.publish(subject, data)
+        else:
+            await nc.publish(subject, data, headers=trace.headers())
+        out = self.out_by_subject
+        out[subject] = out.get(subject, 0) + 1
+        self.published += 1
+        if nc.pending_data_size > self.high_water and self._open.is_set():
+            await self._drain()
+
+    async def wait_ready(self):
+        """Ingress calls this before taking a new frame (backpressure)."""
+        if not self._open.is_set():
+            await self._open.wait()
+
+    async def _drain(self):
+        """Pause ingress until a flush round-trip has emptied the client's buffer."""
+        self._open.clear()
+        self.pauses += 1
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await self.nc.flush(timeout=self.flush_timeout)
+        except Exception as e:
+            self.log(f"[Egress] flush while paused failed: {e!r}")
+        finally:
+            self.paused_s += loop.time() - start
+            self._open.set()
+
+    async def flush(self):
+        """Wait until everything published so far has reached the server."""
+        try:
+            await self.nc.flush(timeout=self.flush_timeout)
+        except Exception as e:
+            self.log(f"[Egress] flush failed: {e!r}")
+
+    async def on_error(self, e):
+        """NATS error_cb: count slow-consumer events, log the rest."""
+        if isinstance(e, SlowConsumerError):
+            self.slow_consumers += 1
+            self.log(f"[Egress] slow consumer on {e.subject}: {self.slow_consumers} so far")
+        else:
+            self.log(f"[Egress] NATS error: {e!r}")
+
+    async def watch_server(self, varz_url, interval=5.0):
+        """
+        Poll the server's /varz and report new slow-consumer events, i.e.
+        subscribers (such as the switch) that could not keep up with us.
+        """
+        loop = asyncio.get_running_loop()
+        baseline = None
+        while True:
+            try:
+                varz = await loop.run_in_executor(None, _fetch_json, varz_url)
+            except Exception as e:
+                self.log(f"[Egress] cannot poll {varz_url} ({e}); server slow-consumer "
+                         f"reporting disabled")
+                return
+            total = varz.get("slow_consumers", 0)
+            if baseline is None:
+                baseline = total
+            elif total - baseline > self.server_slow_consumers:
+                self.server_slow_consumers = total - baseline
+                self.log(f"[Egress] NATS server reports {self.server_slow_consumers} "
+                         f"slow consumer event(s) since start")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "pauses": self.pauses,
+            "paused_s": round(self.paused_s, 3),
+            "queued_bytes": self.queued_bytes,
+            "slow_consumers": self.slow_consumers,
+            "server_slow_consumers": self.server_slow_consumers,
+        }
+
+
+def _fetch_json(url):
+    with urllib.request.urlopen(url, timeout=2) as resp:
+        return json.load(resp)
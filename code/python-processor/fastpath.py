@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Zero-copy header parsing for the processor hot path.
+
+`parse()` walks Ethernet / 802.1Q / IPv4 / IPv6 / TCP / UDP / ICMP headers
+with plain offset arithmetic over a memoryview of the frame and returns a
+small HeaderView. Nothing is copied and no Scapy objects are built.
+
+Frames the fast path cannot decode (truncated headers, unknown IPv6
+extension headers, ...) make `parse()` return None; `parse_scapy()` then
+produces the same HeaderView through a full Scapy dissection.
+"""
+from struct import unpack_from
+
+ETH_P_IPV4 = 0x0800
+ETH_P_IPV6 = 0x86DD
+VLAN_TPIDS = (0x8100, 0x88A8, 0x9100)
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_ICMPV6 = 58
+
+# IPv6 extension headers we know how to skip (hop-by-hop, routing, dest opts)
+IPV6_SKIPPABLE = (0, 43, 60)
+IPV6_FRAGMENT = 44
+
+ETH_HLEN = 14
+VLAN_HLEN = 4
+
+
+class HeaderView:
+    """
+    Offsets and a handful of decoded fields for one frame.
+
+    `version` is 4 or 6 for IP frames and 0 for anything else. Offsets are
+    relative to the start of the frame; `l4_off` is None when the L4 header
+    is not present (non-first IP fragment). `payload_off` always points at
+    the first byte after the last decoded header.
+    """
+    __slots__ = ("buf", "vlan", "ethertype", "l3_off", "version", "ip_id",
+                 "proto", "src", "dst", "l4_off", "sport", "dport",
+                 "payload_off")
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.vlan = None
+        self.ethertype = 0
+        self.l3_off = ETH_HLEN
+        self.version = 0
+        self.ip_id = None
+        self.proto = 0
+        self.src = b""
+        self.dst = b""
+        self.l4_off = None
+        self.sport = 0
+        self.dport = 0
+        self.payload_off = len(buf)
+
+    @property
+    def payload(self):
+        """L4 payload as a memoryview slice (no copy)."""
+        return self.buf[self.payload_off:]
+
+    @property
+    def flow(self):
+        """5-tuple key: (src, dst, proto, sport, dport)."""
+        return (bytes(self.src), bytes(self.dst), self.proto,
+                self.sport, self.dport)
+
+    def __repr__(self):
+        return (f"HeaderView(v{self.version} proto={self.proto} "
+                f"id={self.ip_id} {self.sport}->{self.dport} "
+                f"l3={self.l3_off} l4={self.l4_off} pay={self.payload_off})")
+
+
+def _parse_l4(view, off, end):
+    """Fill ports/payload offset for the L4 header at `off`; False if truncated."""
+    proto = view.proto
+    buf = view.buf
+    if proto == PROTO_TCP:
+        if end - off < 20:
+            return False
+        view.sport, view.dport = unpack_from("!HH", buf, off)
+        doff = (buf[off + 12] >> 4) * 4
+        if doff < 20 or off + doff > end:
+            return False
+        view.l4_off = off
+        view.payload_off = off + doff
+    elif proto == PROTO_UDP:
+        if end - off < 8:
+            return False
+        view.sport, view.dport = unpack_from("!HH", buf, off)
+        view.l4_off = off
+        view.payload_off = off + 8
+    elif proto in (PROTO_ICMP, PROTO_ICMPV6):
+        if end - off < 8:
+            return False
+        view.l4_off = off
+        view.payload_off = off + 8
+    else:
+        view.l4_off = off
+        view.payload_off = off
+    return True
+
+
+def parse(data):
+    """
+    Decode `data` (bytes, bytearray or memoryview) without copying.
+
+    Returns a HeaderView, or None when the frame needs the Scapy fallback.
+    """
+    buf = data if isinstance(data, memoryview) else memoryview(data)
+    n = len(buf)
+    if n < ETH_HLEN:
+        return None
+    view = HeaderView(buf)
+
+    off = 12
+    ethertype = (buf[off] << 8) | buf[off + 1]
+    off += 2
+    while ethertype in VLAN_TPIDS:
+        if n < off + VLAN_HLEN:
+            return None
+        if view.vlan is None:
+            view.vlan = ((buf[off] << 8) | buf[off + 1]) & 0x0FFF
+        ethertype = (buf[off + 2] << 8) | buf[off + 3]
+        off += VLAN_HLEN
+    view.ethertype = ethertype
+    view.l3_off = off
+
+    if ethertype == ETH_P_IPV4:
+        if n < off + 20 or (buf[off] >> 4) != 4:
+            return None
+        ihl = (buf[off] & 0x0F) * 4
+        total_len = (buf[off + 2] << 8) | buf[off + 3]
+        if ihl < 20 or n < off + ihl or total_len < ihl:
+            return None
+        end = min(n, off + total_len)
+        view.version = 4
+        view.ip_id = (buf[off + 4] << 8) | buf[off + 5]
+        view.proto = buf[off + 9]
+        view.src = buf[off + 12:off + 16]
+        view.dst = buf[off + 16:off + 20]
+        frag_off = ((buf[off + 6] << 8) | buf[off + 7]) & 0x1FFF
+        l4 = off + ihl
+        if frag_off:
+            view.payload_off = l4
+            return view
+        return view if _parse_l4(view, l4, end) else None
+
+    if ethertype == ETH_P_IPV6:
+        if n < off + 40 or (buf[off] >> 4) != 6:
+            return None
+        end = min(n, off + 40 + ((buf[off + 4] << 8) | buf[off + 5]))
+        view.version = 6
+        view.src = buf[off + 8:off + 24]
+        view.dst = buf[off + 24:off + 40]
+        nxt = buf[off + 6]
+        l4 = off + 40
+        while nxt in IPV6_SKIPPABLE or nxt == IPV6_FRAGMENT:
+            if end - l4 < 8:
+                return None
+            if nxt == IPV6_FRAGMENT:
+                if unpack_from("!H", buf, l4 + 2)[0] & 0xFFF8:
+                    view.proto = buf[l4]
+                    view.payload_off = l4 + 8
+                    return view
+                nxt, l4 = buf[l4], l4 + 8
+            else:
+                nxt, l4 = buf[l4], l4 + (buf[l4 + 1] + 1) * 8
+        view.proto = nxt
+        return view if _parse_l4(view, l4, end) else None
+
+    # Not IP (ARP, LLDP, ...): nothing else to decode
+    view.payload_off = off
+    return view
+
+
+def parse_scapy(data):
+    """
+    Slow path: dissect `data` with Scapy and return an equivalent HeaderView.
+
+    Offsets follow the same rules as parse(): any L4 protocol gets an
+    `l4_off`, TCP/UDP/ICMP/ICMPv6 headers are skipped to reach the
+    payload, and other protocols (GRE, ESP, ...) have their payload start
+    at `l4_off`. An L4 header that does not fit before the end of the
+    frame or of the IP length (or a TCP data offset below 5) is treated
+    like a non-first fragment: no `l4_off`, payload after L3.
+    """
+    from scapy.all import Ether, Dot1Q, IP, IPv6, TCP, UDP
+
+    raw = bytes(data)
+    n = len(raw)
+    view = HeaderView(memoryview(raw))
+    if n < ETH_HLEN:
+        return view  # runt frame: nothing to decode
+    pkt = Ether(raw)
+    off = ETH_HLEN
+    ethertype = pkt.type
+    if Dot1Q in pkt:
+        view.vlan = pkt[Dot1Q].vlan
+        layer = pkt[Dot1Q]
+        while isinstance(layer, Dot1Q):
+            off += VLAN_HLEN
+            ethertype = layer.type
+            layer = layer.payload
+    view.l3_off = off
+    view.ethertype = ethertype
+
+    if ethertype == ETH_P_IPV4 and IP in pkt:
+        ip = pkt[IP]
+        view.version = 4
+        view.ip_id = ip.id
+        view.proto = ip.proto
+        view.src = view.buf[off + 12:off + 16]
+        view.dst = view.buf[off + 16:off + 20]
+        end = min(n, off + ip.len)
+        l3, l4 = ip, off + ip.ihl * 4
+        if ip.frag:
+            view.payload_off = min(l4, n)
+            return view
+    elif ethertype == ETH_P_IPV6 and IPv6 in pkt:
+        l3 = pkt[IPv6]
+        view.version = 6
+        view.src = view.buf[off + 8:off + 24]
+        view.dst = view.buf[off + 24:off + 40]
+        end = min(n, off + 40 + l3.plen)
+        nxt, l4, layer = l3.nh, off + 40, l3.payload
+        while nxt in IPV6_SKIPPABLE or nxt == IPV6_FRAGMENT:
+            if end - l4 < 8:
+                # truncated extension header: nothing past it decodes
+                view.proto = nxt
+                view.payload_off = min(l4, n)
+                return view
+            if nxt == IPV6_FRAGMENT:
+                if layer.offset:
+                    view.proto = layer.nh
+                    view.payload_off = min(l4 + 8, n)
+                    return view
+                l4 += 8
+            else:
+                l4 += (layer.len + 1) * 8
+            nxt, layer = layer.nh, layer.payload
+        view.proto = nxt
+    else:
+        view.payload_off = off
+        return view
+
+    # same bounds as _parse_l4: the whole L4 header must lie before `end`
+    proto = view.proto
+    if proto == PROTO_TCP and TCP in l3 and end - l4 >= 20:
+        tcp = l3[TCP]
+        if tcp.dataofs >= 5 and l4 + tcp.dataofs * 4 <= end:
+            view.sport, view.dport = tcp.sport, tcp.dport
+            view.l4_off = l4
+            view.payload_off = l4 + tcp.dataofs * 4
+            return view
+    elif proto == PROTO_UDP and UDP in l3 and end - l4 >= 8:
+        udp = l3[UDP]
+        view.sport, view.dport = udp.sport, udp.dport
+        view.l4_off = l4
+        view.payload_off = l4 + 8
+        return view
+    elif proto in (PROTO_ICMP, PROTO_ICMPV6) and end - l4 >= 8:
+        view.l4_off = l4
+        view.payload_off = l4 + 8
+        return view
+    elif proto not in (PROTO_TCP, PROTO_UDP, PROTO_ICMP, PROTO_ICMPV6):
+        view.l4_off = l4
+        view.payload_off = l4
+        return view
+    view.payload_off = min(l4, n)
+    return view
+
+
+def parse_with_fallback(data):
+    """Fast path first, Scapy only for frames the fast path rejects."""
+    view = parse(data)
+    return view if view is not None else parse_scapy(data)
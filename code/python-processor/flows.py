@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Bounded per-flow state table.
+
+Flows are keyed by a packed 5-tuple (src, dst, proto, sport, dport as a
+single bytes object, see flow_key()) and kept in LRU order, so both
+eviction policies are O(1) per flow:
+
+  * capacity: inserting into a full table evicts the least recently
+    seen flow, so a port scan or a spoofed-source flood can only churn
+    the table, never grow it;
+  * idle timeout: expire() pops flows from the cold end until it meets
+    one seen within `idle_timeout` seconds.
+
+Detectors and mitigators hang their own per-flow state on a record with
+FlowRecord.state(name, factory); it is created on first use only, so
+flows nobody looks at carry no extra dict. `on_evict(record, reason)`
+lets them emit a final verdict before a flow is dropped.
+
+Memory (CPython 3.11, IPv4, no attached state; tests/run_flowtable_benchmark.py):
+about 250 bytes per flow — a 46-byte key, a 96-byte FlowRecord, the
+OrderedDict entry and its hash slot — i.e. ~25 MB at 100k flows.
+"""
+import time
+import struct
+from collections import OrderedDict
+
+_L4 = struct.Struct("!BHH")
+
+
+def flow_key(hdr):
+    """Packed directional 5-tuple of a fastpath.HeaderView."""
+    return bytes(hdr.src) + bytes(hdr.dst) + _L4.pack(hdr.proto, hdr.sport, hdr.dport)
+
+
+def unpack_key(key):
+    """(src, dst, proto, sport, dport) with addresses as bytes."""
+    alen = (len(key) - _L4.size) // 2
+    return (key[:alen], key[alen:2 * alen]) + _L4.unpack_from(key, 2 * alen)
+
+
+class FlowRecord:
+    __slots__ = ("key", "first_seen", "last_seen", "packets", "bytes", "ext")
+
+    def __init__(self, key, now):
+        self.key = key
+        self.first_seen = now
+        self.last_seen = now
+        self.packets = 0
+        self.bytes = 0
+        self.ext = None
+
+    def state(self, name, factory):
+        """Per-flow state owned by `name`, created with factory() on first use."""
+        ext = self.ext
+        if ext is None:
+            ext = self.ext = {}
+        st = ext.get(name)
+        if st is None:
+            st = ext[name] = factory()
+        return st
+
+    def __repr__(self):
+        return f"FlowRecord({unpack_key(self.key)} pkts={self.packets} bytes={self.bytes})"
+
+
+class FlowTable:
+
+    def __init__(self, capacity=65536, idle_timeout=60.0, on_evict=None, clock=time.monotonic):
+        if capacity < 1:
+            raise ValueError("flow table capacity must be >= 1")
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.clock = clock
+        self._flows = OrderedDict()
+
+        # accounting
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    def __len__(self):
+        return len(self._flows)
+
+    def __contains__(self, key):
+        return key in self._flows
+
+    def __iter__(self):
+        """Records from least to most recently seen."""
+        return iter(self._flows.values())
+
+    def get(self, key):
+        return self._flows.get(key)
+
+    def touch(self, key, nbytes, now=None):
+        """Account one packet of `nbytes` to flow `key` and return its record."""
+        if now is None:
+            now = self.clock()
+        flows = self._flows
+        rec = flows.get(key)
+        if rec is None:
+            if len(flows) >= self.capacity:
+                _, old = flows.popitem(last=False)
+                self.evicted_lru += 1
+                if self.on_evict is not None:
+                    self.on_evict(old, "lru")
+            rec = flows[key] = FlowRecord(key, now)
+            self.created += 1
+        else:
+            flows.move_to_end(key)
+        rec.last_seen = now
+        rec.packets += 1
+        rec.bytes += nbytes
+        return rec
+
+    def expire(self, now=None):
+        """Drop flows idle for longer than idle_timeout; returns how many."""
+        if now is None:
+            now = self.clock()
+        cutoff = now - self.idle_timeout
+        flows = self._flows
+        n = 0
+        while flows:
+            rec = next(iter(flows.values()))
+            if rec.last_seen > cutoff:
+                break
+            flows.popitem(last=False)
+            n += 1
+            if self.on_evict is not None:
+                self.on_evict(rec, "idle")
+        self.evicted_idle += n
+        return n
+
+    def stats(self):
+        return {
+            "flows": len(self._flows),
+            "created": self.created,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
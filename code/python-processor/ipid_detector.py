@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Marker-free IP ID covert-channel detector.
+
+Per flow, the IP IDs of the last `window` packets are collected on the
+flow record (flows.FlowTable). A full window is queued as one row of a
+(batch, window) matrix, and the features of all queued windows are
+computed together with NumPy once `batch` rows are waiting (or on
+flush()), so the per-packet cost is one array append:
+
+  incr_frac      share of deltas in 1..max_step (mod 2**16): a kernel
+                 counter, per socket or per destination
+  zero_frac      share of zero deltas: a constant ID (e.g. 0 with DF)
+  entropy        Shannon entropy of the values, normalized to 1.0 when
+                 all IDs in the window are distinct
+  byte_frac      share of IDs below 256 (one ASCII character per ID
+                 is a special case)
+
+A window looks like a normal kernel if it is counter-like (incr_frac
+or zero_frac >= counter_min) or randomized (entropy >= entropy_min and
+IDs spread over 16 bits: byte_frac <= byte_max). Anything else, e.g.
+one character per packet as code/sec/covert_sender.py does, is flagged.
+
+When a flow leaves the flow table, evict() scores what is left of its
+window on its own if it holds at least half a window of IDs.
+
+Windows are scored against `labelled` (the caller's ground truth, today
+the payload marker) and written as rows in the detection_metrics format.
+"""
+import time
+from array import array
+
+import numpy as np
+
+from detector import Confusion
+
+
+class _IdWindow:
+    __slots__ = ("ids", "labelled")
+
+    def __init__(self):
+        self.ids = array("H")
+        self.labelled = False
+
+
+def window_features(ids, max_step=64):
+    """
+    Features of each row of `ids` (uint16, shape (k, n)); returns a dict
+    of float arrays of length k.
+    """
+    ids = np.asarray(ids, dtype=np.uint16)
+    k, n = ids.shape
+    deltas = np.diff(ids.astype(np.int32), axis=1) % 65536
+    incr_frac = ((deltas >= 1) & (deltas <= max_step)).mean(axis=1)
+    zero_frac = (deltas == 0).mean(axis=1)
+
+    # entropy without a per-row np.unique: number the runs of equal
+    # values in each sorted row and bincount them all at once
+    s = np.sort(ids, axis=1)
+    starts = np.ones((k, n), dtype=bool)
+    starts[:, 1:] = s[:, 1:] != s[:, :-1]
+    run = np.cumsum(starts, axis=1) - 1 + (np.arange(k) * n)[:, None]
+    counts = np.bincount(run.ravel(), minlength=k * n).reshape(k, n)
+    p = counts / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+    entropy = h / np.log2(n)
+
+    return {
+        "incr_frac": incr_frac,
+        "zero_frac": zero_frac,
+        "entropy": entropy,
+        "byte_frac": (ids < 256).mean(axis=1),
+    }
+
+
+class IpIdDetector:
+
+    def __init__(self, metrics=None, window=16, batch=64, max_step=64,
+                 counter_min=0.9, entropy_min=0.9, byte_max=0.25, log=print):
+        if window < 4:
+            raise ValueError("IP ID window must hold at least 4 packets")
+        self.metrics = metrics
+        self.window = window
+        self.batch = batch
+        self.max_step = max_step
+        self.counter_min = counter_min
+        self.entropy_min = entropy_min
+        self.byte_max = byte_max
+        self.log = log
+        self.min_partial = max(4, window // 2)
+
+        self._rows = np.empty((batch, window), dtype=np.uint16)
+        self._labels = np.empty(batch, dtype=bool)
+        self._keys = []
+
+        # ─── Metrics bookkeeping ────────────────────────────────────
+        self.score = Confusion()
+        self.windows = 0
+        self.flagged = 0
+
+    def confusion(self):
+        return self.score.as_dict()
+
+    def update(self, flow, ip_id, labelled=False):
+        """Add one packet's IP ID to the window of `flow` (a flows.FlowRecord)."""
+        st = flow.state("ipid", _IdWindow)
+        ids = st.ids
+        ids.append(ip_id)
+        if labelled:
+            st.labelled = True
+        if len(ids) < self.window:
+            return
+        n = len(self._keys)
+        self._rows[n] = np.frombuffer(ids, dtype=np.uint16)
+        self._labels[n] = st.labelled
+        self._keys.append(flow.key)
+        st.ids = array("H")
+        st.labelled = False
+        if n + 1 == self.batch:
+            self.flush()
+
+    def evict(self, flow):
+        """Score the partial window of `flow` before the flow table drops it."""
+        st = flow.ext.get("ipid") if flow.ext else None
+        if st is None or len(st.ids) < self.min_partial:
+            return
+        feats = window_features(np.frombuffer(st.ids, dtype=np.uint16)[None, :], self.max_step)
+        self._record(self.classify(feats), feats, [st.labelled], [flow.key])
+
+    def classify(self, feats):
+        """Boolean array: True where a window does not look like a kernel counter."""
+        counter = np.maximum(feats["incr_frac"], feats["zero_frac"]) >= self.counter_min
+        randomized = (feats["entropy"] >= self.entropy_min) & (feats["byte_frac"] <= self.byte_max)
+        return ~(counter | randomized)
+
+    def flush(self):
+        """Score all queued windows."""
+        n = len(self._keys)
+        if not n:
+            return
+        feats = window_features(self._rows[:n], self.max_step)
+        keys, self._keys = self._keys, []
+        self._record(self.classify(feats), feats, self._labels[:n], keys)
+
+    def _record(self, decisions, feats, labels, keys):
+        n = len(keys)
+        now = time.time()
+        score = self.score
+        for i in range(n):
+            decision = bool(decisions[i])
+            score.add(decision, bool(labels[i]))
+            if decision:
+                self.log(f"[IpId] flow {keys[i].hex()} flagged: "
+                         f"bytes={feats['byte_frac'][i]:.2f} "
+                         f"entropy={feats['entropy'][i]:.2f} "
+                         f"incr={feats['incr_frac'][i]:.2f}")
+            if self.metrics is not None:
+                self.metrics.write(score.row(now))
+        self.windows += n
+        self.flagged += int(decisions.sum())
+
+    def __repr__(self):
+        return f"IpIdDetector(window={self.window}, batch={self.batch})"
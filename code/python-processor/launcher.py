@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Multi-core launcher for the python-processor.
+
+Starts N copies of main.py as worker processes. Every packet of a flow
+(both directions) must land on the same worker, in order:
+
+  * FLOW_PARTITIONS=P (> 0, set for the switch too): the switch publishes
+    each frame on "<subject>.<p>" with p = flow_partition(frame, P), and
+    worker k subscribes to partitions k, k + N, k + 2N, ... directly.
+    Nothing sits between the switch and the workers.
+  * otherwise an in-process relay subscribes to inpktsec/inpktinsec and
+    republishes every frame on "<subject>.<shard>". It parses and
+    re-sends each frame in one Python process, so it caps the throughput
+    of all workers together; use it only with a switch that does not
+    partition.
+
+On shutdown the per-worker detection windows, detection metrics and
+marker hits are merged into the run folder, where run_detector_tests.py
+and tests/detection_eval.py expect them.
+
+    FLOW_PARTITIONS=64 python3 launcher.py --workers 4
+
+`--workers 1` also runs one sharded worker (through the relay without
+FLOW_PARTITIONS), so results compare like for like; run main.py itself
+for a plain single process.
+"""
+import os
+import csv
+import sys
+import time
+import zlib
+import signal
+import asyncio
+import argparse
+import subprocess
+from nats.aio.client import Client as NATS
+
+import fastpath
+from metrics_sink import MetricsSink, read_columnar
+from pipeline import WINDOW_SCHEMA
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IN_SUBJECTS = ("inpktsec", "inpktinsec")
+BASE_RESULTS_DIR = "TPPhase3_results"
+VLAN_TPIDS = (0x8100, 0x88A8, 0x9100)
+NO_PORTS = b"\0\0"
+
+
+def flow_partition(data, partitions):
+    """
+    Partition of a frame's flow; the same function as flow_partition() in
+    the switch (code/mitm/switch/switch.c), keep the two in sync. The key
+    is direction-independent so a flow and its replies hash together:
+    zlib.crc32(lower end + higher end, proto), an end being the address
+    plus the TCP/UDP port (0 for other protocols and non-first IPv4
+    fragments). Non-IP and truncated frames all go to partition 0.
+    """
+    n = len(data)
+    if n < 14:
+        return 0
+    ethertype = (data[12] << 8) | data[13]
+    off = 14
+    while ethertype in VLAN_TPIDS:
+        if n < off + 4:
+            return 0
+        ethertype = (data[off + 2] << 8) | data[off + 3]
+        off += 4
+    if ethertype == 0x0800:
+        if n < off + 20:
+            return 0
+        proto = data[off + 9]
+        a, b = bytes(data[off + 12:off + 16]), bytes(data[off + 16:off + 20])
+        l4 = off + (data[off] & 0x0F) * 4
+        first = ((data[off + 6] & 0x1F) << 8 | data[off + 7]) == 0
+    elif ethertype == 0x86DD:
+        if n < off + 40:
+            return 0
+        proto = data[off + 6]
+        a, b = bytes(data[off + 8:off + 24]), bytes(data[off + 24:off + 40])
+        l4 = off + 40
+        first = True
+    else:
+        return 0
+    if first and proto in (fastpath.PROTO_TCP, fastpath.PROTO_UDP) and n >= l4 + 4:
+        a += bytes(data[l4:l4 + 2])
+        b += bytes(data[l4 + 2:l4 + 4])
+    else:
+        a += NO_PORTS
+        b += NO_PORTS
+    key = (a + b) if a <= b else (b + a)
+    return zlib.crc32(key, proto) % partitions
+
+
+async def dispatch(nats_url, workers, stop):
+    nc = NATS()
+    await nc.connect(nats_url)
+    counts = [0] * workers
+
+    async def handler(msg):
+        shard = flow_partition(msg.data, workers)
+        counts[shard] += 1
+        # keep headers: the switch's trace stamp must reach the worker
+        await nc.publish(f"{msg.subject}.{shard}", msg.data, headers=msg.headers)
+
+    for subject in IN_SUBJECTS:
+        await nc.subscribe(subject, cb=handler)
+    print(f"[Launcher] dispatching {'/'.join(IN_SUBJECTS)} over {workers} workers")
+    await stop.wait()
+    await nc.drain()
+    print(f"[Launcher] frames per worker: {counts}")
+
+
+def start_workers(workers, run_dir):
+    procs = []
+    for shard in range(workers):
+        env = dict(os.environ,
+                   PROCESSOR_SHARD=str(shard),
+                   PROCESSOR_WORKERS=str(workers),
+                   RESULTS_DIR=os.path.join(run_dir, f"worker-{shard}"))
+        procs.append(subprocess.Popen([sys.executable, os.path.join(HERE, "main.py")], env=env))
+    return procs
+
+
+def load_worker_metrics(path):
+    """Rows of (window_end, TP, FP, TN, FN) from a csv or bin metrics file."""
+    if path.endswith(".bin"):
+        cols = read_columnar(path)
+        return list(zip(cols["window_end"], cols["TP"], cols["FP"], cols["TN"], cols["FN"]))
+    with open(path, newline="") as f:
+        return [(float(r["window_end"]), int(r["TP"]), int(r["FP"]), int(r["TN"]), int(r["FN"]))
+                for r in csv.DictReader(f)]
+
+
+def merge_metrics(run_dir, workers, stem):
+    events = []
+    for shard in range(workers):
+        wdir = os.path.join(run_dir, f"worker-{shard}")
+        for name in (f"{stem}.csv", f"{stem}.bin"):
+            path = os.path.join(wdir, name)
+            if os.path.exists(path):
+                events.extend((row[0], shard, row[1:]) for row in load_worker_metrics(path))
+    if not events:
+        return
+    events.sort()
+
+    latest = [(0, 0, 0, 0)] * workers
+    out_path = os.path.join(run_dir, f"{stem}.csv")
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["window_end", "TP", "FP", "TN", "FN", "Precision", "Recall", "F1"])
+        for window_end, shard, counts in events:
+            latest[shard] = counts
+            TP, FP, TN, FN = (sum(c[i] for c in latest) for i in range(4))
+            precision = TP / (TP + FP) if (TP + FP) else 0.0
+            recall    = TP / (TP + FN) if (TP + FN) else 0.0
+            f1        = (2 * precision * recall / (precision + recall)
+                         if (precision + recall) else 0.0)
+            writer.writerow([window_end, TP, FP, TN, FN,
+                             round(precision, 3), round(recall, 3), round(f1, 3)])
+    print(f"[Launcher] merged {len(events)} windows into {out_path}")
+
+
+def merge_windows(run_dir, workers):
+    """The workers' detection_windows.bin files as one, ordered by t_last."""
+    rows = []
+    for shard in range(workers):
+        path = os.path.join(run_dir, f"worker-{shard}", "detection_windows.bin")
+        if os.path.exists(path):
+            cols = read_columnar(path)
+            rows.extend(zip(*(cols[name] for name, _ in WINDOW_SCHEMA)))
+    if not rows:
+        return
+    rows.sort(key=lambda row: row[1])
+
+    out_path = os.path.join(run_dir, "detection_windows.bin")
+    if os.path.exists(out_path):
+        os.remove(out_path)  # MetricsSink would append
+    sink = MetricsSink(out_path, WINDOW_SCHEMA, fmt="bin", batch_rows=len(rows))
+    for row in rows:
+        sink.write(row)
+    sink.close()
+    print(f"[Launcher] merged {len(rows)} detector windows into {out_path}")
+
+
+def aggregate(run_dir, workers):
+    """
+    Merge the workers' detector windows into one detection_windows.bin
+    and their cumulative confusion counts into time-ordered
+    detection_metrics.csv, ipid_detection_metrics.csv and
+    timing_detection_metrics.csv files, plus a summed marker_hits.csv.
+    """
+    merge_windows(run_dir, workers)
+    for stem in ("detection_metrics", "ipid_detection_metrics", "timing_detection_metrics"):
+        merge_metrics(run_dir, workers, stem)
+
+    hits = {}
+    for shard in range(workers):
+        path = os.path.join(run_dir, f"worker-{shard}", "marker_hits.csv")
+        if os.path.exists(path):
+            with open(path, newline="") as f:
+                for r in csv.DictReader(f):
+                    hits[r["marker"]] = hits.get(r["marker"], 0) + int(r["packets"])
+    if hits:
+        with open(os.path.join(run_dir, "marker_hits.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["marker", "packets"])
+            writer.writerows(hits.items())
+
+
+async def run(workers, partitions):
+    nats_url = os.getenv("NATS_SURVEYOR_SERVERS", "nats://nats:4222")
+    run_dir = os.path.join(BASE_RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    procs = start_workers(workers, run_dir)
+    try:
+        if partitions:
+            print(f"[Launcher] {workers} workers subscribed to {partitions} flow partitions")
+            await stop.wait()
+        else:
+            await dispatch(nats_url, workers, stop)
+    finally:
+        for p in procs:
+            p.send_signal(signal.SIGTERM)
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        aggregate(run_dir, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded python-processor launcher")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("PROCESSOR_WORKERS", str(os.cpu_count() or 1))),
+                        help="Number of worker processes (default: one per core)")
+    parser.add_argument("--partitions", type=int,
+                        default=int(os.getenv("FLOW_PARTITIONS", "0")),
+                        help="Flow partitions the switch publishes on (0: relay in this process)")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.partitions and args.workers > args.partitions:
+        parser.error(f"{args.workers} workers need at least as many partitions, not {args.partitions}")
+    os.environ["FLOW_PARTITIONS"] = str(args.partitions)
+    asyncio.run(run(args.workers, args.partitions))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,131 +1,339 @@
 #!/usr/bin/env python3
 import os
 import time
-import csv
-import random
+import signal
 import asyncio
 from nats.aio.client import Client as NATS
-from scapy.all import Ether, IP
+
+import fastpath
+from pipeline import Pipeline, DETECTION_SCHEMA, WINDOW_SCHEMA
+from scheduler import DelayScheduler
+from egress import Egress
+from detector import SlidingWindowDetector
+from metrics_sink import MetricsSink, RateLimitedLog
+from matcher import MarkerMatcher, load_markers
+from prom import ProcessorMetrics
+from flows import FlowTable
+from mitigation import MitigationPolicy, load_policy
+from randpool import make_delay_pool, make_ip_id_pool, seed_for
+from ipid_detector import IpIdDetector
+from timing_detector import TimingDetector, load_baseline
+from tracing import from_headers as trace_from_headers
+from control import Controller, CONTROL_SUBJECT as DEFAULT_CONTROL_SUBJECT
+
+# ─── Header parsing mode ────────────────────────────────────────────
+# "fast"  → zero-copy offset parser, Scapy only for frames it rejects
+# "scapy" → full Scapy dissection of every frame (the old behaviour)
+PARSER_MODE = os.getenv("PARSER_MODE", "fast")
+parse_frame = (fastpath.parse_scapy if PARSER_MODE == "scapy"
+               else fastpath.parse_with_fallback)
 
 # ─── Phase 4: Mitigation flag ──────────────────────────────────────
 # Controlled via environment variable, disabled by default.
 MITIGATE_ACTIVE = os.getenv("MITIGATE_ACTIVE", "0") == "1"
+# Rules to apply when mitigating (see mitigation.py); without a policy
+# file MITIGATE_ACTIVE=1 randomizes the IP ID only
+MITIGATION_POLICY = os.getenv("MITIGATION_POLICY")
 
 # ─── Phase 2: Random-delay parameters ───────────────────────────────
 # in ms; you can still override via ENV if you like
-MEAN_DELAY_MS = 200
+MEAN_DELAY_MS = float(os.getenv("MEAN_DELAY_MS", "200"))
+# Frames waiting for their departure time; "drop" or "block" when full
+DELAY_QUEUE_MAX = int(os.getenv("DELAY_QUEUE_MAX", "10000"))
+DELAY_QUEUE_POLICY = os.getenv("DELAY_QUEUE_POLICY", "drop")
+# delay distribution: uniform = U(0, MEAN_DELAY_MS) as before, or
+# uniform_mean (U(0, 2 * MEAN_DELAY_MS)) / exponential / normal / pareto
+# with mean MEAN_DELAY_MS
+DELAY_DIST = os.getenv("DELAY_DIST", "uniform")
+DELAY_SD_MS = float(os.getenv("DELAY_SD_MS", str(MEAN_DELAY_MS / 4)))
+DELAY_PARETO_SHAPE = float(os.getenv("DELAY_PARETO_SHAPE", "2.5"))
+# independent = every frame gets its own delay (frames of a flow may be
+# reordered); ordered = delays are still drawn per frame, but a frame
+# never leaves before the previous frame of its flow
+DELAY_MODE = os.getenv("DELAY_MODE", "independent")
+
+# ─── Random sources ─────────────────────────────────────────────────
+# delays and mitigation IP IDs come from precomputed NumPy blocks;
+# set RANDOM_SEED to replay an experiment with the same random values
+RANDOM_SEED = os.getenv("RANDOM_SEED") or None
+RANDOM_POOL_BLOCK = int(os.getenv("RANDOM_POOL_BLOCK", "65536"))
+
+# ─── NATS egress / backpressure ─────────────────────────────────────
+# outbound buffer: pause ingress above HIGH_WATER, drop above MAX_QUEUED
+EGRESS_HIGH_WATER = int(os.getenv("EGRESS_HIGH_WATER", str(4 * 1024 * 1024)))
+EGRESS_MAX_QUEUED = int(os.getenv("EGRESS_MAX_QUEUED", str(16 * 1024 * 1024)))
+# client-side pending limits per ingress subscription (slow consumer beyond)
+SUB_PENDING_MSGS = int(os.getenv("SUB_PENDING_MSGS", "65536"))
+SUB_PENDING_BYTES = int(os.getenv("SUB_PENDING_BYTES", str(64 * 1024 * 1024)))
+# server monitoring endpoint, polled for slow consumers (empty = off)
+NATS_MONITOR_URL = os.getenv("NATS_MONITOR_URL", "http://nats:8222/varz")
 
 # ─── Phase 3: Sliding-window detector parameters ─────────────────────
 WINDOW_SIZE = int(os.getenv("DETECTION_WINDOW_SIZE", "20"))
-# byte-string marker to look for
-MARKER = os.getenv("DETECTION_MARKER", "CovertChannel").encode()
+# if > 0, use a time-based window of this many ms instead of WINDOW_SIZE packets
+WINDOW_MS = int(os.getenv("DETECTION_WINDOW_MS", "0"))
+# byte-string marker(s) to look for in the L4 payload; the list and the
+# file (one marker per line) are added to DETECTION_MARKER
+MARKERS = load_markers(
+    os.getenv("DETECTION_MARKER", "CovertChannel"),
+    os.getenv("DETECTION_MARKERS"),
+    os.getenv("DETECTION_MARKER_FILE"),
+)
+
+# ─── Marker-free IP ID detector ─────────────────────────────────────
+# per-flow IP ID windows of IPID_WINDOW packets, scored IPID_BATCH at a time
+IPID_DETECTOR = os.getenv("IPID_DETECTOR", "1") == "1"
+IPID_WINDOW = int(os.getenv("IPID_WINDOW", "16"))
+IPID_BATCH = int(os.getenv("IPID_BATCH", "64"))
+
+# ─── Inter-arrival timing detector ──────────────────────────────────
+# per-flow log-scale IAT histograms; every TIMING_WINDOW gaps a flow is
+# flagged if their entropy is below TIMING_MIN_ENTROPY bits or in the
+# lowest TIMING_ALPHA share of the baseline. TIMING_BASELINE is a
+# timing_baseline.csv from an earlier (benign) run, otherwise the
+# baseline is learned online
+TIMING_DETECTOR = os.getenv("TIMING_DETECTOR", "1") == "1"
+TIMING_WINDOW = int(os.getenv("TIMING_WINDOW", "32"))
+TIMING_MIN_ENTROPY = float(os.getenv("TIMING_MIN_ENTROPY", "2.0"))
+TIMING_ALPHA = float(os.getenv("TIMING_ALPHA", "0.01"))
+TIMING_BASELINE = os.getenv("TIMING_BASELINE")
+
+# ─── Per-flow state ─────────────────────────────────────────────────
+# bounded 5-tuple table (~250 B per flow); least recently seen flows are
+# evicted when full, and flows idle for FLOW_IDLE_S are expired
+FLOW_TABLE_MAX = int(os.getenv("FLOW_TABLE_MAX", "65536"))
+FLOW_IDLE_S = float(os.getenv("FLOW_IDLE_S", "60"))
+
+# ─── Metrics output ─────────────────────────────────────────────────
+# every scored window of the marker detector goes to detection_windows.bin
+# as (t_first, t_last, markers, decision); tests/detection_eval.py labels
+# the windows from the covert sender's manifest. DETECTION_SELF_SCORE=1
+# also writes the old detection_metrics rows, whose ground truth is the
+# window's own marker count (FP = FN = 0 by construction)
+DETECTION_SELF_SCORE = os.getenv("DETECTION_SELF_SCORE", "0") == "1"
+# "csv" → detection_metrics.csv, "bin" → columnar detection_metrics.bin
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "csv")
+# rows are written in batches off the event loop: whichever comes first
+METRICS_BATCH_ROWS = int(os.getenv("METRICS_BATCH_ROWS", "500"))
+METRICS_FLUSH_MS = int(os.getenv("METRICS_FLUSH_MS", "1000"))
+# at most one [Detector] console line per interval
+LOG_INTERVAL_MS = int(os.getenv("LOG_INTERVAL_MS", "1000"))
+# Prometheus /metrics port (workers use METRICS_PORT + shard); 0 disables
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8000"))
 
-# ─── Metrics bookkeeping ────────────────────────────────────────────
-TP = FP = TN = FN = 0
-packet_window = []  # list of (timestamp, is_marker)
+# ─── Live reconfiguration (see control.py) ──────────────────────────
+# JSON requests on this subject swap the delay distribution, mitigation
+# policy, detection window and marker set without a restart; empty = off
+CONTROL_SUBJECT = os.getenv("CONTROL_SUBJECT", DEFAULT_CONTROL_SUBJECT)
+
+# ─── Sharding (set by launcher.py) ──────────────────────────────────
+# When set, this process is worker SHARD of PROCESSOR_WORKERS and only
+# receives its share of the flows: with FLOW_PARTITIONS the switch's
+# partitions SHARD, SHARD + workers, ... ("<subject>.<partition>"),
+# otherwise what launcher.py's relay sends it on "<subject>.<shard>".
+# Unsharded, it takes the plain subjects and, with FLOW_PARTITIONS,
+# every partition.
+SHARD = os.getenv("PROCESSOR_SHARD")
+WORKERS = int(os.getenv("PROCESSOR_WORKERS", "1"))
+FLOW_PARTITIONS = int(os.getenv("FLOW_PARTITIONS", "0"))
+
+# ─── Detector state ─────────────────────────────────────────────────
+detector = SlidingWindowDetector(size=WINDOW_SIZE, window_ms=WINDOW_MS)
+matcher = MarkerMatcher(MARKERS)
 
 # Create one timestamped subfolder under TPPhase3_results
 BASE_RESULTS_DIR = "TPPhase3_results"
 timestamp = time.strftime("%Y%m%d-%H%M%S")
-results_dir = os.path.join(BASE_RESULTS_DIR, timestamp)
+results_dir = os.getenv("RESULTS_DIR") or os.path.join(BASE_RESULTS_DIR, timestamp)
 os.makedirs(results_dir, exist_ok=True)
-csv_path = os.path.join(results_dir, "detection_metrics.csv")
+metrics_path = os.path.join(results_dir, f"detection_metrics.{METRICS_FORMAT}")
 
-# Write CSV header only if the file is new/empty
-if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "window_end", "TP", "FP", "TN", "FN",
-            "Precision", "Recall", "F1"
-        ])
 
+def open_metrics(path):
+    return MetricsSink(
+        path,
+        DETECTION_SCHEMA,
+        fmt=METRICS_FORMAT,
+        batch_rows=METRICS_BATCH_ROWS,
+        flush_interval=METRICS_FLUSH_MS / 1000.0,
+    )
+
+
+metrics = open_metrics(metrics_path) if DETECTION_SELF_SCORE else None
+windows = MetricsSink(os.path.join(results_dir, "detection_windows.bin"), WINDOW_SCHEMA,
+                      fmt="bin", batch_rows=max(METRICS_BATCH_ROWS, 4096),
+                      flush_interval=METRICS_FLUSH_MS / 1000.0)
+log = RateLimitedLog(LOG_INTERVAL_MS / 1000.0)
+
+ipid = None
+if IPID_DETECTOR:
+    ipid = IpIdDetector(
+        open_metrics(os.path.join(results_dir, f"ipid_detection_metrics.{METRICS_FORMAT}")),
+        window=IPID_WINDOW, batch=IPID_BATCH,
+        log=RateLimitedLog(LOG_INTERVAL_MS / 1000.0))
+
+timing = None
+if TIMING_DETECTOR:
+    timing = TimingDetector(
+        open_metrics(os.path.join(results_dir, f"timing_detection_metrics.{METRICS_FORMAT}")),
+        window=TIMING_WINDOW, min_entropy=TIMING_MIN_ENTROPY, alpha=TIMING_ALPHA,
+        baseline=load_baseline(TIMING_BASELINE) if TIMING_BASELINE else None,
+        log=RateLimitedLog(LOG_INTERVAL_MS / 1000.0))
 
-async def run():
-    global TP, FP, TN, FN, packet_window
 
+def score_evicted(flow, reason=None):
+    """FlowTable on_evict: score the per-flow windows a dropped flow leaves behind."""
+    if ipid is not None:
+        ipid.evict(flow)
+    if timing is not None:
+        timing.evict(flow)
+
+
+flows = FlowTable(capacity=FLOW_TABLE_MAX, idle_timeout=FLOW_IDLE_S, on_evict=score_evicted)
+
+
+async def run():
     nc = NATS()
     nats_url = os.getenv("NATS_SURVEYOR_SERVERS", "nats://nats:4222")
-    await nc.connect(nats_url)
-
-    async def message_handler(msg):
-        global TP, FP, TN, FN, packet_window
-
-        data = msg.data
-        pkt = Ether(data)
-
-        # ─── Phase 4: Mitigation ───────────────────────────────────
-        # If active, randomize the IP ID field to disrupt covert channels
-        # that rely on it. This happens *before* detection.
-        if MITIGATE_ACTIVE and IP in pkt:
-            pkt[IP].id = random.randint(0, 0xFFFF)
-            data = bytes(pkt) # Update the raw data with the modified packet
-
-        # ─── Phase 3: Detection ───────────────────────────────────
-        if IP in pkt:
-            is_marker = (MARKER in data)
-
-            # slide the window
-            packet_window.append((time.time(), is_marker))
-            if len(packet_window) > WINDOW_SIZE:
-                packet_window.pop(0)
-
-            # once we have a full window, score it
-            if len(packet_window) == WINDOW_SIZE:
-                # Decision is positive if any packet in the window has the marker
-                decision = any(flag for (_, flag) in packet_window)
-                # Ground truth is whether a marker was actually present
-                true_label = any(flag for (_, flag) in packet_window)
-
-                # update confusion counts
-                if decision and true_label:
-                    TP += 1
-                elif decision and not true_label:
-                    FP += 1
-                elif not decision and not true_label:
-                    TN += 1
-                else: # not decision and true_label
-                    FN += 1
-
-                # compute metrics
-                precision = TP / (TP + FP) if (TP + FP) else 0.0
-                recall    = TP / (TP + FN) if (TP + FN) else 0.0
-                f1        = (2 * precision * recall / (precision + recall)
-                             if (precision + recall) else 0.0)
-
-                # append to CSV
-                with open(csv_path, "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        time.time(), TP, FP, TN, FN,
-                        round(precision, 3),
-                        round(recall,    3),
-                        round(f1,        3)
-                    ])
-
-                print(f"[Detector] TP={TP} FP={FP} TN={TN} FN={FN} F1={f1:.3f}")
-
-        # ─── Phase 2: Random delay before forwarding ────────────────
-        delay = random.uniform(0, MEAN_DELAY_MS / 1000.0)
-        await asyncio.sleep(delay)
-
-        # Forward on the correct topic
-        out_topic = "outpktinsec" if msg.subject == "inpktsec" else "outpktsec"
-        await nc.publish(out_topic, data)
+    egress = Egress(nc,
+                    high_water=EGRESS_HIGH_WATER,
+                    max_queued=EGRESS_MAX_QUEUED,
+                    log=RateLimitedLog(LOG_INTERVAL_MS / 1000.0))
+    await nc.connect(nats_url, error_cb=egress.on_error,
+                     pending_size=EGRESS_MAX_QUEUED)
+    if NATS_MONITOR_URL:
+        server_watch = asyncio.create_task(egress.watch_server(NATS_MONITOR_URL))
+
+    scheduler = DelayScheduler(egress.publish, max_queue=DELAY_QUEUE_MAX,
+                               policy=DELAY_QUEUE_POLICY,
+                               log=RateLimitedLog(LOG_INTERVAL_MS / 1000.0))
+    scheduler.start()
+
+    def snapshot():
+        sched, eg = scheduler.stats(), egress.stats()
+        return {
+            "packets_in": dict(pipeline.packets_in),
+            "packets_out": dict(egress.out_by_subject),
+            "decisions": pipeline.decisions(),
+            "mitigation_rules": pipeline.policy.stats() if pipeline.policy else {},
+            "queue_depth": sched["depth"],
+            "drops": {"delay_queue": sched["dropped"], "egress": eg["dropped"],
+                      "slow_consumer": eg["slow_consumers"]},
+            "extra_counters": {"egress_paused_seconds": eg["paused_s"],
+                               "egress_pauses": eg["pauses"]},
+            "extra_gauges": {"delay_late_max_ms": sched["late_max_ms"],
+                             "egress_queued_bytes": eg["queued_bytes"],
+                             "flows_active": len(flows),
+                             "ipid_flagged_windows": ipid.flagged if ipid else 0,
+                             "timing_flagged_windows": timing.flagged if timing else 0,
+                             "config_version": controller.version},
+        }
 
+    delays = make_delay_pool(DELAY_DIST, MEAN_DELAY_MS, sd_ms=DELAY_SD_MS,
+                             shape=DELAY_PARETO_SHAPE, block=RANDOM_POOL_BLOCK,
+                             seed=seed_for(RANDOM_SEED, "delay", SHARD))
+    ip_ids = make_ip_id_pool(block=RANDOM_POOL_BLOCK,
+                             seed=seed_for(RANDOM_SEED, "ip_id", SHARD))
+    policy = None
+    if MITIGATE_ACTIVE and MITIGATION_POLICY:
+        policy = MitigationPolicy(load_policy(MITIGATION_POLICY), rand=ip_ids.getrandbits)
+
+    pipeline = Pipeline(scheduler.submit, metrics, detector, matcher, windows=windows,
+                        parse=parse_frame, mitigate=MITIGATE_ACTIVE, policy=policy,
+                        mean_delay_ms=MEAN_DELAY_MS, log=log,
+                        flows=flows, ipid=ipid, timing=timing,
+                        delay=delays.draw, ip_ids=ip_ids.getrandbits,
+                        ordered=DELAY_MODE == "ordered")
+
+    controller = Controller(pipeline, delays,
+                            {"dist": DELAY_DIST, "mean_ms": MEAN_DELAY_MS,
+                             "sd_ms": DELAY_SD_MS, "shape": DELAY_PARETO_SHAPE},
+                            ip_ids, seed=RANDOM_SEED, shard=SHARD, block=RANDOM_POOL_BLOCK)
+
+    # only now does everything snapshot() reads exist
+    port = METRICS_PORT + int(SHARD) if METRICS_PORT and SHARD is not None else METRICS_PORT
+    pipeline.stage = ProcessorMetrics(port, snapshot, shard=SHARD).stage
+
+    def message_handler(subject):
+        # frames of every partition are counted and forwarded under `subject`
+        async def handle(msg):
+            # frames the switch marked for tracing carry a header (tracing.py)
+            trace = trace_from_headers(msg.headers)
+            # hold off while the egress side is backed up
+            await egress.wait_ready()
+            await pipeline.handle(subject, msg.data, trace=trace)
+        return handle
 
     # subscribe to both directions
-    await nc.subscribe("inpktsec",   cb=message_handler)
-    await nc.subscribe("inpktinsec", cb=message_handler)
-
-    print(f"Processor running → MITIGATE_ACTIVE={MITIGATE_ACTIVE} | MEAN_DELAY_MS={MEAN_DELAY_MS} ms | WINDOW_SIZE={WINDOW_SIZE}")
-    try:
-        # just keep it alive
-        while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
-        print("Shutting down…")
-        await nc.close()
+    suffix = f".{SHARD}" if SHARD is not None else ""
+    for subject in ("inpktsec", "inpktinsec"):
+        if SHARD is None:
+            subjects = [subject] + ([f"{subject}.*"] if FLOW_PARTITIONS else [])
+        elif FLOW_PARTITIONS:
+            subjects = [f"{subject}.{p}" for p in range(int(SHARD), FLOW_PARTITIONS, WORKERS)]
+        else:
+            subjects = [subject + suffix]
+        handler = message_handler(subject)
+        for name in subjects:
+            await nc.subscribe(name, cb=handler,
+                               pending_msgs_limit=SUB_PENDING_MSGS,
+                               pending_bytes_limit=SUB_PENDING_BYTES)
+    if CONTROL_SUBJECT:
+        await nc.subscribe(CONTROL_SUBJECT, cb=controller.handle)
+
+    print(f"Processor{' shard ' + SHARD if suffix else ''} running → PARSER_MODE={PARSER_MODE} | MITIGATE_ACTIVE={MITIGATE_ACTIVE}{f' ({pipeline.policy})' if pipeline.policy else ''} | MEAN_DELAY_MS={MEAN_DELAY_MS} ms ({DELAY_DIST}, {DELAY_MODE}) | DELAY_QUEUE_MAX={DELAY_QUEUE_MAX} ({DELAY_QUEUE_POLICY}) | WINDOW={detector} | {matcher} | FLOW_TABLE_MAX={FLOW_TABLE_MAX} | CONTROL={CONTROL_SUBJECT or 'off'}")
+    # pkill/docker stop send SIGTERM; shut down cleanly so buffered
+    # metrics reach the disk
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # just keep it alive, flushing metrics on the time trigger
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=METRICS_FLUSH_MS / 1000.0)
+        except asyncio.TimeoutError:
+            pass
+        windows.poll()
+        if metrics is not None:
+            metrics.poll()
+        flows.expire()
+        if ipid is not None:
+            # score partially filled batches so verdicts are never stale
+            ipid.flush()
+            ipid.metrics.poll()
+        if timing is not None:
+            timing.metrics.poll()
+
+    print("Shutting down…")
+    await scheduler.stop()
+    controller.close()
+    ip_ids.close()
+    await egress.flush()
+    if NATS_MONITOR_URL:
+        server_watch.cancel()
+    print(f"[Control] config version {controller.version}, {controller.rejected} requests rejected")
+    print(f"[Scheduler] {scheduler.stats()}")
+    print(f"[Egress] {egress.stats()}")
+    print(f"[Flows] {flows.stats()}")
+    if pipeline.policy:
+        print(f"[Mitigation] {pipeline.policy.stats()}")
+    await nc.close()
+    for flow in flows:
+        score_evicted(flow)
+    windows.close()
+    if metrics is not None:
+        metrics.close()
+    if ipid is not None:
+        ipid.flush()
+        ipid.metrics.close()
+        print(f"[IpId] {ipid.windows} windows scored, {ipid.flagged} flagged, {ipid.confusion()}")
+    if timing is not None:
+        timing.metrics.close()
+        timing.save_baseline(os.path.join(results_dir, "timing_baseline.csv"))
+        print(f"[Timing] {timing.windows} windows scored, {timing.flagged} flagged, {timing.confusion()}")
+    pipeline.write_marker_hits(results_dir)
 
 
 if __name__ == "__main__":
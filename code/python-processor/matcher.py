@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Multi-pattern payload matching for the Phase 3 detector.
+
+Every scan stays in C for payloads without a marker, which is nearly all
+of them:
+  * up to SUBSTRING_MAX markers, one `in` search per marker;
+  * above that, the markers are compiled into one trie-shaped regular
+    expression (common prefixes shared, so a payload position costs a
+    walk down the trie rather than one try per marker), and a payload
+    only needs a single re.search() to be ruled out.
+A payload the regex does match is scanned with an Aho-Corasick automaton
+flattened into a full DFA table (256 transitions per state) to list every
+marker it holds; that walk is a Python loop per byte, so it is kept off
+the common path. tests/run_matcher_benchmark.py measures all three.
+"""
+import re
+
+# up to this many markers, separate substring searches beat the regex
+# (tests/run_matcher_benchmark.py, 128- to 1400-byte payloads)
+SUBSTRING_MAX = 8
+
+
+def load_markers(single=None, listed=None, path=None):
+    """
+    Build the marker list from the detector's env settings:
+      single – DETECTION_MARKER, one string
+      listed – DETECTION_MARKERS, comma separated
+      path   – DETECTION_MARKER_FILE, one marker per line ('#' comments);
+               lines starting with "hex:" are hex-encoded bytes
+    Later sources are added after earlier ones; duplicates are dropped.
+    """
+    markers = []
+    if single:
+        markers.append(single.encode())
+    if listed:
+        markers.extend(m.strip().encode() for m in listed.split(",") if m.strip())
+    if path:
+        with open(path) as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                if line.startswith("hex:"):
+                    markers.append(bytes.fromhex(line[4:]))
+                else:
+                    markers.append(line.encode())
+    return list(dict.fromkeys(markers))
+
+
+class MarkerMatcher:
+    """
+    scan(buf) returns the sorted indices of the patterns found in `buf`
+    (bytes, bytearray or memoryview); `patterns[i]` gives the marker.
+    `substring_max` overrides SUBSTRING_MAX (benchmarks force either path).
+    """
+
+    def __init__(self, patterns, substring_max=SUBSTRING_MAX):
+        if not patterns:
+            raise ValueError("MarkerMatcher needs at least one pattern")
+        self.patterns = list(patterns)
+        self.states = 0
+        if len(self.patterns) <= substring_max:
+            self._regex = None
+        else:
+            self._regex = re.compile(_trie_regex(self.patterns))
+            self._compile()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _compile(self):
+        # 1) trie
+        goto = [{}]
+        out = [()]
+        for idx, pat in enumerate(self.patterns):
+            s = 0
+            for b in pat:
+                nxt = goto[s].get(b)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[s][b] = nxt
+                    goto.append({})
+                    out.append(())
+                s = nxt
+            out[s] += (idx,)
+
+        # 2) failure links in BFS order, filling the full DFA as we go
+        n = len(goto)
+        delta = [0] * (n * 256)
+        fail = [0] * n
+        order = []
+        for b, s in goto[0].items():
+            delta[b] = s
+            order.append(s)
+        for s in order:
+            base = s * 256
+            fbase = fail[s] * 256
+            delta[base:base + 256] = delta[fbase:fbase + 256]
+            for b, t in goto[s].items():
+                fail[t] = delta[fbase + b]
+                out[t] += out[fail[t]]
+                delta[base + b] = t
+                order.append(t)
+
+        # store next states pre-multiplied by 256 so the scan loop is a
+        # single add + index per byte
+        self._delta = [t * 256 for t in delta]
+        self._out = {s * 256: o for s, o in enumerate(out) if o}
+        self.states = n
+
+    def scan(self, buf):
+        if self._regex is None:
+            data = bytes(buf)
+            return [i for i, pat in enumerate(self.patterns) if pat in data]
+        if self._regex.search(buf) is None:
+            return []
+        return self.walk(buf)
+
+    def walk(self, buf):
+        """The DFA scan on its own (scan() only runs it on regex hits)."""
+        delta = self._delta
+        out = self._out
+        s = 0
+        hits = set()
+        for b in buf:
+            s = delta[s + b]
+            if s in out:
+                hits.update(out[s])
+        return sorted(hits)
+
+    def __repr__(self):
+        return f"MarkerMatcher({len(self.patterns)} patterns)"
+
+
+def _trie_regex(patterns):
+    """Regex (bytes) matching wherever any of `patterns` starts."""
+    trie = {}
+    for pat in patterns:
+        node = trie
+        for b in pat:
+            node = node.setdefault(b, {})
+        node[None] = None  # a pattern ends here
+
+    def emit(node):
+        alts = [re.escape(bytes([b])) + emit(child)
+                for b, child in sorted((b, c) for b, c in node.items() if b is not None)]
+        if not alts:
+            return b""
+        if None in node:
+            # a pattern ends here, so the rest is optional
+            return b"(?:" + b"|".join(alts) + b")?"
+        if len(alts) == 1:
+            return alts[0]
+        return b"(?:" + b"|".join(alts) + b")"
+
+    return emit(trie)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Buffered, batched metrics output for the processor.
+
+Rows are appended to an in-memory list on the event loop and handed to a
+background writer thread in batches, either when `batch_rows` rows are
+pending or when `flush_interval` seconds have passed since the last
+flush. No file I/O happens on the event-loop thread.
+
+An exception in the writer thread stops it; the next flush(), poll() or
+close() raises it on the caller's thread.
+
+Two on-disk formats:
+  * "csv" – same layout as before (header row + one row per record);
+  * "bin" – compact columnar blocks, see write_columnar_header() and
+            read_columnar().
+"""
+import os
+import csv
+import time
+import queue
+import struct
+import threading
+from array import array
+
+BIN_MAGIC = b"MBXM"
+
+
+class MetricsSink:
+    """
+    `schema` is a list of (column_name, array_typecode) pairs, e.g.
+    [("window_end", "d"), ("TP", "q")]. The typecodes are only used by
+    the binary format; CSV just writes the values. Appending to an
+    existing file with a different header raises ValueError.
+    """
+
+    def __init__(self, path, schema, fmt="csv", batch_rows=500, flush_interval=1.0):
+        if fmt not in ("csv", "bin"):
+            raise ValueError(f"unknown metrics format: {fmt}")
+        self.path = path
+        self.schema = schema
+        self.fmt = fmt
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._writer, name="metrics-sink", daemon=True)
+
+        # Write the header only if the file is new/empty
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                if fmt == "csv":
+                    f.write((",".join(name for name, _ in schema) + "\r\n").encode())
+                else:
+                    write_columnar_header(f, schema)
+        else:
+            self._check_header()
+        self._thread.start()
+
+    def write(self, row):
+        """Buffer one row (a sequence matching the schema)."""
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_rows:
+            self.flush()
+
+    def poll(self):
+        """Flush if the time trigger has expired; call this periodically."""
+        if self._rows and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Hand the pending rows to the writer thread (non-blocking)."""
+        self._raise_error()
+        self._last_flush = time.monotonic()
+        if self._rows:
+            batch, self._rows = self._rows, []
+            self._queue.put(batch)
+
+    def close(self):
+        """Flush everything and wait for the writer thread to finish."""
+        if self._error is None and self._rows:
+            self._queue.put(self._rows)
+            self._rows = []
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"metrics writer for {self.path} failed") from self._error
+
+    def _check_header(self):
+        if self.fmt == "csv":
+            with open(self.path, newline="") as f:
+                found = next(csv.reader(f), [])
+            expected = [name for name, _ in self.schema]
+        else:
+            with open(self.path, "rb") as f:
+                head = f.read(6)
+                # at most 2 + 255 bytes per column follow
+                ncols = struct.unpack("<H", head[4:6])[0] if len(head) == 6 else 0
+                found, _ = _read_columnar_schema(head + f.read(257 * ncols), self.path)
+            expected = [tuple(c) for c in self.schema]
+        if found != expected:
+            raise ValueError(f"{self.path} has columns {found}, expected {expected}")
+
+    def _writer(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                with open(self.path, "ab") as f:
+                    if self.fmt == "csv":
+                        self._write_csv(f, batch)
+                    else:
+                        self._write_bin(f, batch)
+            except Exception as e:
+                # keep the error for the caller; later batches are lost
+                self._error = e
+                return
+            self.rows_written += len(batch)
+
+    def _write_csv(self, f, batch):
+        lines = []
+        writer = csv.writer(_LineBuffer(lines))
+        writer.writerows(batch)
+        f.write("".join(lines).encode())
+
+    def _write_bin(self, f, batch):
+        parts = [struct.pack("<I", len(batch))]
+        for col, (_, code) in enumerate(self.schema):
+            parts.append(array(code, (row[col] for row in batch)).tobytes())
+        f.write(b"".join(parts))
+
+
+class _LineBuffer:
+    """Minimal file-like target so csv.writer can format into a list."""
+
+    def __init__(self, lines):
+        self.write = lines.append
+
+
+def write_columnar_header(f, schema):
+    f.write(BIN_MAGIC + struct.pack("<H", len(schema)))
+    for name, code in schema:
+        raw = name.encode()
+        f.write(code.encode() + struct.pack("<B", len(raw)) + raw)
+
+
+def _read_columnar_schema(buf, path):
+    """[(name, typecode)] of a columnar header, and the offset of the first block."""
+    if buf[:4] != BIN_MAGIC:
+        raise ValueError(f"{path} is not a columnar metrics file")
+    (ncols,) = struct.unpack_from("<H", buf, 4)
+    off = 6
+    schema = []
+    for _ in range(ncols):
+        code = chr(buf[off])
+        nlen = buf[off + 1]
+        schema.append((buf[off + 2:off + 2 + nlen].decode(), code))
+        off += 2 + nlen
+    return schema, off
+
+
+def read_columnar(path):
+    """Load a "bin" metrics file into {column_name: array}."""
+    with open(path, "rb") as f:
+        buf = f.read()
+    schema, off = _read_columnar_schema(buf, path)
+    columns = {name: array(code) for name, code in schema}
+    while off < len(buf):
+        (nrows,) = struct.unpack_from("<I", buf, off)
+        off += 4
+        for name, code in schema:
+            size = nrows * array(code).itemsize
+            columns[name].frombytes(buf[off:off + size])
+            off += size
+    return columns
+
+
+class RateLimitedLog:
+    """print() at most once per `interval` seconds; counts what it skipped."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.suppressed = 0
+        self._last = 0.0
+
+    def __call__(self, line):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            self.suppressed += 1
+            return
+        if self.suppressed:
+            line = f"{line} (+{self.suppressed} suppressed)"
+            self.suppressed = 0
+        self._last = now
+        print(line)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+In-place header rewrites for the Phase 4 mitigator.
+
+Fields are patched directly in a bytearray copy of the frame and the IPv4
+header checksum is adjusted incrementally (RFC 1624, eqn. 3) instead of
+re-serializing the packet through Scapy.
+
+A MitigationPolicy (MITIGATION_POLICY in main.py) applies several
+normalizations in one pass over that copy. The policy file has one rule
+per line, `<rule> <argument>`, '#' comments; rules run in file order:
+
+  ip_id           random            new random IP ID
+  ttl             <0-255>           fixed TTL
+  tos             <0-255>           fixed TOS byte
+  dscp            <0-63>            fixed DSCP, ECN bits kept
+  df              clear | set       Don't Fragment flag
+  icmp_payload    zero              zero the data of ICMP echo request/reply
+  tcp_timestamps  strip             replace the TCP timestamp option by NOPs
+  tcp_options     strip_unknown     replace options other than MSS, window
+                                    scale, SACK and timestamps by NOPs
+
+Every rule only collects the ones-complement difference of the words it
+changes; the IPv4 header and ICMP/TCP checksums are fixed up once at the
+end. Only IPv4 frames are rewritten; L4 rules skip non-first fragments.
+"""
+import sys
+import random
+
+from fastpath import PROTO_ICMP, PROTO_TCP
+
+
+def csum_update16(csum, old, new):
+    """
+    Return the ones-complement checksum after a 16-bit word changes from
+    `old` to `new`: HC' = ~(~HC + ~m + m')  (RFC 1624, eqn. 3).
+    """
+    s = (~csum & 0xFFFF) + (~old & 0xFFFF) + new
+    s = (s & 0xFFFF) + (s >> 16)
+    s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+def set_ip_id(frame, l3_off, new_id):
+    """
+    Write `new_id` into the IPv4 header at `l3_off` of the mutable `frame`
+    and fix the header checksum. Returns the old IP ID.
+    """
+    id_off = l3_off + 4
+    ck_off = l3_off + 10
+    old_id = (frame[id_off] << 8) | frame[id_off + 1]
+    csum = (frame[ck_off] << 8) | frame[ck_off + 1]
+    csum = csum_update16(csum, old_id, new_id)
+    frame[id_off] = new_id >> 8
+    frame[id_off + 1] = new_id & 0xFF
+    frame[ck_off] = csum >> 8
+    frame[ck_off + 1] = csum & 0xFF
+    return old_id
+
+
+def randomize_ip_id(data, hdr, rand=random.getrandbits):
+    """
+    Return a bytearray copy of the IPv4 frame `data` with a random IP ID.
+
+    `hdr` is the frame's fastpath.HeaderView; it is updated to point at
+    the new buffer so later stages see the rewritten frame.
+    """
+    frame = bytearray(data)
+    new_id = rand(16)
+    set_ip_id(frame, hdr.l3_off, new_id)
+    hdr.buf = memoryview(frame)
+    hdr.ip_id = new_id
+    return frame
+
+
+def ones_sum(data):
+    """16-bit ones-complement sum (not inverted) of `data`, zero-padded to even length."""
+    if len(data) & 1:
+        data = bytes(data) + b"\0"
+    s = sum(memoryview(data).cast("H"))
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    # the sum is byte-order independent up to a swap (RFC 1071)
+    return s if sys.byteorder == "big" else ((s & 0xFF) << 8) | (s >> 8)
+
+
+def _fold(csum, delta):
+    """Checksum field after adding the ones-complement difference `delta`."""
+    s = (~csum & 0xFFFF) + delta
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+class _Fixup:
+    """Pending checksum differences of the IPv4 header and the L4 segment."""
+    __slots__ = ("ip", "l4")
+
+
+# TCP options left alone by "tcp_options strip_unknown": EOL, NOP, MSS,
+# window scale, SACK permitted, SACK, timestamps
+TCP_KNOWN_OPTIONS = (0, 1, 2, 3, 4, 5, 8)
+ICMP_ECHO_TYPES = (0, 8)
+
+
+def _ip_word(frame, off, new, fx):
+    old = (frame[off] << 8) | frame[off + 1]
+    if old == new:
+        return False
+    frame[off] = new >> 8
+    frame[off + 1] = new & 0xFF
+    fx.ip += (~old & 0xFFFF) + new
+    return True
+
+
+def _int_arg(name, arg, hi):
+    try:
+        v = int(arg, 0)
+    except (TypeError, ValueError):
+        v = -1
+    if not 0 <= v <= hi:
+        raise ValueError(f"mitigation rule {name!r} needs a value 0..{hi}, got {arg!r}")
+    return v
+
+
+def _compile_rule(name, arg, rand):
+    """(layer, fn) for one rule; fn(frame, l3, l4, end, fx) returns True if it changed the frame."""
+    if name == "ip_id":
+        if arg != "random":
+            raise ValueError("mitigation rule 'ip_id' supports only 'random'")
+        return "ip", lambda frame, l3, l4, end, fx: _ip_word(frame, l3 + 4, rand(16), fx)
+    if name == "ttl":
+        v = _int_arg(name, arg, 255) << 8
+        return "ip", lambda frame, l3, l4, end, fx: _ip_word(frame, l3 + 8, v | frame[l3 + 9], fx)
+    if name == "tos":
+        v = _int_arg(name, arg, 255)
+        return "ip", lambda frame, l3, l4, end, fx: _ip_word(frame, l3, (frame[l3] << 8) | v, fx)
+    if name == "dscp":
+        v = _int_arg(name, arg, 63) << 2
+        return "ip", lambda frame, l3, l4, end, fx: _ip_word(
+            frame, l3, (frame[l3] << 8) | v | (frame[l3 + 1] & 0x03), fx)
+    if name == "df":
+        if arg not in ("clear", "set"):
+            raise ValueError("mitigation rule 'df' needs 'clear' or 'set'")
+        if arg == "set":
+            return "ip", lambda frame, l3, l4, end, fx: _ip_word(
+                frame, l3 + 6, ((frame[l3 + 6] << 8) | frame[l3 + 7]) | 0x4000, fx)
+        return "ip", lambda frame, l3, l4, end, fx: _ip_word(
+            frame, l3 + 6, ((frame[l3 + 6] << 8) | frame[l3 + 7]) & ~0x4000, fx)
+    if name == "icmp_payload":
+        if arg != "zero":
+            raise ValueError("mitigation rule 'icmp_payload' supports only 'zero'")
+        return PROTO_ICMP, _zero_icmp_payload
+    if name == "tcp_timestamps":
+        if arg != "strip":
+            raise ValueError("mitigation rule 'tcp_timestamps' supports only 'strip'")
+        return PROTO_TCP, _tcp_option_stripper(lambda kind: kind == 8)
+    if name == "tcp_options":
+        if arg != "strip_unknown":
+            raise ValueError("mitigation rule 'tcp_options' supports only 'strip_unknown'")
+        return PROTO_TCP, _tcp_option_stripper(lambda kind: kind not in TCP_KNOWN_OPTIONS)
+    raise ValueError(f"unknown mitigation rule {name!r}; use one of {RULES}")
+
+
+def _zero_icmp_payload(frame, l3, l4, end, fx):
+    if end <= l4 + 8 or frame[l4] not in ICMP_ECHO_TYPES:
+        return False
+    data = memoryview(frame)[l4 + 8:end]
+    if not any(data):
+        return False
+    fx.l4 += ~ones_sum(data) & 0xFFFF
+    data[:] = bytes(len(data))
+    return True
+
+
+def _tcp_option_stripper(strip):
+    def rule(frame, l3, l4, end, fx):
+        off = l4 + 20
+        if off > end:
+            return False  # truncated TCP header
+        opt_end = l4 + (frame[l4 + 12] >> 4) * 4
+        if opt_end <= off or opt_end > end:
+            return False
+        old = ones_sum(frame[off:opt_end])
+        changed = False
+        i = off
+        while i < opt_end:
+            kind = frame[i]
+            if kind == 0:
+                break
+            if kind == 1:
+                i += 1
+                continue
+            if i + 1 >= opt_end or frame[i + 1] < 2 or i + frame[i + 1] > opt_end:
+                break  # malformed, leave the rest alone
+            n = frame[i + 1]
+            if strip(kind):
+                frame[i:i + n] = b"\x01" * n
+                changed = True
+            i += n
+        if changed:
+            fx.l4 += (~old & 0xFFFF) + ones_sum(frame[off:opt_end])
+        return changed
+    return rule
+
+
+RULES = ("ip_id", "ttl", "tos", "dscp", "df", "icmp_payload", "tcp_timestamps", "tcp_options")
+# checksum field offset in the L4 header
+L4_CSUM_OFF = {PROTO_ICMP: 2, PROTO_TCP: 16}
+
+
+class MitigationPolicy:
+    """
+    `rules` is a list of (rule, argument) pairs (see load_policy());
+    `rand` is called like random.getrandbits(16) for new IP IDs.
+    `hits[i]` counts the frames rule i actually changed. The IP ID-only
+    policy (MITIGATE_ACTIVE=1 without a policy file) takes the cheaper
+    randomize_ip_id() path.
+    """
+
+    def __init__(self, rules, rand=random.getrandbits):
+        self.rules = [f"{name} {arg}" for name, arg in rules]
+        self.hits = [0] * len(self.rules)
+        self._rand = rand
+        self._ip_id_only = [tuple(rule) for rule in rules] == [("ip_id", "random")]
+        ip_rules, l4_rules = [], {}
+        for i, (name, arg) in enumerate(rules):
+            layer, fn = _compile_rule(name, arg, rand)
+            if layer == "ip":
+                ip_rules.append((i, fn))
+            else:
+                l4_rules.setdefault(layer, []).append((i, fn))
+        self._ip = tuple(ip_rules)
+        self._l4 = {proto: tuple(r) for proto, r in l4_rules.items()}
+
+    def apply(self, data, hdr):
+        """
+        Return a bytearray copy of the IPv4 frame `data` with every rule
+        applied; `hdr` (its fastpath.HeaderView) is pointed at the copy.
+        """
+        if self._ip_id_only:
+            old_id = hdr.ip_id
+            frame = randomize_ip_id(data, hdr, self._rand)
+            if hdr.ip_id != old_id:
+                self.hits[0] += 1
+            return frame
+        frame = bytearray(data)
+        l3 = hdr.l3_off
+        fx = _Fixup()
+        fx.ip = fx.l4 = 0
+        hits = self.hits
+        for i, fn in self._ip:
+            if fn(frame, l3, None, None, fx):
+                hits[i] += 1
+        l4 = hdr.l4_off
+        l4_rules = self._l4.get(hdr.proto) if l4 is not None else None
+        if l4_rules:
+            end = min(len(frame), l3 + ((frame[l3 + 2] << 8) | frame[l3 + 3]))
+            for i, fn in l4_rules:
+                if fn(frame, l3, l4, end, fx):
+                    hits[i] += 1
+            if fx.l4:
+                ck = l4 + L4_CSUM_OFF[hdr.proto]
+                csum = _fold((frame[ck] << 8) | frame[ck + 1], fx.l4)
+                frame[ck] = csum >> 8
+                frame[ck + 1] = csum & 0xFF
+        if fx.ip:
+            ck = l3 + 10
+            csum = _fold((frame[ck] << 8) | frame[ck + 1], fx.ip)
+            frame[ck] = csum >> 8
+            frame[ck + 1] = csum & 0xFF
+            hdr.ip_id = (frame[l3 + 4] << 8) | frame[l3 + 5]
+        hdr.buf = memoryview(frame)
+        return frame
+
+    def stats(self):
+        return dict(zip(self.rules, self.hits))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __repr__(self):
+        return f"MitigationPolicy({', '.join(self.rules)})"
+
+
+def load_policy(path):
+    """(rule, argument) pairs from a policy file, in file order."""
+    rules = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].split()
+            if not line:
+                continue
+            if len(line) != 2 or line[0] not in RULES:
+                raise ValueError(f"{path}:{n}: expected '<rule> <argument>' with rule one of {RULES}")
+            rules.append((line[0], line[1]))
+    return rules
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Per-frame processing shared by main.py and the offline tools.
+
+Pipeline.handle() is what the NATS ingress callback used to do inline:
+parse → Phase 4 mitigation → Phase 3 detection → Phase 2 delay. It knows
+nothing about NATS: forwarding goes through the `submit(subject, data,
+delay)` coroutine it is given (normally DelayScheduler.submit), so
+replay.py can drive the exact same code from a pcap file.
+"""
+import os
+import csv
+import time
+import random
+from time import perf_counter
+
+import fastpath
+import mitigation
+from flows import flow_key
+
+
+def out_subject(in_subject):
+    """Frames from the secure side go out to the insecure side and vice versa."""
+    return "outpktinsec" if in_subject.startswith("inpktsec") else "outpktsec"
+
+
+class _Departure:
+    __slots__ = ("last",)
+
+    def __init__(self):
+        self.last = None
+
+
+class Pipeline:
+    """
+    `windows` is a MetricsSink (WINDOW_SCHEMA) for the detector's
+    per-window decisions; tests/detection_eval.py labels them from the
+    covert sender's manifest. `metrics`, if given, also gets the old
+    detection_metrics rows, scored against the window's own marker count.
+    `stage` is an optional {stage_name: histogram} whose values have
+    .observe(seconds).
+    With a flows.FlowTable as `flows`, every IP packet is accounted to its
+    5-tuple and detectors get the flow record to keep per-flow state on;
+    `ipid` (an ipid_detector.IpIdDetector) then scores each flow's IP IDs
+    and `timing` (a timing_detector.TimingDetector) its inter-arrival
+    times, both with the payload marker as ground truth.
+
+    `delay()` returns the next forwarding delay in seconds and `ip_ids`
+    is called like random.getrandbits(16) for mitigation; both default to
+    the random module, randpool.RandomPool provides precomputed ones.
+
+    `policy` is a mitigation.MitigationPolicy applied to every IPv4
+    frame; `mitigate` without a policy randomizes the IP ID only.
+
+    With `ordered`, a frame never departs before the previous frame of
+    its flow: delays are still drawn per packet, but each flow's
+    departure times are kept monotonic so the jitter does not reorder
+    it (needs `flows` and a submit() taking `not_before`, like
+    DelayScheduler.submit).
+    """
+
+    _NO_TRACE = {}  # submit() kwargs for untraced frames
+
+    def __init__(self, submit, metrics, detector, matcher, *,
+                 parse=fastpath.parse_with_fallback, mitigate=False,
+                 mean_delay_ms=200, log=print, stage=None, flows=None, ipid=None,
+                 timing=None, delay=None, ip_ids=random.getrandbits, ordered=False,
+                 policy=None, windows=None):
+        self.submit = submit
+        self.metrics = metrics
+        self.windows = windows
+        self.detector = detector
+        self.matcher = matcher
+        self.parse = parse
+        if policy is None and mitigate:
+            policy = mitigation.MitigationPolicy([("ip_id", "random")], rand=ip_ids)
+        self.policy = policy
+        self.mitigate = policy is not None
+        self.mean_delay_ms = mean_delay_ms
+        self.delay = delay or (lambda: random.uniform(0, mean_delay_ms / 1000.0))
+        self.ip_ids = ip_ids
+        self.ordered = ordered
+        self.log = log
+        self.stage = stage
+        self.flows = flows
+        self.ipid = ipid
+        self.timing = timing
+
+        # perf_counter → wall clock, for window times the evaluator can
+        # line up with the sender's manifest
+        self._wall = time.time() - perf_counter()
+
+        # ─── Metrics bookkeeping ────────────────────────────────────
+        self.positive = self.negative = 0  # window decisions
+        self.TP = self.FP = self.TN = self.FN = 0  # only kept with `metrics`
+        self.marker_hits = [0] * len(matcher)  # packets matched, per pattern
+        self._retired_hits = {}  # markers dropped by set_matcher()
+        self.packets_in = {}  # frames received, per subject
+
+    def decisions(self):
+        return {"positive": self.positive, "negative": self.negative}
+
+    def confusion(self):
+        return {"TP": self.TP, "FP": self.FP, "TN": self.TN, "FN": self.FN}
+
+    def hit_counts(self):
+        """{marker: packets matched} for every marker used so far."""
+        counts = dict(self._retired_hits)
+        for marker, hits in zip(self.matcher.patterns, self.marker_hits):
+            counts[marker] = counts.get(marker, 0) + hits
+        return counts
+
+    def set_matcher(self, matcher):
+        """Swap the marker set (control.py); hit counts of kept markers carry over."""
+        counts = self.hit_counts()
+        self.marker_hits = [counts.pop(marker, 0) for marker in matcher.patterns]
+        self._retired_hits = counts
+        self.matcher = matcher
+
+    async def handle(self, subject, data, now=None, trace=None):
+        """
+        `now`: arrival time in seconds since the epoch (e.g. a capture
+        timestamp); default: now.
+        `trace`: a tracing.Trace to fill in; it travels with the frame to egress.
+        """
+        self.packets_in[subject] = self.packets_in.get(subject, 0) + 1
+        t0 = perf_counter()
+        hdr = self.parse(data)
+        is_ipv4 = hdr.version == 4
+        t1 = perf_counter()
+
+        # ─── Phase 4: Mitigation ───────────────────────────────────
+        # If active, normalize the header fields covert channels rely on
+        # (by default the IP ID). This happens *before* detection.
+        # All rules patch one copy of the frame; checksums are fixed
+        # up incrementally once at the end.
+        if self.policy is not None and is_ipv4:
+            data = self.policy.apply(data, hdr)
+        t2 = perf_counter()
+
+        # ─── Phase 3: Detection ───────────────────────────────────
+        flow = None
+        if self.flows is not None and hdr.version:
+            flow = self.flows.touch(flow_key(hdr), len(data))
+        if is_ipv4:
+            self.detect(hdr, flow, t0 + self._wall if now is None else now)
+        t3 = perf_counter()
+
+        # ─── Phase 2: Random delay before forwarding ────────────────
+        # The scheduler publishes the frame at its deadline, so this
+        # callback never sleeps and later frames are not held up.
+        # Forward on the correct topic
+        delay = self.delay()
+        kw = self._NO_TRACE
+        if trace is not None:
+            trace.processed(t0, t1, t2, t3, delay, self.mean_delay_ms)
+            kw = {"trace": trace}
+        if self.ordered and flow is not None:
+            dep = flow.state("departure", _Departure)
+            deadline = await self.submit(out_subject(subject), data, delay, dep.last, **kw)
+            if deadline:
+                dep.last = deadline
+        else:
+            await self.submit(out_subject(subject), data, delay, **kw)
+
+        stage = self.stage
+        if stage:
+            stage["parse"].observe(t1 - t0)
+            stage["mitigate"].observe(t2 - t1)
+            stage["detect"].observe(t3 - t2)
+            stage["delay"].observe(perf_counter() - t3)
+
+    def detect(self, hdr, flow=None, now=None):
+        matched = self.matcher.scan(hdr.payload)
+        for idx in matched:
+            self.marker_hits[idx] += 1
+        is_marker = bool(matched)
+        if self.ipid is not None and flow is not None:
+            self.ipid.update(flow, hdr.ip_id, is_marker)
+        if self.timing is not None and flow is not None:
+            self.timing.update(flow, now, is_marker)
+
+        # slide the window; once we have a full window, score it.
+        # Decision is positive if any packet in the window has the marker
+        detector = self.detector
+        decision = detector.update(is_marker, now)
+        if decision is None:
+            return
+        if self.windows is not None:
+            self.windows.write((detector.window_start, now, detector.marker_count, decision))
+        if decision:
+            self.positive += 1
+        else:
+            self.negative += 1
+        if self.metrics is None:
+            return
+
+        # Self-scored (DETECTION_SELF_SCORE): the "ground truth" is the
+        # same marker count the decision came from; real labels come
+        # from the sender's manifest
+        true_label = detector.marker_count > 0
+
+        # update confusion counts
+        if decision and true_label:
+            self.TP += 1
+        elif decision and not true_label:
+            self.FP += 1
+        elif not decision and not true_label:
+            self.TN += 1
+        else: # not decision and true_label
+            self.FN += 1
+        TP, FP, TN, FN = self.TP, self.FP, self.TN, self.FN
+
+        # compute metrics
+        precision = TP / (TP + FP) if (TP + FP) else 0.0
+        recall    = TP / (TP + FN) if (TP + FN) else 0.0
+        f1        = (2 * precision * recall / (precision + recall)
+                     if (precision + recall) else 0.0)
+
+        # buffered; the sink writes batches off the event loop
+        self.metrics.write((
+            time.time(), TP, FP, TN, FN,
+            round(precision, 3),
+            round(recall,    3),
+            round(f1,        3)
+        ))
+
+        self.log(f"[Detector] TP={TP} FP={FP} TN={TN} FN={FN} F1={f1:.3f}")
+
+    def write_marker_hits(self, results_dir):
+        """Per-pattern match counts, written next to the detection metrics."""
+        path = os.path.join(results_dir, "marker_hits.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["marker", "packets"])
+            for marker, hits in self.hit_counts().items():
+                writer.writerow([marker.decode(errors="backslashreplace"), hits])
+        print(f"[Detector] per-marker hits saved to {path}")
+
+
+# one row per scored window of the marker detector
+WINDOW_SCHEMA = [("t_first", "d"), ("t_last", "d"), ("markers", "I"), ("decision", "B")]
+
+DETECTION_SCHEMA = [
+    ("window_end", "d"), ("TP", "q"), ("FP", "q"), ("TN", "q"), ("FN", "q"),
+    ("Precision", "d"), ("Recall", "d"), ("F1", "d"),
+]
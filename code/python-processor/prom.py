@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Prometheus /metrics endpoint for the processor.
+
+Only the per-stage latency histograms are touched on the hot path. All
+counters and gauges (packets in/out, window decisions, queue depth,
+drops) are plain Python numbers the processor already keeps; they are
+read by a custom collector at scrape time, so they cost nothing per
+packet.
+
+prometheus_client is optional: without it, or with METRICS_PORT=0,
+ProcessorMetrics.enabled is False and the processor skips all timing.
+"""
+try:
+    from prometheus_client import Histogram, REGISTRY, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+
+STAGES = ("parse", "mitigate", "detect", "delay")
+# per-packet stage costs are in the microsecond range
+STAGE_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4,
+                 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2, 0.1)
+
+
+class ProcessorMetrics:
+    """
+    `snapshot` is called at scrape time and must return a dict with:
+      packets_in / packets_out : {subject: count}
+      decisions                : {"positive": n, "negative": n} scored windows
+      queue_depth              : frames waiting in the delay scheduler
+      drops                    : {reason: count}
+      mitigation_rules         : {rule: frames changed} (optional)
+      extra_counters           : {name: value} cumulative (optional; exported as _total)
+      extra_gauges             : {name: value} (optional)
+    """
+
+    def __init__(self, port, snapshot, shard=None):
+        self.enabled = bool(port) and REGISTRY is not None
+        self.stage = {}
+        if not self.enabled:
+            if port and REGISTRY is None:
+                print("[Metrics] prometheus_client not installed; /metrics disabled")
+            return
+        labels = {"shard": str(shard)} if shard is not None else {}
+        hist = Histogram("processor_stage_seconds",
+                         "Per-packet processing time by pipeline stage",
+                         ["stage"] + list(labels), buckets=STAGE_BUCKETS)
+        self.stage = {s: hist.labels(stage=s, **labels) for s in STAGES}
+        REGISTRY.register(_SnapshotCollector(snapshot, labels))
+        start_http_server(port)
+        print(f"[Metrics] serving /metrics on :{port}")
+
+
+class _SnapshotCollector:
+
+    def __init__(self, snapshot, labels):
+        self.snapshot = snapshot
+        self.label_names = list(labels)
+        self.label_values = list(labels.values())
+
+    def describe(self):
+        # without it, REGISTRY.register() would call collect() right away
+        return []
+
+    def _family(self, cls, name, doc, extra=()):
+        return cls(name, doc, labels=list(extra) + self.label_names)
+
+    def collect(self):
+        s = self.snapshot()
+        lv = self.label_values
+
+        fam = self._family(CounterMetricFamily, "processor_packets_in",
+                           "Frames received per NATS subject", ["subject"])
+        for subject, n in s["packets_in"].items():
+            fam.add_metric([subject] + lv, n)
+        yield fam
+
+        fam = self._family(CounterMetricFamily, "processor_packets_out",
+                           "Frames published per NATS subject", ["subject"])
+        for subject, n in s["packets_out"].items():
+            fam.add_metric([subject] + lv, n)
+        yield fam
+
+        fam = self._family(CounterMetricFamily, "processor_detector_windows",
+                           "Scored detection windows by decision", ["decision"])
+        for decision, n in s["decisions"].items():
+            fam.add_metric([decision] + lv, n)
+        yield fam
+
+        fam = self._family(CounterMetricFamily, "processor_drops",
+                           "Frames dropped by the processor", ["reason"])
+        for reason, n in s["drops"].items():
+            fam.add_metric([reason] + lv, n)
+        yield fam
+
+        fam = self._family(CounterMetricFamily, "processor_mitigation_rewrites",
+                           "Frames changed per mitigation rule", ["rule"])
+        for rule, n in s.get("mitigation_rules", {}).items():
+            fam.add_metric([rule] + lv, n)
+        yield fam
+
+        fam = self._family(GaugeMetricFamily, "processor_delay_queue_depth",
+                           "Frames waiting in the delay scheduler")
+        fam.add_metric(lv, s["queue_depth"])
+        yield fam
+
+        for name, value in s.get("extra_counters", {}).items():
+            fam = self._family(CounterMetricFamily, f"processor_{name}", name.replace("_", " "))
+            fam.add_metric(lv, value)
+            yield fam
+
+        for name, value in s.get("extra_gauges", {}).items():
+            fam = self._family(GaugeMetricFamily, f"processor_{name}", name.replace("_", " "))
+            fam.add_metric(lv, value)
+            yield fam
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Precomputed random values for the per-packet hot path.
+
+A RandomPool hands out values from a large block generated by NumPy
+(converted to a Python list once, so a draw is a list-iterator step
+instead of a random.uniform()/getrandbits() call). A background thread
+keeps the next blocks ready; the blocks come from one numpy Generator
+in order, so a seeded pool yields the same sequence on every run
+whatever the thread timing.
+
+Delay distributions (make_delay_pool, DELAY_DIST in main.py), all in
+seconds:
+  uniform      U(0, mean_ms)             (the original Phase 2 delay)
+  uniform_mean U(0, 2 * mean_ms)         (uniform with mean mean_ms)
+  exponential  Exp with mean mean_ms
+  normal       N(mean_ms, sd_ms), clipped at 0
+  pareto       Pareto(shape) scaled to mean mean_ms (shape > 1)
+"""
+import zlib
+import queue
+import threading
+
+import numpy as np
+
+DISTRIBUTIONS = ("uniform", "uniform_mean", "exponential", "normal", "pareto")
+
+
+class RandomPool:
+    """
+    `sample(generator, n)` returns a NumPy array of n values. `prefetch`
+    blocks are kept ready by a background thread (0: refill inline). If
+    `sample` raises in that thread, the error is re-raised by draw().
+    """
+
+    def __init__(self, sample, seed=None, block=65536, prefetch=2):
+        self.sample = sample
+        self.block = block
+        self.rng = np.random.Generator(np.random.PCG64(seed))
+        self.refills = 0
+        self._it = iter(())
+        self._stop = threading.Event()
+        self._blocks = None
+        if prefetch:
+            self._blocks = queue.Queue(maxsize=prefetch)
+            self._thread = threading.Thread(target=self._producer, name="random-pool", daemon=True)
+            self._thread.start()
+
+    def _generate(self):
+        return self.sample(self.rng, self.block).tolist()
+
+    def _producer(self):
+        while not self._stop.is_set():
+            try:
+                block = self._generate()
+            except Exception as e:
+                block = e  # handed to _refill; the thread ends after it
+            while not self._stop.is_set():
+                try:
+                    self._blocks.put(block, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if isinstance(block, Exception):
+                return
+
+    def _refill(self):
+        self.refills += 1
+        if self._blocks is None:
+            block = self._generate()
+        else:
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                self._blocks.put(block)  # every later refill fails the same way
+                raise block
+        self._it = iter(block)
+        return next(self._it)
+
+    def draw(self, _k=None):
+        """Next value. Also usable as getrandbits(k) on an integer pool of k-bit values."""
+        try:
+            return next(self._it)
+        except StopIteration:
+            return self._refill()
+
+    getrandbits = draw
+
+    def close(self):
+        self._stop.set()
+
+
+def seed_for(seed, stream, shard=None):
+    """
+    Independent, reproducible seed for one named stream (e.g. "delay")
+    of one processor shard; None stays None (fresh OS entropy).
+    """
+    if seed is None:
+        return None
+    key = [int(seed), zlib.crc32(stream.encode())]
+    if shard is not None:
+        key.append(int(shard))
+    return np.random.SeedSequence(key)
+
+
+def make_delay_pool(dist, mean_ms, sd_ms=None, shape=2.5, seed=None, **kw):
+    """
+    RandomPool of per-packet delays in seconds, with mean `mean_ms`
+    except for "uniform", which keeps the Phase 2 U(0, mean_ms).
+    """
+    if mean_ms < 0:
+        raise ValueError("mean delay must be >= 0")
+    if sd_ms is not None and sd_ms < 0:
+        raise ValueError("delay SD must be >= 0")
+    mean = mean_ms / 1000.0
+    if dist == "uniform":
+        sample = lambda rng, n: rng.uniform(0.0, mean, n)
+    elif dist == "uniform_mean":
+        sample = lambda rng, n: rng.uniform(0.0, 2 * mean, n)
+    elif dist == "exponential":
+        sample = lambda rng, n: rng.exponential(mean, n)
+    elif dist == "normal":
+        sd = (mean_ms / 4 if sd_ms is None else sd_ms) / 1000.0
+        sample = lambda rng, n: np.maximum(rng.normal(mean, sd, n), 0.0)
+    elif dist == "pareto":
+        if shape <= 1:
+            raise ValueError("Pareto shape must be > 1 for a finite mean")
+        xm = mean * (shape - 1) / shape
+        sample = lambda rng, n: (rng.pareto(shape, n) + 1.0) * xm
+    else:
+        raise ValueError(f"unknown delay distribution {dist!r}; use one of {DISTRIBUTIONS}")
+    return RandomPool(sample, seed=seed, **kw)
+
+
+def make_ip_id_pool(seed=None, **kw):
+    """RandomPool of uniform 16-bit IP IDs."""
+    return RandomPool(lambda rng, n: rng.integers(0, 65536, n, dtype=np.uint16),
+                      seed=seed, **kw)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Offline replay harness for the processor pipeline (no docker needed).
+
+Streams frames from a pcap file or from the synthetic traffic generator
+through the same Pipeline that main.py runs, and reports throughput,
+per-stage latency percentiles and detection results.
+
+In-process (default): the pipeline, delay scheduler and detector run in
+this process; forwarded frames are only counted.
+
+    python3 replay.py --pcap capture.pcap
+    python3 replay.py --synthetic 200000 --flows 500 --covert-ratio 0.01
+
+Against NATS (--nats URL): frames are published to inpktsec/inpktinsec
+of a running main.py (e.g. with a local `nats-server`) and the tool
+measures what comes back on outpktsec/outpktinsec, end to end.
+"""
+import os
+import sys
+import time
+import struct
+import asyncio
+import argparse
+import ipaddress
+from collections import deque
+from time import perf_counter
+
+import fastpath
+import synth
+from pipeline import Pipeline, DETECTION_SCHEMA, out_subject
+from scheduler import DelayScheduler
+from detector import SlidingWindowDetector
+from flows import FlowTable
+from ipid_detector import IpIdDetector
+from timing_detector import TimingDetector, load_baseline
+from randpool import DISTRIBUTIONS, make_delay_pool, make_ip_id_pool, seed_for
+from mitigation import MitigationPolicy, load_policy
+from matcher import MarkerMatcher, load_markers
+from metrics_sink import MetricsSink, RateLimitedLog
+
+BASE_RESULTS_DIR = "replay_results"
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+
+def read_pcap(path):
+    """Yield (timestamp, frame) from a classic pcap file; pcapng goes through Scapy."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        if magic not in PCAP_MAGICS:
+            f.close()
+            from scapy.utils import RawPcapNgReader
+            for data, meta in RawPcapNgReader(path):
+                yield (meta.tshigh << 32 | meta.tslow) / meta.tsresol, data
+            return
+        endian, scale = PCAP_MAGICS[magic]
+        f.read(20)
+        rec = struct.Struct(endian + "IIII")
+        while True:
+            head = f.read(16)
+            if len(head) < 16:
+                return
+            sec, frac, caplen, _ = rec.unpack(head)
+            yield sec + frac * scale, f.read(caplen)
+
+
+class Direction:
+    """Pick the ingress subject for a captured frame from its source address."""
+
+    def __init__(self, secure_net):
+        self.net = ipaddress.ip_network(secure_net)
+
+    def __call__(self, frame):
+        hdr = fastpath.parse(frame)
+        if hdr is not None and hdr.version and ipaddress.ip_address(bytes(hdr.src)) in self.net:
+            return "inpktsec"
+        return "inpktinsec"
+
+
+def frame_source(args):
+    """
+    Iterator of (timestamp, subject, frame) for the chosen input; the
+    timestamp is the capture time for pcaps and None (= replay time)
+    for synthetic traffic.
+    """
+    if args.pcap:
+        direction = Direction(args.secure_net)
+        for ts, frame in read_pcap(args.pcap):
+            yield ts, direction(frame), frame
+    else:
+        mix = synth.TrafficMix(flows=args.flows, covert_ratio=args.covert_ratio,
+                               sizes=tuple(args.sizes), seed=args.seed)
+        for _ in range(args.synthetic):
+            subject, frame, _ = next(mix)
+            yield None, subject, frame
+
+
+class Samples:
+    """Histogram stand-in for Pipeline(stage=...): keeps every observation."""
+
+    def __init__(self):
+        self.values = []
+        self.observe = self.values.append
+
+    def percentiles(self, qs=(0.5, 0.9, 0.99)):
+        xs = sorted(self.values)
+        if not xs:
+            return [0.0] * len(qs)
+        return [xs[min(len(xs) - 1, int(q * len(xs)))] for q in qs]
+
+
+def print_latency_table(samples):
+    print(f"{'stage':>10} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'mean us':>9}")
+    for name, s in samples.items():
+        p50, p90, p99 = (v * 1e6 for v in s.percentiles())
+        mean = sum(s.values) / len(s.values) * 1e6 if s.values else 0.0
+        print(f"{name:>10} {p50:9.2f} {p90:9.2f} {p99:9.2f} {mean:9.2f}")
+
+
+async def replay_in_process(frames, args):
+    results_dir = os.path.join(BASE_RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(results_dir, exist_ok=True)
+    metrics = MetricsSink(os.path.join(results_dir, "detection_metrics.csv"),
+                          DETECTION_SCHEMA, batch_rows=5000)
+    forwarded = {}
+
+    async def publish(subject, data):
+        forwarded[subject] = forwarded.get(subject, 0) + 1
+
+    scheduler = DelayScheduler(publish, max_queue=args.delay_queue)
+    scheduler.start()
+    stage = {name: Samples() for name in ("parse", "mitigate", "detect", "delay")}
+    ipid_metrics = MetricsSink(os.path.join(results_dir, "ipid_detection_metrics.csv"),
+                               DETECTION_SCHEMA, batch_rows=5000)
+    ipid = IpIdDetector(ipid_metrics, window=args.ipid_window, log=RateLimitedLog(5.0))
+    timing_metrics = MetricsSink(os.path.join(results_dir, "timing_detection_metrics.csv"),
+                                 DETECTION_SCHEMA, batch_rows=5000)
+    timing = TimingDetector(timing_metrics,
+                            baseline=load_baseline(args.timing_baseline) if args.timing_baseline else None,
+                            log=RateLimitedLog(5.0))
+
+    def score_evicted(flow, reason=None):
+        ipid.evict(flow)
+        timing.evict(flow)
+
+    flows = FlowTable(capacity=args.flow_table, idle_timeout=float("inf"),
+                      on_evict=score_evicted)
+    delays = make_delay_pool(args.delay_dist, args.mean_delay_ms,
+                             seed=seed_for(args.random_seed, "delay"))
+    ip_ids = make_ip_id_pool(seed=seed_for(args.random_seed, "ip_id"))
+    policy = None
+    if args.mitigate and args.policy:
+        policy = MitigationPolicy(load_policy(args.policy), rand=ip_ids.getrandbits)
+    markers = load_markers(os.getenv("DETECTION_MARKER", "CovertChannel"),
+                           os.getenv("DETECTION_MARKERS"),
+                           os.getenv("DETECTION_MARKER_FILE"))
+    pipeline = Pipeline(
+        scheduler.submit, metrics,
+        SlidingWindowDetector(size=args.window, window_ms=args.window_ms),
+        MarkerMatcher(markers),
+        parse=fastpath.parse_scapy if args.parser == "scapy" else fastpath.parse_with_fallback,
+        mitigate=args.mitigate, policy=policy, mean_delay_ms=args.mean_delay_ms,
+        log=RateLimitedLog(5.0), stage=stage, flows=flows,
+        ipid=ipid, timing=timing, delay=delays.draw, ip_ids=ip_ids.getrandbits,
+        ordered=args.delay_mode == "ordered")
+
+    total = Samples()
+    count = 0
+    busy = 0.0
+    for ts, subject, frame in frames:
+        t0 = perf_counter()
+        await pipeline.handle(subject, frame, ts)
+        dt = perf_counter() - t0
+        total.observe(dt)
+        busy += dt
+        count += 1
+        if count % 1000 == 0:
+            await asyncio.sleep(0)  # let the scheduler publish what is due
+    while len(scheduler):
+        await asyncio.sleep(0.05)
+    await scheduler.stop()
+    delays.close()
+    ip_ids.close()
+    for flow in flows:
+        score_evicted(flow)
+    ipid.flush()
+    metrics.close()
+    ipid_metrics.close()
+    timing_metrics.close()
+    timing.save_baseline(os.path.join(results_dir, "timing_baseline.csv"))
+    pipeline.write_marker_hits(results_dir)
+
+    stage["total"] = total
+    print(f"\nreplayed {count} frames: {count / busy:,.0f} pps of pipeline time "
+          f"({busy:.2f}s busy)")
+    print_latency_table(stage)
+    print(f"\nforwarded: {forwarded} | scheduler: {scheduler.stats()}")
+    print(f"detector: {pipeline.confusion()} | markers: "
+          f"{dict(zip((m.decode(errors='replace') for m in pipeline.matcher.patterns), pipeline.marker_hits))}")
+    print(f"ip id detector: {ipid.confusion()} ({ipid.windows} windows) | "
+          f"timing detector: {timing.confusion()} ({timing.windows} windows)")
+    print(f"flows: {flows.stats()}")
+    if pipeline.policy:
+        print(f"mitigation rules: {pipeline.policy.stats()}")
+    print(f"detection metrics in {results_dir}")
+
+
+async def replay_nats(frames, args):
+    from nats.aio.client import Client as NATS
+
+    nc = NATS()
+    await nc.connect(args.nats)
+    sent_at = {}  # frame bytes → deque of send times
+    e2e = Samples()
+    received = 0
+
+    async def on_out(msg):
+        nonlocal received
+        pending = sent_at.get(msg.data)
+        if pending:
+            e2e.observe(perf_counter() - pending.popleft())
+            received += 1
+
+    for subject in ("outpktsec", "outpktinsec"):
+        await nc.subscribe(subject, cb=on_out)
+
+    frames = list(frames)
+    gap = 1.0 / args.rate if args.rate else 0.0
+    start = perf_counter()
+    for i, (_, subject, frame) in enumerate(frames):
+        if gap:
+            wait = start + i * gap - perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        # mitigation rewrites the IP ID, so only unmodified frames can be matched
+        sent_at.setdefault(frame, deque()).append(perf_counter())
+        await nc.publish(subject, frame)
+        if i % 1000 == 999:
+            await nc.flush()
+    await nc.flush()
+    sent_elapsed = perf_counter() - start
+
+    previous = -1
+    while received != previous and received < len(frames):
+        previous = received
+        await asyncio.sleep(max(1.0, 2 * args.mean_delay_ms / 1000.0))
+    await nc.close()
+
+    print(f"\nsent {len(frames)} frames in {sent_elapsed:.2f}s "
+          f"({len(frames) / sent_elapsed:,.0f} pps offered), matched {received} on "
+          f"{out_subject('inpktsec')}/{out_subject('inpktinsec')}")
+    print_latency_table({"end2end": e2e})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay through the processor pipeline")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--pcap", help="pcap/pcapng file to replay")
+    src.add_argument("--synthetic", type=int, metavar="N", help="generate N synthetic frames")
+    parser.add_argument("--flows", type=int, default=100)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, 1400],
+                        help="synthetic payload sizes (bytes)")
+    parser.add_argument("--covert-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--secure-net", default=os.getenv("SECURE_NET", "10.1.0.0/16"),
+                        help="source network of frames replayed on inpktsec")
+    parser.add_argument("--parser", choices=["fast", "scapy"], default=os.getenv("PARSER_MODE", "fast"))
+    parser.add_argument("--mitigate", action="store_true",
+                        default=os.getenv("MITIGATE_ACTIVE", "0") == "1")
+    parser.add_argument("--policy", default=os.getenv("MITIGATION_POLICY"),
+                        help="mitigation policy file (default with --mitigate: IP ID only)")
+    parser.add_argument("--mean-delay-ms", type=float, default=200)
+    parser.add_argument("--delay-dist", default=os.getenv("DELAY_DIST", "uniform"),
+                        choices=DISTRIBUTIONS)
+    parser.add_argument("--delay-mode", default=os.getenv("DELAY_MODE", "independent"),
+                        choices=["independent", "ordered"])
+    parser.add_argument("--random-seed", default=os.getenv("RANDOM_SEED"),
+                        help="seed for delays and mitigation IP IDs (default: unseeded)")
+    parser.add_argument("--delay-queue", type=int, default=1_000_000)
+    parser.add_argument("--window", type=int, default=int(os.getenv("DETECTION_WINDOW_SIZE", "20")))
+    parser.add_argument("--window-ms", type=int, default=int(os.getenv("DETECTION_WINDOW_MS", "0")))
+    parser.add_argument("--ipid-window", type=int, default=int(os.getenv("IPID_WINDOW", "16")))
+    parser.add_argument("--timing-baseline", default=os.getenv("TIMING_BASELINE"),
+                        help="timing_baseline.csv of an earlier benign run")
+    parser.add_argument("--flow-table", type=int, default=int(os.getenv("FLOW_TABLE_MAX", "65536")))
+    parser.add_argument("--nats", help="replay against a running processor at this NATS URL")
+    parser.add_argument("--rate", type=float, default=0, help="NATS mode: offered pps (0 = max)")
+    args = parser.parse_args()
+
+    frames = frame_source(args)
+    if args.nats:
+        asyncio.run(replay_nats(frames, args))
+    else:
+        asyncio.run(replay_in_process(frames, args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
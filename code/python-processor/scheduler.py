@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Non-blocking delayed forwarding for the Phase 2 random delay.
+
+The NATS callback hands each frame to DelayScheduler.submit() and returns
+immediately. Frames sit in a min-heap keyed by their departure deadline;
+a single loop.call_at() timer is armed for the earliest deadline and wakes
+a drain task that publishes every frame that is due.
+"""
+import heapq
+import asyncio
+from time import perf_counter_ns
+
+
+class DelayScheduler:
+    """
+    Bounded deadline queue in front of an async `publish(subject, data)`.
+    Traced frames (see tracing.py) are published with `trace=` as well.
+
+    policy = "drop"  → frames arriving while the queue is full are dropped
+    policy = "block" → submit() waits for room (backpressure on the caller)
+    """
+
+    def __init__(self, publish, max_queue=10000, policy="drop", log=print):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"unknown delay queue policy: {policy}")
+        self.publish = publish
+        self.max_queue = max_queue
+        self.policy = policy
+        self.log = log
+        self._heap = []  # (deadline, seq, subject, data, trace)
+        self._seq = 0
+        self._loop = None
+        self._timer = None
+        self._timer_at = None
+        self._due = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+
+        # accounting
+        self.accepted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0       # publish raised; frame discarded
+        self.blocked = 0
+        self.max_depth = 0
+        self.late_max = 0.0   # worst publish time past deadline (s)
+        self.late_sum = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._drain())
+        return self._task
+
+    async def stop(self, flush=True):
+        """Cancel the drain task; with `flush`, publish what is still queued."""
+        if self._timer:
+            self._timer.cancel()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while flush and self._heap:
+            _, _, subject, data, trace = heapq.heappop(self._heap)
+            try:
+                await self._publish(subject, data, trace)
+            except Exception as e:
+                self.failed += 1
+                self.log(f"[Scheduler] publish to {subject} failed: {e!r}")
+                continue
+            self.sent += 1
+
+    async def submit(self, subject, data, delay, not_before=None, trace=None):
+        """
+        Queue `data` for `subject`, to be published `delay` seconds from
+        now but not before the loop time `not_before`. Returns the
+        departure deadline, or False if the frame was dropped. A
+        `trace` gets its time in the queue recorded.
+        """
+        if len(self._heap) >= self.max_queue:
+            if self.policy == "drop":
+                self.dropped += 1
+                return False
+            self.blocked += 1
+            while len(self._heap) >= self.max_queue:
+                self._space.clear()
+                await self._space.wait()
+
+        deadline = self._loop.time() + delay
+        if not_before is not None and deadline < not_before:
+            # equal deadlines leave in submission order (seq)
+            deadline = not_before
+        self._seq += 1
+        if trace is not None:
+            trace.submitted = perf_counter_ns()
+        heapq.heappush(self._heap, (deadline, self._seq, subject, data, trace))
+        self.accepted += 1
+        if len(self._heap) > self.max_depth:
+            self.max_depth = len(self._heap)
+        if self._timer_at is None or deadline < self._timer_at:
+            self._arm(deadline)
+        return deadline
+
+    async def _publish(self, subject, data, trace):
+        if trace is None:
+            await self.publish(subject, data)
+        else:
+            trace.dequeued = perf_counter_ns()
+            await self.publish(subject, data, trace=trace)
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "depth": len(self._heap),
+            "max_depth": self.max_depth,
+            "late_avg_ms": 1000 * self.late_sum / self.sent if self.sent else 0.0,
+            "late_max_ms": 1000 * self.late_max,
+        }
+
+    def _arm(self, deadline):
+        if self._timer:
+            self._timer.cancel()
+        self._timer_at = deadline
+        self._timer = self._loop.call_at(deadline, self._due.set)
+
+    async def _drain(self):
+        heap = self._heap
+        loop = self._loop
+        while True:
+            await self._due.wait()
+            self._due.clear()
+            self._timer = self._timer_at = None
+
+            now = loop.time()
+            while heap and heap[0][0] <= now:
+                deadline, _, subject, data, trace = heapq.heappop(heap)
+                try:
+                    await self._publish(subject, data, trace)
+                except Exception as e:
+                    # one bad publish must not strand the rest of the heap
+                    self.failed += 1
+                    self.log(f"[Scheduler] publish to {subject} failed: {e!r}")
+                    now = loop.time()
+                    continue
+                late = loop.time() - deadline
+                self.sent += 1
+                self.late_sum += late
+                if late > self.late_max:
+                    self.late_max = late
+                now = loop.time()
+            self._space.set()
+
+            # submit() may have armed a later timer while we were publishing
+            if heap and (self._timer_at is None or heap[0][0] < self._timer_at):
+                self._arm(heap[0][0])
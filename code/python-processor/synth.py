@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Synthetic Ethernet/IPv4 frames for offline runs and load tests.
+
+Frames are assembled with struct and carry valid IPv4 and L4 checksums,
+so they need no Scapy and can be built by the hundred thousand.
+"""
+import random
+import socket
+import struct
+from array import array
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+SEC_MAC = bytes.fromhex("02420a010015")
+INSEC_MAC = bytes.fromhex("02420a000015")
+COVERT_MARKER = b"CovertChannel"
+
+
+def inet_checksum(data):
+    """RFC 1071 Internet checksum of `data`."""
+    if len(data) % 2:
+        data = bytes(data) + b"\0"
+    words = array("H", bytes(data))
+    if struct.pack("=H", 1) == b"\x01\x00":  # little-endian host
+        words.byteswap()
+    s = sum(words)
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+def ipv4_frame(src, dst, proto, sport=0, dport=0, payload=b"", ip_id=0,
+               ttl=64, df=True, src_mac=SEC_MAC, dst_mac=INSEC_MAC):
+    """
+    One Ethernet frame. `src`/`dst` are dotted quads; for ICMP, `sport`
+    and `dport` become the echo identifier and sequence number.
+    """
+    saddr = socket.inet_aton(src)
+    daddr = socket.inet_aton(dst)
+    if proto == PROTO_TCP:
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 1, 1, 5 << 4, 0x18, 65535, 0, 0)
+    elif proto == PROTO_UDP:
+        l4 = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0)
+    else:
+        l4 = struct.pack("!BBHHH", 8, 0, 0, sport, dport)  # echo request
+    segment = bytearray(l4 + payload)
+    if proto == PROTO_ICMP:
+        csum = inet_checksum(segment)
+        ck_off = 2
+    else:
+        pseudo = saddr + daddr + struct.pack("!BBH", 0, proto, len(segment))
+        csum = inet_checksum(pseudo + segment)
+        if proto == PROTO_UDP and csum == 0:
+            csum = 0xFFFF
+        ck_off = 16 if proto == PROTO_TCP else 6
+    struct.pack_into("!H", segment, ck_off, csum)
+
+    ip = bytearray(struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(segment), ip_id,
+                               0x4000 if df else 0, ttl, proto, 0, saddr, daddr))
+    struct.pack_into("!H", ip, 10, inet_checksum(ip))
+    return dst_mac + src_mac + b"\x08\x00" + bytes(ip) + bytes(segment)
+
+
+class TrafficMix:
+    """
+    Endless stream of (subject, frame, is_covert) tuples: `flows` benign
+    TCP/UDP flows from the secure host with payload sizes drawn from
+    `sizes`, plus ICMP covert-channel packets (IP ID = ASCII code,
+    payload "CovertChannel:<char>") in a `covert_ratio` share. An
+    `insec_ratio` share of the benign frames are replies from the
+    insecure host, published on inpktinsec.
+
+    With `tag`, every payload ends with the frame's 8-byte sequence
+    number (big-endian, counting from 0), so a load generator can match
+    forwarded frames to the ones it sent.
+    """
+
+    def __init__(self, flows=100, sizes=(64, 512, 1400), covert_ratio=0.0,
+                 message="Secret: Operation Mincemeat", seed=1,
+                 src_net="10.1.0", dst="10.0.0.21", tag=False, insec_ratio=0.0):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.covert_ratio = covert_ratio
+        self.insec_ratio = insec_ratio
+        self.message = message.encode()
+        self.dst = dst
+        self.flows = [(f"{src_net}.{rng.randint(2, 254)}",
+                       rng.choice((PROTO_TCP, PROTO_UDP)),
+                       rng.randint(1024, 65535),
+                       rng.choice((80, 443, 53, 8888)))
+                      for _ in range(flows)]
+        self.sizes = sizes
+        self._ids = [rng.getrandbits(16) for _ in range(flows)]
+        self._covert_pos = 0
+        self.tag = tag
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        rng = self.rng
+        seq = self.count
+        self.count += 1
+        tag = seq.to_bytes(8, "big") if self.tag else b""
+        if self.covert_ratio and rng.random() < self.covert_ratio:
+            ch = self.message[self._covert_pos % len(self.message)]
+            self._covert_pos += 1
+            frame = ipv4_frame("10.1.0.21", self.dst, PROTO_ICMP, 0x4242, self._covert_pos & 0xFFFF,
+                               COVERT_MARKER + b":" + bytes([ch]) + tag, ip_id=ch)
+            return "inpktsec", frame, True
+        i = rng.randrange(len(self.flows))
+        src, proto, sport, dport = self.flows[i]
+        self._ids[i] = (self._ids[i] + 1) & 0xFFFF
+        payload = bytes(max(rng.choice(self.sizes) - len(tag), 0)) + tag
+        if self.insec_ratio and rng.random() < self.insec_ratio:
+            return "inpktinsec", ipv4_frame(self.dst, src, proto, dport, sport, payload,
+                                            ip_id=self._ids[i], src_mac=INSEC_MAC,
+                                            dst_mac=SEC_MAC), False
+        return "inpktsec", ipv4_frame(src, self.dst, proto, sport, dport, payload,
+                                      ip_id=self._ids[i]), False
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Streaming inter-arrival-time (timing channel) detector.
+
+Every flow keeps a fixed histogram of its packet inter-arrival times in
+log-scale bins (BINS_PER_OCTAVE per octave, ~7.6 µs to 64 s) and the
+arrival time of its last packet only; no timestamps are stored. The
+histogram's entropy is maintained incrementally (a table lookup per
+packet), so an update is O(1) and scoring a window costs nothing extra.
+
+Every `window` inter-arrivals the flow's window is scored and reset:
+
+  * regular:  entropy below `min_entropy` bits — a fixed-interval sender
+    (code/sec/covert_sender.py --interval) or a few-symbol timing code
+    puts nearly all gaps in one or two bins;
+  * rare:     entropy in the lowest `alpha` share of the baseline, i.e.
+    more regular than almost all windows seen in normal traffic.
+
+When a flow leaves the flow table, evict() scores its partial window if
+it holds at least half a window of gaps, against `min_entropy` only: a
+shorter window has a lower entropy ceiling, so it is neither compared
+with nor added to the baseline.
+
+The baseline is a histogram of window entropies. It is either loaded
+from a file written by an earlier benign run (save_baseline(),
+TIMING_BASELINE in main.py) and kept fixed, or learned online from the
+windows that were not flagged, halving its counts past `baseline_cap`
+windows; a learned baseline takes part only after `warmup` windows.
+
+Verdicts are scored against the caller's ground truth like the other
+detectors and written in the detection_metrics format.
+"""
+import csv
+import time
+from math import log2
+from array import array
+
+from detector import Confusion
+
+BINS_PER_OCTAVE = 4
+MIN_LOG2 = -17  # bin 0 holds gaps below 2**-17 s
+NBINS = 24 * BINS_PER_OCTAVE
+ENTROPY_RES = 4  # baseline bins per bit of window entropy
+_ZEROS = array("H", [0]) * NBINS
+
+
+def iat_bin(iat):
+    """Log-scale bin of an inter-arrival time in seconds."""
+    if iat <= 0:
+        return 0
+    b = int((log2(iat) - MIN_LOG2) * BINS_PER_OCTAVE)
+    return 0 if b < 0 else (NBINS - 1 if b >= NBINS else b)
+
+
+class _FlowTiming:
+    __slots__ = ("last", "hist", "n", "clogc", "labelled")
+
+    def __init__(self):
+        self.last = None
+        self.hist = array("H", _ZEROS)
+        self.n = 0
+        self.clogc = 0.0  # sum of c*log2(c) over the bins
+        self.labelled = False
+
+
+class TimingDetector:
+
+    def __init__(self, metrics=None, window=32, min_entropy=2.0, alpha=0.01,
+                 baseline=None, baseline_cap=100_000, warmup=100, log=print):
+        if not 4 <= window < 65536:
+            raise ValueError("timing window must be between 4 and 65535 inter-arrivals")
+        self.metrics = metrics
+        self.window = window
+        self.min_entropy = min_entropy
+        self.alpha = alpha
+        self.baseline_cap = baseline_cap
+        self.warmup = warmup
+        self.log = log
+        self.min_partial = max(4, window // 2)
+        # (c+1)*log2(c+1) - c*log2(c): entropy bookkeeping for one increment
+        self._dclogc = [(c + 1) * log2(c + 1) - (c * log2(c) if c else 0.0)
+                        for c in range(window)]
+        # a loaded baseline is kept fixed, otherwise it is learned online
+        self.learn = baseline is None
+        nb = int(log2(window)) * ENTROPY_RES + 1
+        self.baseline = [0] * nb if baseline is None else list(baseline)[:nb]
+        self.baseline += [0] * (nb - len(self.baseline))
+        self.baseline_total = sum(self.baseline)
+
+        # ─── Metrics bookkeeping ────────────────────────────────────
+        self.score = Confusion()
+        self.windows = 0
+        self.flagged = 0
+
+    def confusion(self):
+        return self.score.as_dict()
+
+    def update(self, flow, now, labelled=False):
+        """Account one packet of `flow` (a flows.FlowRecord) arriving at `now` seconds."""
+        st = flow.state("timing", _FlowTiming)
+        last = st.last
+        st.last = now
+        if labelled:
+            st.labelled = True
+        if last is None:
+            return
+        b = iat_bin(now - last)
+        c = st.hist[b]
+        st.hist[b] = c + 1
+        st.clogc += self._dclogc[c]
+        st.n += 1
+        if st.n >= self.window:
+            self._score(flow, st)
+
+    def evict(self, flow):
+        """Score the partial window of `flow` before the flow table drops it."""
+        st = flow.ext.get("timing") if flow.ext else None
+        if st is not None and st.n >= self.min_partial:
+            self._score(flow, st, partial=True)
+
+    def _score(self, flow, st, partial=False):
+        n, labelled = st.n, st.labelled
+        entropy = log2(n) - st.clogc / n
+        st.hist = array("H", _ZEROS)
+        st.n = 0
+        st.clogc = 0.0
+        st.labelled = False
+
+        eb = min(int(entropy * ENTROPY_RES), len(self.baseline) - 1)
+        total = self.baseline_total
+        rare = (not partial and total >= (self.warmup if self.learn else 1)
+                and sum(self.baseline[:eb + 1]) < self.alpha * total)
+        decision = entropy < self.min_entropy or rare
+        if self.learn and not decision and not partial:
+            self.baseline[eb] += 1
+            self.baseline_total += 1
+            if self.baseline_total >= self.baseline_cap:
+                self.baseline = [c >> 1 for c in self.baseline]
+                self.baseline_total = sum(self.baseline)
+
+        self.score.add(decision, labelled)
+        self.windows += 1
+        if decision:
+            self.flagged += 1
+            self.log(f"[Timing] flow {flow.key.hex()} flagged: "
+                     f"inter-arrival entropy {entropy:.2f} bits over {n} gaps")
+        if self.metrics is not None:
+            self.metrics.write(self.score.row(time.time()))
+
+    def save_baseline(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["entropy_low_bits", "entropy_high_bits", "windows"])
+            for b, c in enumerate(self.baseline):
+                writer.writerow([b / ENTROPY_RES, (b + 1) / ENTROPY_RES, c])
+
+    def __repr__(self):
+        mode = "learned" if self.learn else "fixed"
+        return f"TimingDetector(window={self.window}, baseline={mode})"
+
+
+def load_baseline(path):
+    """Window-entropy histogram from a file written by TimingDetector.save_baseline()."""
+    with open(path, newline="") as f:
+        return [int(r["windows"]) for r in csv.DictReader(f)]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Per-stage latency report from the MITM switch's trace file (see tracing.py).
+
+Every record is one forwarded frame with its switch ingress/egress times
+and the processor's stage timings. Stages (ms):
+
+  nats_in     switch publish → processor receipt
+  parse, mitigate, detect
+  delay       random delay drawn for the frame
+  queue_late  time in the delay queue beyond the drawn delay
+  publish     delay queue → NATS client
+  nats_out    processor hand-off → switch egress
+  total       switch ingress → egress
+  overhead    total minus the drawn delay
+
+reported as p50/p90/p99/mean per configured mean delay:
+
+    python3 trace_report.py /code/mitm/trace.bin [more.bin ...] --csv trace_report.csv
+
+Ingress/egress come from the switch and the processor's arrival from its
+own clock; the containers share the host clock.
+"""
+import csv
+import argparse
+import numpy as np
+
+RECORD = np.dtype([(name, "<i8") for name in (
+    "id", "direction", "size", "mean_delay_us", "ingress_ns", "proc_in_ns",
+    "parse_ns", "mitigate_ns", "detect_ns", "delay_ns", "queue_ns", "publish_ns",
+    "proc_total_ns", "egress_ns")])
+
+STAGES = ["nats_in", "parse", "mitigate", "detect", "delay", "queue_late",
+          "publish", "nats_out", "total", "overhead"]
+QUANTILES = [("p50", 50), ("p90", 90), ("p99", 99)]
+
+
+def load(paths):
+    """All records of the given trace files; a trailing partial record is ignored."""
+    parts = []
+    for path in paths:
+        raw = np.fromfile(path, dtype=np.uint8)
+        parts.append(raw[:len(raw) - len(raw) % RECORD.itemsize].view(RECORD))
+    return np.concatenate(parts) if parts else np.empty(0, RECORD)
+
+
+def stages(rec):
+    """Per-frame stage durations in ms, one array per STAGES entry."""
+    ns = {
+        "nats_in": rec["proc_in_ns"] - rec["ingress_ns"],
+        "parse": rec["parse_ns"],
+        "mitigate": rec["mitigate_ns"],
+        "detect": rec["detect_ns"],
+        "delay": rec["delay_ns"],
+        "queue_late": rec["queue_ns"] - rec["delay_ns"],
+        "publish": rec["publish_ns"],
+        "nats_out": rec["egress_ns"] - (rec["proc_in_ns"] + rec["proc_total_ns"]),
+        "total": rec["egress_ns"] - rec["ingress_ns"],
+    }
+    ns["overhead"] = ns["total"] - rec["delay_ns"]
+    return {name: ns[name] / 1e6 for name in STAGES}
+
+
+def report(rec):
+    """Rows of (mean_delay_ms, stage, frames, p50, p90, p99, mean), one group per mean delay."""
+    per_frame = stages(rec)
+    rows = []
+    for mean_us in np.unique(rec["mean_delay_us"]):
+        sel = rec["mean_delay_us"] == mean_us
+        for name in STAGES:
+            values = per_frame[name][sel]
+            pct = np.percentile(values, [q for _label, q in QUANTILES])
+            rows.append((mean_us / 1000.0, name, int(sel.sum()), *pct, values.mean()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency from switch trace files")
+    parser.add_argument("traces", nargs="+", help="trace files written by the switch (TRACE_FILE)")
+    parser.add_argument("--csv", help="also write the table to this CSV file")
+    args = parser.parse_args()
+
+    rec = load(args.traces)
+    if not len(rec):
+        print("No trace records")
+        return
+    rows = report(rec)
+    print(f"{len(rec)} traced frames")
+    print(f"{'mean ms':>8} {'stage':>10} {'frames':>8} "
+          + " ".join(f"{label + ' ms':>10}" for label, _q in QUANTILES) + f" {'mean ms':>10}")
+    for mean_ms, name, n, *values in rows:
+        print(f"{mean_ms:>8.3f} {name:>10} {n:>8} " + " ".join(f"{v:>10.3f}" for v in values))
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["mean_delay_ms", "stage", "frames"]
+                            + [f"{label}_ms" for label, _q in QUANTILES] + ["mean_ms"])
+            for mean_ms, name, n, *values in rows:
+                writer.writerow([mean_ms, name, n] + [round(float(v), 4) for v in values])
+        print(f"Report saved to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
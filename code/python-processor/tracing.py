@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Per-packet latency tracing through switch → NATS → processor → switch.
+
+With TRACE_FILE set, the MITM switch (code/mitm/switch/switch.c) stamps
+every sampled frame it publishes with a NATS header
+
+    Mb-Trace: <trace id> <ingress time, ns since the epoch>
+
+main.py creates a Trace for each frame carrying that header. The
+pipeline, delay scheduler and egress fill in their stage timings, and
+the forwarded frame leaves with the original header plus
+
+    Mb-Proc: <arrival ns since the epoch> <parse> <mitigate> <detect>
+             <drawn delay> <queue> <publish> <processor total> <mean delay us>
+
+(durations in ns). The switch adds its egress time and appends one
+fixed-size record per frame to the trace file; trace_report.py reads
+it. Frames without the header are not traced and cost nothing extra.
+"""
+import time
+from time import perf_counter_ns
+
+TRACE_HEADER = "Mb-Trace"
+PROC_HEADER = "Mb-Proc"
+
+
+class Trace:
+    __slots__ = ("ingress", "t_in", "p_in", "parse", "mitigate", "detect", "delay",
+                 "mean_delay_us", "submitted", "dequeued")
+
+    def __init__(self, ingress):
+        self.ingress = ingress
+        self.t_in = time.time_ns()
+        self.p_in = perf_counter_ns()
+        self.parse = self.mitigate = self.detect = self.delay = 0
+        self.mean_delay_us = 0
+        self.submitted = self.dequeued = None
+
+    def processed(self, t0, t1, t2, t3, delay, mean_delay_ms):
+        """Stage boundaries from Pipeline.handle (perf_counter seconds)."""
+        self.parse = int((t1 - t0) * 1e9)
+        self.mitigate = int((t2 - t1) * 1e9)
+        self.detect = int((t3 - t2) * 1e9)
+        self.delay = int(delay * 1e9)
+        self.mean_delay_us = int(mean_delay_ms * 1000)
+
+    def headers(self):
+        """NATS headers for the forwarded frame, taken at hand-off to the client."""
+        now = perf_counter_ns()
+        queue = publish = 0
+        if self.submitted is not None and self.dequeued is not None:
+            queue = self.dequeued - self.submitted
+            publish = now - self.dequeued
+        return {
+            TRACE_HEADER: self.ingress,
+            PROC_HEADER: f"{self.t_in} {self.parse} {self.mitigate} {self.detect} {self.delay} "
+                         f"{queue} {publish} {now - self.p_in} {self.mean_delay_us}",
+        }
+
+
+def from_headers(headers):
+    """A Trace for a frame the switch marked for tracing, else None."""
+    if headers:
+        ingress = headers.get(TRACE_HEADER)
+        if ingress:
+            return Trace(ingress)
+    return None
@@ -1,40 +1,202 @@
 #!/usr/bin/env python3
 from scapy.all import IP, ICMP, send
+from time import perf_counter, sleep
 import argparse
+import socket
 import time
+import csv
+import sys
+import os
 
-def encode_message_in_ipid(message):
+# shared encoder/decoder (code/common, mounted at /code/common)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from covert_codec import CODECS, encode, packet_bits
+
+MARKER = b"CovertChannel:"
+
+def encode_message_in_ipid(message, codec="ascii", fec=0, repeat=1):
     """
-    Convert the message into a list of ASCII integer codes.
+    Convert the message into (IP ID, ICMP id, ICMP seq) per packet. The
+    default "ascii" codec puts one character's code in each IP ID.
     """
-    return [ord(c) for c in message]
+    return encode(message.encode(), codec, fec, repeat)
 
-def send_covert_data(destination, message, interval):
+def write_manifest(path, message, codec, fec, repeat, packets, sent_at):
+    """
+    One row per packet: index, wall-clock send time, the three header
+    fields and the message bits it carries. tests/covert_score.py joins it
+    with the receiver's --log.
     """
-    For each character, craft an IP packet with the IP ID set to the character's ASCII code and
-    include a marker in the payload.
-    
-    Each packet's payload is set to "CovertChannel:<character>".
+    bits = packet_bits(message.encode(), codec, fec, repeat)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "t_send", "ip_id", "icmp_id", "icmp_seq", "bits"])
+        for i, (t, (val, icmp_id, icmp_seq)) in enumerate(zip(sent_at, packets)):
+            writer.writerow([i, f"{t:.6f}", val, icmp_id, icmp_seq, bits[i]])
+
+def describe(val, icmp_id, icmp_seq, codec):
+    if codec == "ascii":
+        return f"Sent packet with IP ID: {val} (character: {chr(val)}) | Payload: {MARKER.decode()}{chr(val)}"
+    return f"Sent packet with IP ID: {val} | ICMP id: {icmp_id:#06x} seq: {icmp_seq}"
+
+def send_covert_data(destination, message, interval, codec="ascii", fec=0, repeat=1,
+                     manifest=None):
     """
-    data_bytes = encode_message_in_ipid(message)
-    for val in data_bytes:
+    For each packet, craft an IP packet with the IP ID set to the encoded value
+    (with the ascii codec: the character's ASCII code) and include a marker in the payload.
+
+    Each packet's payload is set to "CovertChannel:<low byte of the IP ID>".
+    With `manifest`, the send time of every packet is written there.
+    """
+    packets = encode_message_in_ipid(message, codec, fec, repeat)
+    sent_at = []
+    for val, icmp_id, icmp_seq in packets:
         # Create a marker payload including the specific character.
-        marker_payload = f"CovertChannel:{chr(val)}"
+        marker_payload = MARKER + bytes((val & 0xFF,))
         # Construct the packet with the DF flag to help preserve the IP ID.
-        pkt = IP(dst=destination, id=val, flags="DF") / ICMP() / marker_payload
+        pkt = IP(dst=destination, id=val, flags="DF") / ICMP(id=icmp_id, seq=icmp_seq) / marker_payload
+        sent_at.append(time.time())
         send(pkt, verbose=0)
-        print(f"Sent packet with IP ID: {val} (character: {chr(val)}) | Payload: {marker_payload}")
+        print(describe(val, icmp_id, icmp_seq, codec))
         time.sleep(interval)
+    if manifest:
+        write_manifest(manifest, message, codec, fec, repeat, packets, sent_at)
+
+def ones_sum(data):
+    """16-bit ones-complement sum of `data` (not inverted)."""
+    if len(data) % 2:
+        data = bytes(data) + b"\0"
+    s = sum(int.from_bytes(data[i:i + 2], "big") for i in range(0, len(data), 2))
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return s
+
+class PacketTemplate:
+    """
+    The sender's IP/ICMP packet, built once by Scapy. Per packet only the
+    IP ID, the ICMP echo id/sequence, the byte after the marker and the
+    ICMP checksum are patched; the kernel fills in the IP header
+    checksum (IPPROTO_RAW).
+    """
+
+    def __init__(self, destination):
+        pkt = IP(dst=destination, id=0, flags="DF") / ICMP() / (MARKER + b"\0")
+        self.buf = bytearray(bytes(pkt))
+        icmp = (self.buf[0] & 0x0F) * 4
+        self.icmp = icmp
+        self.csum_off = icmp + 2
+        self.char_off = len(self.buf) - 1
+        # the character is the high byte of its 16-bit word at even offsets
+        self.char_shift = 8 if (self.char_off - icmp) % 2 == 0 else 0
+        self.buf[self.csum_off:self.csum_off + 2] = b"\0\0"
+        self.base = ones_sum(self.buf[icmp:])
+
+    def fill(self, val, icmp_id=0, icmp_seq=0):
+        buf = self.buf
+        buf[4] = val >> 8
+        buf[5] = val & 0xFF
+        buf[self.char_off] = val & 0xFF
+        icmp = self.icmp
+        buf[icmp + 4] = icmp_id >> 8
+        buf[icmp + 5] = icmp_id & 0xFF
+        buf[icmp + 6] = icmp_seq >> 8
+        buf[icmp + 7] = icmp_seq & 0xFF
+        s = self.base + ((val & 0xFF) << self.char_shift) + icmp_id + icmp_seq
+        s = (s & 0xFFFF) + (s >> 16)
+        s = (s & 0xFFFF) + (s >> 16)
+        csum = ~s & 0xFFFF
+        buf[self.csum_off] = csum >> 8
+        buf[self.csum_off + 1] = csum & 0xFF
+        return buf
+
+def wait_until(deadline, spin):
+    """Sleep until `spin` seconds before `deadline`, then busy-wait for it."""
+    remaining = deadline - perf_counter()
+    if remaining > spin:
+        sleep(remaining - spin)
+    while perf_counter() < deadline:
+        pass
+
+def send_covert_data_raw(destination, message, interval, batch=1, repeat=1,
+                         spin_us=200, verbose=False, codec="ascii", fec=0, manifest=None):
+    """
+    Same packets as send_covert_data(), sent from one raw socket held for
+    the whole run. Packet i is due at start + i * interval (absolute
+    deadlines, so sleep overshoot does not add up); with `batch` > 1 the
+    sender wakes once per `batch` packets and sends them back to back.
+    Returns (packets sent, elapsed seconds, per-wakeup lateness in seconds).
+    """
+    packets = encode_message_in_ipid(message, codec, fec, repeat)
+    sent_at = [] if manifest else None
+    template = PacketTemplate(destination)
+    addr = (destination, 0)
+    spin = spin_us / 1e6
+    late = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+    try:
+        start = perf_counter() + 0.01
+        for i in range(0, len(packets), batch):
+            deadline = start + i * interval
+            wait_until(deadline, spin)
+            late.append(perf_counter() - deadline)
+            for val, icmp_id, icmp_seq in packets[i:i + batch]:
+                if sent_at is not None:
+                    sent_at.append(time.time())
+                sock.sendto(template.fill(val, icmp_id, icmp_seq), addr)
+                if verbose:
+                    print(describe(val, icmp_id, icmp_seq, codec))
+        elapsed = perf_counter() - start
+    finally:
+        sock.close()
+    if manifest:
+        write_manifest(manifest, message, codec, fec, repeat, packets, sent_at)
+    return len(packets), elapsed, late
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Covert Channel Sender using IP ID field")
-    parser.add_argument("--dest", type=str, required=True, 
+    parser.add_argument("--dest", type=str, required=True,
                         help="Destination IP address (INSEC container IP)")
     parser.add_argument("--message", type=str, required=True,
                         help="Covert message to send")
     parser.add_argument("--interval", type=float, default=1.0,
                         help="Interval in seconds between packets")
+    parser.add_argument("--codec", choices=CODECS, default="ascii",
+                        help="ascii: one character per IP ID (original); raw16: two bytes per "
+                             "IP ID; framed: two bytes per IP ID with sequence numbers")
+    parser.add_argument("--fec", type=int, default=0,
+                        help="framed codec: one XOR parity packet per this many data packets")
+    parser.add_argument("--mode", choices=["scapy", "raw"], default="scapy",
+                        help="scapy: send() per packet (original); raw: persistent raw "
+                             "socket, packet template and deadline pacing")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="raw mode: packets sent back to back per wakeup")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="send the message this many times")
+    parser.add_argument("--spin-us", type=float, default=200,
+                        help="raw mode: busy-wait this long before each deadline")
+    parser.add_argument("--verbose", action="store_true",
+                        help="raw mode: print every packet")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="write every packet's send time and contents to this CSV")
     args = parser.parse_args()
-    
+
     print(f"Starting covert transmission to {args.dest}...")
-    send_covert_data(args.dest, args.message, args.interval)
+    if args.mode == "scapy":
+        send_covert_data(args.dest, args.message, args.interval, args.codec, args.fec,
+                         args.repeat, args.manifest)
+    else:
+        n, elapsed, late = send_covert_data_raw(args.dest, args.message, args.interval,
+                                                batch=max(1, args.batch), repeat=args.repeat,
+                                                spin_us=args.spin_us, verbose=args.verbose,
+                                                codec=args.codec, fec=args.fec,
+                                                manifest=args.manifest)
+        late_us = sorted(x * 1e6 for x in late)
+        bits = len(args.message.encode()) * 8 * args.repeat
+        if not n or elapsed <= 0:
+            # an empty message encodes to no packets (ascii, raw16)
+            print(f"Sent {n} packets, nothing to pace")
+        else:
+            print(f"Sent {n} packets in {elapsed:.4f}s ({n / elapsed:.0f} pps, "
+                  f"{bits / elapsed:.0f} message bps) | deadline lateness us: "
+                  f"mean={sum(late_us) / len(late_us):.1f} "
+                  f"p99={late_us[int(len(late_us) * 0.99)]:.1f} max={late_us[-1]:.1f}")
@@ -18,6 +18,9 @@ nft 'add chain input_table input {type filter hook input priority -300;}'
 nft 'add rule input_table input ip protocol udp udp checksum set 0'
 
 
+# test agent for the benchmarks (tests/agent_client.py)
+python3 /code/common/agent.py &
+
 while true; 
     do sleep 0.01;
     done
\ No newline at end of file
@@ -1,4 +1,7 @@
 #!/bin/bash
+# test agent for the benchmarks (tests/agent_client.py)
+python3 /code/common/agent.py &
+
 echo "Starting python-processor..."
 python /code/python-processor/main.py
 
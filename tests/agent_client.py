@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Host side of code/common/agent.py.
+
+AgentClient("insec") keeps one `docker exec -i insec python3
+/code/common/agent.py --attach` session open and sends the agent's JSON
+commands over it; if the container's agent is not running yet it is
+started first. A failed command raises AgentError.
+"""
+import json
+import time
+import subprocess
+
+AGENT = "/code/common/agent.py"
+
+
+class AgentError(RuntimeError):
+    def __init__(self, reply):
+        super().__init__(reply.get("error", "agent request failed"))
+        self.reply = reply
+
+
+class AgentClient:
+    def __init__(self, container, start_timeout=10.0):
+        self.container = container
+        self.proc = self._attach()
+        if self.proc is None:
+            subprocess.run(["docker", "exec", "-d", container, "python3", AGENT], check=True)
+            deadline = time.monotonic() + start_timeout
+            while self.proc is None:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"agent in {container} did not start")
+                time.sleep(0.1)
+                self.proc = self._attach()
+
+    def _attach(self):
+        """An attached session, or None if no agent answers."""
+        proc = subprocess.Popen(["docker", "exec", "-i", self.container, "python3", AGENT, "--attach"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        try:
+            self.proc = proc
+            self.request("ping")
+            return proc
+        except (AgentError, BrokenPipeError):
+            proc.kill()
+            proc.wait()
+            return None
+
+    def request(self, cmd, **kw):
+        self.proc.stdin.write(json.dumps(dict(cmd=cmd, **kw)) + "\n")
+        self.proc.stdin.flush()
+        line = self.proc.stdout.readline()
+        if not line:
+            raise AgentError({"error": f"agent session to {self.container} closed"})
+        reply = json.loads(line)
+        if not reply["ok"]:
+            raise AgentError(reply)
+        return reply
+
+    def start(self, name, argv, env=None, ready=None, timeout=30):
+        return self.request("start", name=name, argv=argv, env=env or {}, ready=ready, timeout=timeout)
+
+    def wait(self, name, timeout=None):
+        return self.request("wait", name=name, timeout=timeout)
+
+    def stop(self, name, timeout=10):
+        return self.request("stop", name=name, timeout=timeout)
+
+    def exec(self, argv, timeout=30):
+        return self.request("exec", argv=argv, timeout=timeout)
+
+    def call(self, path, func, **kwargs):
+        return self.request("call", path=path, func=func, kwargs=kwargs)
+
+    def fetch(self, path, dest):
+        """Copy a text file from the container to `dest` on the host."""
+        reply = self.exec(["cat", path])
+        if reply["rc"] != 0:
+            raise AgentError({"error": reply["output"].strip()})
+        with open(dest, "w") as f:
+            f.write(reply["output"])
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
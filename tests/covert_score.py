@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Receiver-side scoring of covert channel trials.
+
+Each trial has the sender's manifest (covert_sender.py --manifest: send
+time, header fields and message bits per packet) and the receiver's log
+(covert_receiver.py --log: capture time and header fields per packet).
+Received packets are matched to sent ones by the ICMP sequence number
+(the packet index mod 2^16, unwrapped in arrival order). For every
+trial this gives:
+
+  loss          sent packets never received
+  SER           received symbols whose IP ID differs from the one sent
+  goodput       message bits of correctly received symbols per second,
+                first send to last receive
+  latency       one-way capture time minus send time, p50/p90/p99/max
+                (sender and receiver share the host clock)
+
+All trials are loaded into one set of arrays and scored together.
+
+    python tests/covert_score.py TPPhase2_results
+scores every manifest_<name>.csv / received_<name>.csv pair in the
+folder and writes trial_scores.csv next to them.
+"""
+import os
+import sys
+import csv
+import glob
+import warnings
+import argparse
+import numpy as np
+
+COLUMNS = ["trial", "sent", "received", "duplicates", "loss_pct", "symbol_errors", "ser",
+           "correct_bits", "duration_s", "goodput_bps",
+           "latency_p50_ms", "latency_p90_ms", "latency_p99_ms", "latency_max_ms"]
+
+
+def _load(path, ncols):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # header-only file: no packets
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return data if data.size else np.empty((0, ncols))
+
+
+def load_trials(pairs):
+    """
+    Concatenate (manifest, received log) file pairs into
+    sent = (trial, t_send, ip_id, bits), recv = (trial, t_recv, ip_id, icmp_seq).
+    """
+    sent, recv = [], []
+    for trial, (manifest, log) in enumerate(pairs):
+        m = _load(manifest, 6)   # index, t_send, ip_id, icmp_id, icmp_seq, bits
+        r = _load(log, 4)        # t_recv, ip_id, icmp_id, icmp_seq
+        sent.append(np.column_stack([np.full(len(m), trial), m[:, 1], m[:, 2], m[:, 5]]))
+        recv.append(np.column_stack([np.full(len(r), trial), r[:, 0], r[:, 1], r[:, 3]]))
+    if not pairs:
+        return np.empty((0, 4)), np.empty((0, 4))
+    return np.concatenate(sent), np.concatenate(recv)
+
+
+def _unwrap(trial, seq):
+    """Packet index from 16-bit sequence numbers in arrival order, per trial."""
+    if not len(seq):
+        return seq
+    d = np.empty_like(seq)
+    d[0] = seq[0]
+    d[1:] = ((np.diff(seq) + 0x8000) & 0xFFFF) - 0x8000
+    first = np.r_[True, trial[1:] != trial[:-1]]
+    d[first] = seq[first]
+    total = np.cumsum(d)
+    group = np.cumsum(first) - 1
+    return total - (total[first] - d[first])[group]
+
+
+def _per_trial_quantiles(trial, values, n, qs):
+    """Nearest-rank quantiles of `values` per trial; NaN for empty trials."""
+    order = np.lexsort((values, trial))
+    values = values[order]
+    counts = np.bincount(trial, minlength=n)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    out = {}
+    for q in qs:
+        pos = starts + np.maximum(np.ceil(q * counts).astype(np.int64) - 1, 0)
+        out[q] = np.where(counts > 0, values[np.minimum(pos, len(values) - 1)] if len(values) else 0, np.nan)
+    return out
+
+
+def score(sent, recv, n):
+    """Per-trial metrics (dict of arrays, one entry per COLUMNS) for n trials."""
+    s_trial = sent[:, 0].astype(np.int64)
+    r_trial = recv[:, 0].astype(np.int64)
+    # position of each sent packet within its trial
+    s_start = np.r_[0, np.cumsum(np.bincount(s_trial, minlength=n))[:-1]]
+    s_index = np.arange(len(sent)) - s_start[s_trial]
+    s_key = (s_trial << 32) | s_index
+
+    r_index = _unwrap(r_trial, recv[:, 3].astype(np.int64))
+    r_key = (r_trial << 32) | np.clip(r_index, 0, None)
+    pos = np.minimum(np.searchsorted(s_key, r_key), max(len(s_key) - 1, 0))
+    matched = (r_index >= 0) & (len(s_key) > 0)
+    if len(s_key):
+        matched &= s_key[pos] == r_key
+    # first arrival of each sent packet; later copies are duplicates
+    _, first = np.unique(r_key[matched], return_index=True)
+    rows = np.flatnonzero(matched)[first]
+    pos, tr = pos[rows], r_trial[rows]
+
+    n_sent = np.bincount(s_trial, minlength=n)
+    n_recv = np.bincount(tr, minlength=n)
+    correct = recv[rows, 2] == sent[pos, 2]
+    errors = np.bincount(tr, weights=~correct, minlength=n)
+    bits = np.bincount(tr, weights=np.where(correct, sent[pos, 3], 0), minlength=n)
+
+    t_first = np.full(n, np.inf)
+    np.minimum.at(t_first, s_trial, sent[:, 1])
+    t_last = np.full(n, -np.inf)
+    np.maximum.at(t_last, tr, recv[rows, 1])
+    duration = np.where(n_recv > 0, t_last - t_first, 0.0)
+
+    lat = _per_trial_quantiles(tr, (recv[rows, 1] - sent[pos, 1]) * 1000.0, n, (0.5, 0.9, 0.99, 1.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "trial": np.arange(n),
+            "sent": n_sent,
+            "received": n_recv,
+            "duplicates": np.bincount(r_trial[matched], minlength=n) - n_recv,
+            "loss_pct": np.where(n_sent > 0, 100.0 * (1 - n_recv / n_sent), np.nan),
+            "symbol_errors": errors.astype(np.int64),
+            "ser": np.where(n_recv > 0, errors / n_recv, np.nan),
+            "correct_bits": bits.astype(np.int64),
+            "duration_s": duration,
+            "goodput_bps": np.where(duration > 0, bits / duration, 0.0),
+            "latency_p50_ms": lat[0.5],
+            "latency_p90_ms": lat[0.9],
+            "latency_p99_ms": lat[0.99],
+            "latency_max_ms": lat[1.0],
+        }
+
+
+def score_files(pairs):
+    sent, recv = load_trials(pairs)
+    return score(sent, recv, len(pairs))
+
+
+def find_pairs(folder):
+    """(name, manifest, received log) for every complete pair in `folder`."""
+    out = []
+    for manifest in sorted(glob.glob(os.path.join(folder, "manifest_*.csv"))):
+        name = os.path.basename(manifest)[len("manifest_"):-len(".csv")]
+        log = os.path.join(folder, f"received_{name}.csv")
+        if os.path.isfile(log):
+            out.append((name, manifest, log))
+    return out
+
+
+def write_scores(path, names, scores):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name"] + COLUMNS[1:])
+        for i, name in enumerate(names):
+            writer.writerow([name] + [round(float(scores[c][i]), 4) for c in COLUMNS[1:]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score covert channel trials")
+    parser.add_argument("folder", help="folder with manifest_<name>.csv / received_<name>.csv pairs")
+    args = parser.parse_args()
+
+    found = find_pairs(args.folder)
+    if not found:
+        print(f"No manifest/received pairs in {args.folder}")
+        sys.exit(1)
+    names = [name for name, _m, _r in found]
+    scores = score_files([(m, r) for _name, m, r in found])
+    print(f"{'trial':>28} {'sent':>6} {'recv':>6} {'loss %':>7} {'SER':>6} {'goodput':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for i, name in enumerate(names):
+        print(f"{name:>28} {scores['sent'][i]:>6} {scores['received'][i]:>6} "
+              f"{scores['loss_pct'][i]:>7.2f} {scores['ser'][i]:>6.3f} {scores['goodput_bps'][i]:>9.2f} "
+              f"{scores['latency_p50_ms'][i]:>8.2f} {scores['latency_p99_ms'][i]:>8.2f}")
+    path = os.path.join(args.folder, "trial_scores.csv")
+    write_scores(path, names, scores)
+    print(f"Scores saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the marker detector against sender-side ground truth.
+
+The processor logs every scored window to detection_windows.bin
+(t_first, t_last, markers, decision; pipeline.WINDOW_SCHEMA). The covert
+sender's manifest (covert_sender.py --manifest) lists the send time of
+every covert packet. A window is labelled covert if a covert packet was
+sent within [t_first - slack, t_last]: the packet reaches the processor
+at most --slack-ms after it was sent (sender and processor share the
+host clock). Everything else is benign, so a run without a manifest
+(no covert traffic) only has negatives.
+
+With the labels, all windows are scored at once:
+
+  confusion     TP/FP/TN/FN, precision, recall, F1, FPR of the decisions
+  ROC / PR      over thresholds on the window's marker count
+  delay         for every covert episode (sends no more than --gap-s
+                apart), time from its first send to the end of the first
+                positive window; episodes not detected before their last
+                send + --gap-s are missed
+
+    python tests/detection_eval.py --windows TPPhase3_results/1/detection_windows.bin \\
+        --manifest TPPhase3_results/1/manifest.csv --out TPPhase3_results/1
+
+writes detection_eval.csv, roc.csv, pr.csv and detection_delays.csv.
+"""
+import os
+import sys
+import csv
+import argparse
+import warnings
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code", "python-processor"))
+from metrics_sink import read_columnar
+
+
+def load_windows(paths):
+    """t_first, t_last, markers, decision of the windows in all files, by t_last."""
+    cols = {name: [] for name in ("t_first", "t_last", "markers", "decision")}
+    for path in paths:
+        data = read_columnar(path)
+        for name in cols:
+            cols[name].append(np.frombuffer(data[name], dtype=np.dtype(data[name].typecode)))
+    t_first, t_last, markers, decision = (
+        np.concatenate(cols[name]) if cols[name] else np.empty(0)
+        for name in ("t_first", "t_last", "markers", "decision"))
+    order = np.argsort(t_last, kind="stable")
+    return (t_first[order], t_last[order], markers[order].astype(np.int64),
+            decision[order].astype(bool))
+
+
+def load_covert_times(paths):
+    """Sorted send times of every packet in the manifests."""
+    times = []
+    for path in paths:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # header-only manifest
+            times.append(np.loadtxt(path, delimiter=",", skiprows=1, usecols=1, ndmin=1))
+    return np.sort(np.concatenate(times)) if times else np.empty(0)
+
+
+def label(t_first, t_last, covert, slack):
+    """Covert packets sent within each window (arrival up to `slack` s after sending)."""
+    return (np.searchsorted(covert, t_last, side="right")
+            - np.searchsorted(covert, t_first - slack, side="left"))
+
+
+def confusion(decision, truth):
+    TP = int(np.count_nonzero(decision & truth))
+    FP = int(np.count_nonzero(decision & ~truth))
+    FN = int(np.count_nonzero(~decision & truth))
+    TN = len(decision) - TP - FP - FN
+    precision = TP / (TP + FP) if TP + FP else 0.0
+    recall = TP / (TP + FN) if TP + FN else 0.0
+    return {
+        "windows": len(decision), "TP": TP, "FP": FP, "TN": TN, "FN": FN,
+        "precision": precision, "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "fpr": FP / (FP + TN) if FP + TN else 0.0,
+    }
+
+
+def roc_pr(score, truth):
+    """
+    ROC and precision/recall for "score >= threshold" at every distinct
+    score: (thresholds, fpr, tpr, precision, roc_auc, average_precision).
+    """
+    order = np.argsort(-score, kind="stable")
+    s, y = score[order], truth[order]
+    tp = np.cumsum(y)
+    fp = np.cumsum(~y)
+    last = np.r_[s[1:] != s[:-1], True] if len(s) else np.empty(0, dtype=bool)
+    thresholds, tp, fp = s[last], tp[last], fp[last]
+    pos, neg = int(y.sum()), len(y) - int(y.sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tpr = np.r_[0.0, tp / pos] if pos else np.full(len(tp) + 1, np.nan)
+        fpr = np.r_[0.0, fp / neg] if neg else np.full(len(fp) + 1, np.nan)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+    auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)) if pos and neg else float("nan")
+    ap = float(np.sum(np.diff(tpr) * precision)) if pos else float("nan")
+    return thresholds, fpr[1:], tpr[1:], precision, auc, ap
+
+
+def detection_delays(covert, t_last, decision, gap):
+    """(episode start, end, delay in s or NaN if missed) for every covert episode."""
+    if not len(covert):
+        return np.empty(0), np.empty(0), np.empty(0)
+    brk = np.flatnonzero(np.diff(covert) > gap)
+    starts = covert[np.r_[0, brk + 1]]
+    ends = covert[np.r_[brk, len(covert) - 1]]
+    alarms = t_last[decision]
+    k = np.searchsorted(alarms, starts)
+    t_alarm = alarms[np.minimum(k, max(len(alarms) - 1, 0))] if len(alarms) else np.full(len(starts), np.inf)
+    detected = (k < len(alarms)) & (t_alarm <= ends + gap)
+    return starts, ends, np.where(detected, t_alarm - starts, np.nan)
+
+
+def evaluate(window_paths, manifest_paths, slack=0.005, gap=5.0):
+    t_first, t_last, markers, decision = load_windows(window_paths)
+    covert = load_covert_times(manifest_paths)
+    truth = label(t_first, t_last, covert, slack) > 0
+    summary = confusion(decision, truth)
+    thresholds, fpr, tpr, precision, auc, ap = roc_pr(markers, truth)
+    starts, ends, delays = detection_delays(covert, t_last, decision, gap)
+    found = delays[~np.isnan(delays)]
+    summary.update({
+        "covert_packets": len(covert),
+        "roc_auc": auc,
+        "average_precision": ap,
+        "episodes": len(starts),
+        "episodes_detected": len(found),
+        "delay_mean_s": float(found.mean()) if len(found) else float("nan"),
+        "delay_max_s": float(found.max()) if len(found) else float("nan"),
+    })
+    curves = {"thresholds": thresholds, "fpr": fpr, "tpr": tpr, "precision": precision}
+    return summary, curves, (starts, ends, delays)
+
+
+def write_results(out_dir, summary, curves, episodes):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "detection_eval.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(summary))
+        writer.writerow([round(v, 6) if isinstance(v, float) else v for v in summary.values()])
+    with open(os.path.join(out_dir, "roc.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["min_markers", "fpr", "tpr"])
+        writer.writerows(zip(curves["thresholds"].tolist(), curves["fpr"].round(6).tolist(),
+                             curves["tpr"].round(6).tolist()))
+    with open(os.path.join(out_dir, "pr.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["min_markers", "recall", "precision"])
+        writer.writerows(zip(curves["thresholds"].tolist(), curves["tpr"].round(6).tolist(),
+                             curves["precision"].round(6).tolist()))
+    with open(os.path.join(out_dir, "detection_delays.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["episode_start", "episode_end", "delay_s"])
+        for start, end, delay in zip(*episodes):
+            writer.writerow([f"{start:.6f}", f"{end:.6f}", "" if np.isnan(delay) else round(delay, 6)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate detector windows against sender manifests")
+    parser.add_argument("--windows", nargs="+", required=True,
+                        help="detection_windows.bin file(s), e.g. one per launcher.py worker")
+    parser.add_argument("--manifest", nargs="*", default=[],
+                        help="covert_sender.py --manifest file(s); none: no covert traffic")
+    parser.add_argument("--slack-ms", type=float, default=5.0,
+                        help="longest sender → processor transit")
+    parser.add_argument("--gap-s", type=float, default=5.0,
+                        help="pause between sends that starts a new covert episode")
+    parser.add_argument("--out", help="folder for the CSV results (default: next to the first window file)")
+    args = parser.parse_args()
+
+    summary, curves, episodes = evaluate(args.windows, args.manifest,
+                                         args.slack_ms / 1000.0, args.gap_s)
+    print(f"{summary['windows']} windows, {summary['covert_packets']} covert packets, "
+          f"{summary['episodes']} episodes")
+    print(f"TP={summary['TP']} FP={summary['FP']} TN={summary['TN']} FN={summary['FN']} "
+          f"precision={summary['precision']:.3f} recall={summary['recall']:.3f} "
+          f"F1={summary['f1']:.3f} FPR={summary['fpr']:.4f}")
+    delay = (f", delay mean={summary['delay_mean_s']:.3f}s max={summary['delay_max_s']:.3f}s"
+             if summary["episodes_detected"] else "")
+    print(f"ROC AUC={summary['roc_auc']:.3f} AP={summary['average_precision']:.3f} | "
+          f"detected {summary['episodes_detected']}/{summary['episodes']} episodes{delay}")
+    out = args.out or os.path.dirname(os.path.abspath(args.windows[0]))
+    write_results(out, summary, curves, episodes)
+    print(f"Results saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
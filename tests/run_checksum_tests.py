@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Correctness check for the in-place IP ID mitigation.
+
+For a corpus of random IPv4 frames, rewrite the IP ID with
+mitigation.MitigationPolicy([("ip_id", "random")]).apply, the path
+MITIGATE_ACTIVE=1 takes without a policy file (incremental checksum via
+set_ip_id), and compare the result byte-for-byte against Scapy
+rebuilding the packet with the same ID. Also reports the per-frame cost
+of both approaches.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+import fastpath
+import mitigation
+from scapy.all import Ether, Dot1Q, IP, ICMP, TCP, UDP, IPOption_NOP
+
+
+def random_frame(rng):
+    ip = IP(src=f"10.1.0.{rng.randint(1, 254)}", dst=f"10.0.0.{rng.randint(1, 254)}",
+            id=rng.randint(0, 0xFFFF), ttl=rng.randint(1, 255),
+            tos=rng.randint(0, 255), flags=rng.choice(["", "DF"]))
+    if rng.random() < 0.2:
+        ip.options = [IPOption_NOP()] * 4
+    l4 = rng.choice([
+        lambda: ICMP(id=rng.randint(0, 0xFFFF), seq=rng.randint(0, 0xFFFF)),
+        lambda: TCP(sport=rng.randint(1, 0xFFFF), dport=rng.randint(1, 0xFFFF)),
+        lambda: UDP(sport=rng.randint(1, 0xFFFF), dport=rng.randint(1, 0xFFFF)),
+    ])()
+    payload = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 64)))
+    eth = Ether() / Dot1Q(vlan=rng.randint(1, 4094)) if rng.random() < 0.2 else Ether()
+    return bytes(eth / ip / l4 / payload)
+
+
+def scapy_rewrite(data, new_id):
+    pkt = Ether(data)
+    pkt[IP].id = new_id
+    del pkt[IP].chksum
+    return bytes(pkt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental IP checksum check")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [random_frame(rng) for _ in range(args.frames)]
+    new_ids = [rng.randint(0, 0xFFFF) for _ in corpus]
+
+    ids = iter(new_ids)
+    policy = mitigation.MitigationPolicy([("ip_id", "random")], rand=lambda _k: next(ids))
+    failures = 0
+    for data, new_id in zip(corpus, new_ids):
+        frame = policy.apply(data, fastpath.parse(data))
+        if bytes(frame) != scapy_rewrite(data, new_id):
+            failures += 1
+            if failures <= 5:
+                print(f"MISMATCH id={new_id}: {data.hex()}")
+
+    start = time.perf_counter()
+    for data, new_id in zip(corpus, new_ids):
+        scapy_rewrite(data, new_id)
+    scapy_us = (time.perf_counter() - start) / len(corpus) * 1e6
+
+    policy = mitigation.MitigationPolicy([("ip_id", "random")])
+    start = time.perf_counter()
+    for data in corpus:
+        policy.apply(data, fastpath.parse(data))
+    fast_us = (time.perf_counter() - start) / len(corpus) * 1e6
+
+    print(f"{len(corpus) - failures}/{len(corpus)} frames match Scapy's checksums")
+    print(f"scapy rebuild: {scapy_us:8.2f} us/frame")
+    print(f"in-place     : {fast_us:8.2f} us/frame (parse + rewrite)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
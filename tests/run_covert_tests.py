@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
-import subprocess
-import time
 import csv
 import math
 import statistics
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agent_client import AgentClient, AgentError
+from covert_score import score_files, write_scores
 
 
 # Standardized output directory name.
@@ -18,49 +21,55 @@ num_trials = 5
 
 # The covert message to send.
 covert_message = "Secret: Operation Mincemeat"
-message_length_bits = len(covert_message) * 8
 receiver_count = len(covert_message)
 
+# per-packet send/receive records inside the containers, copied out per trial
+MANIFEST = "/tmp/covert_manifest.csv"
+RECEIVED = "/tmp/covert_received.csv"
+
+# one persistent agent session per container instead of a docker exec per run
+sec = AgentClient("sec")
+insec = AgentClient("insec")
+
 def run_covert_sender(interval):
-    
-    cmd = [
-        "docker", "exec", "sec", "python3",
-        "/code/sec/covert_sender.py",
-        "--dest", "10.0.0.21",
-        "--message", covert_message,
-        "--interval", str(interval)
-    ]
+    """
+    Run the sender inside the sec agent's warm interpreter; elapsed covers
+    only the sending itself (no docker exec or Python start-up).
+    """
     print(f"Running covert sender with interval {interval} sec...")
-    start = time.time()
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    end = time.time()
-    elapsed = end - start
-    sender_output = result.stdout
-    if result.stderr:
-        sender_output += "\nError: " + result.stderr
-        print("Sender Error:", result.stderr)
-    return elapsed, sender_output
+    try:
+        reply = sec.call("/code/sec/covert_sender.py", "send_covert_data",
+                         destination="10.0.0.21", message=covert_message, interval=interval,
+                         manifest=MANIFEST)
+    except AgentError as e:
+        print("Sender Error:", e)
+        return 0, "Error: " + str(e)
+    return reply["elapsed_s"], reply["output"]
 
 results = []
 trial_results = {}
+trials = []  # (interval, name) in run order
 
 for interval in intervals:
-    capacities = []
     print(f"\nTesting covert channel with interval: {interval} sec")
     for trial in range(1, num_trials + 1):
         print(f"Trial {trial}/{num_trials} for interval {interval} sec:")
 
-        # Launch receiver in background first
+        # no stale records from the previous trial
+        sec.exec(["rm", "-f", MANIFEST])
+        insec.exec(["rm", "-f", RECEIVED])
+
+        # Launch receiver first; start() returns once its capture is open
         receiver_cmd = [
-            "docker", "exec", "insec", "python3",
-            "/code/insec/covert_receiver.py",
+            "python3", "/code/insec/covert_receiver.py",
             "--iface", "eth0",
-            "--count", str(receiver_count)
+            "--count", str(receiver_count),
+            "--timeout", "60",
+            "--log", RECEIVED
         ]
         print(f"Starting covert receiver to capture {receiver_count} packets...")
-        receiver_proc = subprocess.Popen(receiver_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        insec.start("receiver", receiver_cmd, ready="Capture ready")
 
-        time.sleep(2)
         elapsed, sender_log = run_covert_sender(interval)
 
         # Ensure the receiver is still running before sending the message
@@ -71,13 +80,11 @@ for interval in intervals:
         print(f"Sender log saved to {sender_log_path}")
 
         try:
-            # Increased timeout to prevent premature process killing
-            receiver_stdout, receiver_stderr = receiver_proc.communicate(timeout=60)
-            receiver_log = receiver_stdout + ("\nError: " + receiver_stderr if receiver_stderr else "")
-        except subprocess.TimeoutExpired:
-            receiver_proc.kill()
-            receiver_log = "Error: Receiver command timed out."
-            print(receiver_log)
+            # the receiver gives up on its own after --timeout
+            receiver_log = insec.wait("receiver", timeout=65)["output"]
+        except AgentError:
+            receiver_log = insec.stop("receiver")["output"] + "\nError: Receiver command timed out."
+            print("Error: Receiver command timed out.")
 
         receiver_log_filename = f"received_interval_{interval}_trial_{trial}.txt"
         receiver_log_path = os.path.join(output_dir, receiver_log_filename)
@@ -85,15 +92,32 @@ for interval in intervals:
             f.write(receiver_log)
         print(f"Receiver log saved to {receiver_log_path}")
 
-        capacity = message_length_bits / elapsed if elapsed > 0 else 0
-        print(f"Elapsed time: {elapsed:.3f} sec, Capacity: {capacity:.2f} bps")
-        capacities.append(capacity)
-        time.sleep(5)
+        name = f"interval_{interval}_trial_{trial}"
+        try:
+            sec.fetch(MANIFEST, os.path.join(output_dir, f"manifest_{name}.csv"))
+            insec.fetch(RECEIVED, os.path.join(output_dir, f"received_{name}.csv"))
+            trials.append((interval, name))
+        except AgentError as e:
+            print(f"No packet records for this trial ({e}); it is left out of the scores")
+        print(f"Elapsed send time: {elapsed:.3f} sec")
+
+# Capacity is the goodput the receiver actually decoded, scored over all
+# trials at once from the send manifests and receive logs
+scores = score_files([(os.path.join(output_dir, f"manifest_{name}.csv"),
+                       os.path.join(output_dir, f"received_{name}.csv")) for _i, name in trials])
+write_scores(os.path.join(output_dir, "trial_scores.csv"), [name for _i, name in trials], scores)
+for k, (interval, name) in enumerate(trials):
+    print(f"{name}: goodput {scores['goodput_bps'][k]:.2f} bps, loss {scores['loss_pct'][k]:.1f}%, "
+          f"SER {scores['ser'][k]:.3f}, latency p50 {scores['latency_p50_ms'][k]:.2f} ms")
 
+for interval in intervals:
+    capacities = [float(scores["goodput_bps"][k]) for k, (i, _n) in enumerate(trials) if i == interval]
+    if not capacities:
+        continue
     trial_results[interval] = capacities
     avg = statistics.mean(capacities)
     stdev = statistics.stdev(capacities) if len(capacities) > 1 else 0
-    error_margin = 1.96 * stdev / math.sqrt(num_trials) if num_trials > 1 else 0
+    error_margin = 1.96 * stdev / math.sqrt(len(capacities)) if len(capacities) > 1 else 0
     lower_ci = avg - error_margin
     upper_ci = avg + error_margin
     results.append((interval, avg, lower_ci, upper_ci))
@@ -1,22 +1,29 @@
 #!/usr/bin/env python3
 import os
+import sys
 import subprocess
 import time
-import csv
 from datetime import datetime
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agent_client import AgentClient, AgentError
+from detection_eval import evaluate, write_results
+
 # --- Configuration ---
 PHASE2_CSV = "complete_results/Phase2_Covert_Channel_Capacity/covert_channel_capacity.png"
 PHASE3_ROOT = "TPPhase3_results"
 WINDOW_SLEEP = 30  # seconds
-PING_CMD = ["docker","exec","sec","bash","-lc","ping -i 0.1 -c 300 10.0.0.21"]
+SLACK = 0.05  # s; scapy stamps the send time before building the packet
+MANIFEST = "/tmp/covert_manifest.csv"
+PING_CMD = ["ping", "-i", "0.1", "-c", "300", "10.0.0.21"]
 SENDER_CMD = [
-    "docker","exec","sec","bash","-lc",
-    "python3 /code/sec/covert_sender.py "
-    "--dest 10.0.0.21 "
-    "--message 'Secret: Operation Mincemeat' "
-    "--interval 0.2"
+    "python3", "/code/sec/covert_sender.py",
+    "--dest", "10.0.0.21",
+    "--message", "Secret: Operation Mincemeat",
+    "--interval", "0.2",
+    "--repeat", "4",  # keeps the sender going for most of the window
+    "--manifest", MANIFEST,
 ]
 
 # Verify Phase 2 ran
@@ -28,6 +35,11 @@ if not os.path.isfile(PHASE2_CSV):
 #base_ts = datetime.now().strftime("%Y%m%d-%H%M%S")
 base_dir = PHASE3_ROOT
 os.makedirs(PHASE3_ROOT, exist_ok=True)
+base_ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+# one persistent agent session per container instead of a docker exec per step
+sec = AgentClient("sec")
+proc = AgentClient("python-processor")
 
 print("\n=== Phase 3 Detection Tests ===")
 for mode in ("0", "1"):
@@ -36,131 +48,107 @@ for mode in ("0", "1"):
     mode_dir = os.path.join(base_dir, mode)
     os.makedirs(mode_dir, exist_ok=True)
 
-    # restart and launch detector
-    subprocess.run(["docker","restart","-t","2","python-processor"], check=True)
-    subprocess.run([
-        "docker","exec","-d","python-processor","bash","-lc",
-        f"export COVERT_ACTIVE={mode} && python3 /code/python-processor/main.py"
-    ], check=True)
+    # launch a fresh detector writing to a known folder; start() returns
+    # once it is subscribed. The copy configure-processor.sh starts at boot
+    # would see every frame too.
+    container_dir = f"/code/python-processor/TPPhase3_results/{base_ts}-{mode}"
+    proc.exec(["pkill", "-f", "/code/python-processor/main.py"])
+    proc.start("processor", ["python3", "/code/python-processor/main.py"],
+               env={"COVERT_ACTIVE": mode, "RESULTS_DIR": container_dir},
+               ready="running →")
 
     # steady ping + (maybe) covert sender
     print("Starting ping from sec→insec…")
-    ping_proc = subprocess.Popen(PING_CMD, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sec.start("ping", PING_CMD)
     if mode == "1":
         print("Launching covert sender…")
-        covert_proc = subprocess.Popen(SENDER_CMD, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sec.exec(["rm", "-f", MANIFEST])
+        sec.start("sender", SENDER_CMD)
 
     print(f"Sleeping {WINDOW_SLEEP}s to collect detection windows…")
     time.sleep(WINDOW_SLEEP)
 
-    # tear down
-    print("Stopping ping (and covert sender)…")
-    ping_proc.terminate()
+    # tear down; the sender writes its manifest once it has sent everything
+    manifests = []
     if mode == "1":
-        covert_proc.terminate()
-
+        print("Waiting for the covert sender…")
+        try:
+            sec.wait("sender", timeout=60)
+            manifest = os.path.join(mode_dir, "manifest.csv")
+            sec.fetch(MANIFEST, manifest)
+            manifests.append(manifest)
+        except AgentError as e:
+            sec.stop("sender")
+            print(f"⚠️  No sender manifest ({e}); every covert window will count as FP.")
+    print("Stopping ping…")
+    sec.stop("ping")
+
+    # SIGTERM: the processor flushes its detection windows before it exits
     print("Stopping detector inside container…")
-    subprocess.run([
-        "docker","exec","python-processor",
-        "bash","-lc",
-        "pkill -f 'python3 /code/python-processor/main.py'"
-    ], check=False)
+    proc.stop("processor")
+    container_bin = f"{container_dir}/detection_windows.bin"
 
-    # figure out which timestamp folder the container just wrote into
-    result = subprocess.run([
-        "docker","exec","python-processor",
-        "bash","-lc",
-        "ls -t /code/python-processor/TPPhase3_results | head -n1"
-    ], stdout=subprocess.PIPE, text=True, check=True)
-    container_ts = result.stdout.strip()
-    container_csv = (
-        f"/code/python-processor/TPPhase3_results/"
-        f"{container_ts}/detection_metrics.csv"
-    )
-
-    host_csv = os.path.join(mode_dir, "detection_metrics.csv")
-    print("Copying detection metrics…")
+    host_bin = os.path.join(mode_dir, "detection_windows.bin")
+    print("Copying detection windows…")
     subprocess.run([
         "docker","cp",
-        f"python-processor:{container_csv}",
-        host_csv
+        f"python-processor:{container_bin}",
+        host_bin
     ], check=False)
 
-    if not os.path.isfile(host_csv):
-        print(f"No detection metrics at {host_csv}; skipping.")
+    if not os.path.isfile(host_bin):
+        print(f"No detection windows at {host_bin}; skipping.")
         continue
-    print(f"Metrics saved to {host_csv}")
-
-    # load it
-    with open(host_csv, newline="") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-    if not rows:
-        print("⚠️  Empty CSV; skipping plots.")
+
+    # label every window from the sender's manifest and score them all at once
+    summary, curves, episodes = evaluate([host_bin], manifests, slack=SLACK)
+    write_results(mode_dir, summary, curves, episodes)
+    if not summary["windows"]:
+        print("⚠️  No windows; skipping plots.")
         continue
+    print(f"{summary['windows']} windows: TP={summary['TP']} FP={summary['FP']} "
+          f"TN={summary['TN']} FN={summary['FN']} precision={summary['precision']:.3f} "
+          f"recall={summary['recall']:.3f} F1={summary['f1']:.3f} | "
+          f"detected {summary['episodes_detected']}/{summary['episodes']} episodes")
 
-    # extract and convert
-    window_ends = [float(r["window_end"]) for r in rows]
-    TP_ = [int(r["TP"])   for r in rows]
-    FP_ = [int(r["FP"])   for r in rows]
-    TN_ = [int(r["TN"])   for r in rows]
-    FN_ = [int(r["FN"])   for r in rows]
-    P_  = [float(r["Precision"]) for r in rows]
-    R_  = [float(r["Recall"])    for r in rows]
-    F1_ = [float(r["F1"])        for r in rows]
-
-    # turn timestamps into "seconds since start"
-    t0 = window_ends[0]
-    rel = [t - t0 for t in window_ends]
-
-    # subsample ~500 points max to thin the lines
-    step = max(1, len(rel)//500)
-    idxs = list(range(0, len(rel), step))
-    x    = [rel[i] for i in idxs]
-    th_TP = [TP_[i] for i in idxs]
-    th_FP = [FP_[i] for i in idxs]
-    th_TN = [TN_[i] for i in idxs]
-    th_FN = [FN_[i] for i in idxs]
-    th_P  = [P_[i]  for i in idxs]
-    th_R  = [R_[i]  for i in idxs]
-    th_F1 = [F1_[i] for i in idxs]
-
-    # 1) Counts
+    # 1) Confusion counts
     plt.figure()
-    plt.plot(x, th_TP, label="TP", lw=0.8, alpha=0.7)
-    plt.plot(x, th_FP, label="FP", lw=0.8, alpha=0.7)
-    plt.plot(x, th_TN, label="TN", lw=0.8, alpha=0.7)
-    plt.plot(x, th_FN, label="FN", lw=0.8, alpha=0.7)
-    plt.xlabel("Seconds since start")
-    plt.ylabel("Count")
+    names = ["TP", "FP", "TN", "FN"]
+    plt.bar(names, [summary[n] for n in names])
+    plt.yscale("log")
+    plt.ylabel("Windows")
     plt.title(f"Detection Counts (COVERT_ACTIVE={mode})")
-    plt.legend()
-    plt.grid(True)
+    plt.grid(True, axis="y")
     plt.savefig(os.path.join(mode_dir, "detection_counts.png"), dpi=150)
     plt.close()
 
-    # 2) Precision / Recall
+    # ROC and PR only exist with both labels present
+    if summary["TP"] + summary["FN"] == 0 or summary["FP"] + summary["TN"] == 0:
+        print(f"Results saved under {mode_dir} (one class only; no ROC/PR)")
+        continue
+
+    # 2) ROC over the marker-count threshold
     plt.figure()
-    plt.plot(x, th_P, label="Precision", lw=0.8, alpha=0.7)
-    plt.plot(x, th_R, label="Recall",    lw=0.8, alpha=0.7)
-    plt.xlabel("Seconds since start")
-    plt.ylabel("Rate")
-    plt.title(f"Precision & Recall (COVERT_ACTIVE={mode})")
-    plt.legend()
+    plt.plot([0, *curves["fpr"]], [0, *curves["tpr"]], marker=".", lw=0.8)
+    plt.plot([0, 1], [0, 1], linestyle="--", color="grey")
+    plt.xlabel("False positive rate")
+    plt.ylabel("True positive rate")
+    plt.title(f"ROC (AUC={summary['roc_auc']:.3f}, COVERT_ACTIVE={mode})")
     plt.grid(True)
-    plt.savefig(os.path.join(mode_dir, "precision_recall.png"), dpi=150)
+    plt.savefig(os.path.join(mode_dir, "roc.png"), dpi=150)
     plt.close()
 
-    # 3) F1 score
+    # 3) Precision / Recall
     plt.figure()
-    plt.plot(x, th_F1, label="F1 Score", lw=0.8, alpha=0.7)
-    plt.xlabel("Seconds since start")
-    plt.ylabel("F1 Score")
-    plt.title(f"F1 Score (COVERT_ACTIVE={mode})")
+    plt.plot(curves["tpr"], curves["precision"], marker=".", lw=0.8)
+    plt.xlabel("Recall")
+    plt.ylabel("Precision")
+    plt.title(f"Precision-Recall (AP={summary['average_precision']:.3f}, COVERT_ACTIVE={mode})")
     plt.grid(True)
-    plt.savefig(os.path.join(mode_dir, "f1_score.png"), dpi=150)
+    plt.savefig(os.path.join(mode_dir, "precision_recall.png"), dpi=150)
     plt.close()
 
-    print(f"Plots saved under {mode_dir}")
+    print(f"Results saved under {mode_dir}")
+
+print("\n=== Phase 3 Detection Testing Complete ===")
 
-print("\n=== Phase 3 Detection Testing Complete ===")
\ No newline at end of file
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Correctness test for detector.SlidingWindowDetector.
+
+Feeds random marker flags with random inter-arrival gaps through the
+detector and through a naive list-based window that keeps every packet,
+and checks after every packet that both agree on
+  * the decision (None until the first window is complete),
+  * the marker count,
+  * window_start,
+for count-based windows (the bytearray ring, several sizes including 1)
+and time-based windows (the marker deque). Also checks that a window
+of size 0 or a negative window_ms is rejected. No docker needed.
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+from detector import SlidingWindowDetector
+
+
+class NaiveCountWindow:
+    """The last `size` packets as a plain list of (time, flag)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.packets = []
+
+    def update(self, is_marker, now):
+        self.packets.append((now, is_marker))
+        window = self.packets[-self.size:]
+        self.marker_count = sum(1 for _, m in window if m)
+        self.window_start = window[0][0]
+        if len(self.packets) < self.size:
+            return None
+        return self.marker_count > 0
+
+
+class NaiveTimeWindow:
+    """Every packet kept; markers counted in (now - window_ms, now]."""
+
+    def __init__(self, window_ms):
+        self.span = window_ms / 1000.0
+        self.packets = []
+
+    def update(self, is_marker, now):
+        self.packets.append((now, is_marker))
+        horizon = now - self.span
+        self.marker_count = sum(1 for t, m in self.packets if m and t > horizon)
+        self.window_start = horizon
+        if now - self.packets[0][0] < self.span:
+            return None
+        return self.marker_count > 0
+
+
+def compare(detector, naive, count, marker_ratio, rng, label):
+    """Feed both; returns the number of packets on which they disagree."""
+    now = 1000.0
+    mismatches = 0
+    for i in range(count):
+        # bursts of equal timestamps as well as gaps around the window span
+        now += rng.choice((0.0, rng.expovariate(200.0), rng.uniform(0.0, 0.1)))
+        is_marker = rng.random() < marker_ratio
+        got = detector.update(is_marker, now)
+        want = naive.update(is_marker, now)
+        if (got != want or detector.marker_count != naive.marker_count
+                or (want is not None and detector.window_start != naive.window_start)):
+            if mismatches < 5:
+                print(f"  {label} packet {i}: decision {got} vs {want}, "
+                      f"markers {detector.marker_count} vs {naive.marker_count}, "
+                      f"start {detector.window_start} vs {naive.window_start}")
+            mismatches += 1
+    return mismatches
+
+
+def rejects(**kw):
+    try:
+        SlidingWindowDetector(**kw)
+    except ValueError:
+        return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sliding window detector vs. a naive window")
+    parser.add_argument("--count", type=int, default=5000, help="packets per case")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    ok = True
+    for size in (1, 2, 7, 20, 100):
+        for ratio in (0.01, 0.2):
+            bad = compare(SlidingWindowDetector(size=size), NaiveCountWindow(size),
+                          args.count, ratio, rng, f"size={size}")
+            print(f"count window size={size:>3} markers={ratio:.2f}: {bad} mismatches")
+            ok = ok and bad == 0
+    for window_ms in (1, 50, 250, 1000):
+        for ratio in (0.01, 0.2):
+            bad = compare(SlidingWindowDetector(window_ms=window_ms), NaiveTimeWindow(window_ms),
+                          args.count, ratio, rng, f"window_ms={window_ms}")
+            print(f"time window {window_ms:>4}ms markers={ratio:.2f}: {bad} mismatches")
+            ok = ok and bad == 0
+
+    for kw in ({"size": 0}, {"size": -1}, {"window_ms": -5}):
+        rejected = rejects(**kw)
+        print(f"SlidingWindowDetector({kw}) rejected: {rejected}")
+        ok = ok and rejected
+
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
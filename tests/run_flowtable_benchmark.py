@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Memory and cost benchmark for the processor's per-flow state table.
+
+For growing numbers of concurrent flows, fills a flows.FlowTable and
+reports the traced memory per flow and the cost of a touch() on a hit
+and on a miss. A final "flood" run pushes many more distinct flows
+than the capacity through the table (as a port scan or a spoofed-source
+flood would) and checks that the table, and its memory, stay bounded.
+No docker needed.
+"""
+import os
+import sys
+import csv
+import time
+import random
+import struct
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+from flows import FlowTable
+
+OUTPUT_DIR = "benchmark_results"
+FLOW_COUNTS = [10_000, 100_000, 250_000, 500_000]
+_KEY = struct.Struct("!4s4sBHH")
+
+
+def make_keys(n, seed):
+    rng = random.Random(seed)
+    dst = bytes((10, 0, 0, 21))
+    return [_KEY.pack(rng.getrandbits(32).to_bytes(4, "big"), dst, 6,
+                      rng.randint(1024, 65535), 443) for _ in range(n)]
+
+
+def fill(table, keys):
+    for i, k in enumerate(keys):
+        table.touch(k, 100, now=i)
+
+
+def traced_bytes(fn):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used, result
+
+
+def time_touch(table, keys, now):
+    start = time.perf_counter()
+    for k in keys:
+        table.touch(k, 100, now=now)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flow table benchmark")
+    parser.add_argument("--flood-capacity", type=int, default=100_000)
+    parser.add_argument("--flood-factor", type=int, default=10,
+                        help="distinct flows pushed through the flood table, x capacity")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'flows':>8} {'bytes/flow':>11} {'total MB':>9} {'miss ns':>8} {'hit ns':>7}")
+    for n in FLOW_COUNTS:
+        keys = make_keys(n, args.seed)
+        # keys exist before the table does: only the table's own cost is traced
+        # (the packed key itself is counted below, per flow)
+        table = FlowTable(capacity=n)
+        used, _ = traced_bytes(lambda: fill(table, keys))
+        per_flow = used / n + sys.getsizeof(keys[0])
+        miss_ns = time_touch(FlowTable(capacity=n), keys, 0)
+        hit_ns = time_touch(table, keys, n)
+        results.append((n, round(per_flow, 1), round(per_flow * n / 1e6, 1),
+                        round(miss_ns, 1), round(hit_ns, 1)))
+        print(f"{n:>8} {per_flow:>11.1f} {per_flow * n / 1e6:>9.1f} {miss_ns:>8.1f} {hit_ns:>7.1f}")
+        del table, keys
+
+    cap = args.flood_capacity
+    total = cap * args.flood_factor
+    table = FlowTable(capacity=cap)
+    rng = random.Random(args.seed)
+    dst = bytes((10, 0, 0, 21))
+
+    def flood():
+        for i in range(total):
+            table.touch(_KEY.pack(rng.getrandbits(32).to_bytes(4, "big"), dst, 6,
+                                  rng.randint(1024, 65535), 80), 60, now=i)
+
+    used, _ = traced_bytes(flood)
+    print(f"\nflood: {total} distinct flows through capacity {cap}: "
+          f"{len(table)} resident, {table.evicted_lru} evicted, {used / 1e6:.1f} MB held")
+    if len(table) > cap:
+        print("flow table grew beyond its capacity")
+        sys.exit(1)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_path = os.path.join(OUTPUT_DIR, "flowtable_benchmark.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["flows", "bytes_per_flow", "total_mb", "miss_ns", "hit_ns"])
+        writer.writerows(results)
+    print(f"Results saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+TCP goodput through the middlebox for both delay modes.
+
+For every DELAY_MODE (independent, ordered) and MEAN_DELAY_MS, restarts
+the python-processor with that configuration, runs an iperf TCP transfer
+from sec to insec and records the goodput together with the TCP segments
+the sender had to retransmit (from /proc/net/snmp in the sec container).
+Independent per-packet delays reorder the frames of a flow, which TCP
+answers with dup-ACKs and retransmits; ordered mode keeps the same
+per-packet jitter without reordering.
+
+Needs the docker stack (`docker compose up -d`).
+"""
+import os
+import csv
+import math
+import time
+import statistics
+import subprocess
+import matplotlib.pyplot as plt
+from datetime import datetime
+
+# --- CONFIG ---
+RESULTS_ROOT = "goodput_results"
+MODES        = ["independent", "ordered"]
+MEAN_DELAYS  = [5, 20, 50, 200]       # ms
+NUM_TRIALS   = 3
+DURATION     = 10                     # seconds per iperf run
+INSEC_IP     = "10.0.0.21"
+SLEEP_START  = 3                      # processor / iperf server start-up
+# ---------------------------------------
+
+
+def restart_processor(mode, mean_delay_ms):
+    subprocess.run(["docker", "restart", "-t", "2", "python-processor"], check=True)
+    subprocess.run([
+        "docker", "exec", "python-processor", "bash", "-lc",
+        "pkill -f '/code/python-processor/main.py' || true"
+    ], check=False)
+    subprocess.run([
+        "docker", "exec", "-d", "python-processor", "bash", "-lc",
+        f"export DELAY_MODE={mode} MEAN_DELAY_MS={mean_delay_ms} && "
+        "python3 /code/python-processor/main.py"
+    ], check=True)
+
+
+def retrans_segs():
+    """TCP segments retransmitted so far by the sec container."""
+    out = subprocess.run(["docker", "exec", "sec", "cat", "/proc/net/snmp"],
+                         capture_output=True, text=True, check=True).stdout
+    names, values = [l.split()[1:] for l in out.splitlines() if l.startswith("Tcp:")][:2]
+    return int(values[names.index("RetransSegs")])
+
+
+def run_iperf():
+    """Goodput in Mbit/s of one iperf TCP transfer from sec to insec."""
+    out = subprocess.run(
+        ["docker", "exec", "sec", "iperf", "-c", INSEC_IP, "-t", str(DURATION), "-y", "C"],
+        capture_output=True, text=True, timeout=DURATION + 60).stdout
+    # iperf -y C: ...,interval,transferred_bytes,bits_per_second
+    lines = [l for l in out.splitlines() if l.count(",") >= 8]
+    return int(lines[-1].split(",")[8]) / 1e6 if lines else 0.0
+
+
+def run_mode(mode, run_dir):
+    results = []
+    for mean_delay in MEAN_DELAYS:
+        goodputs, retrans = [], []
+        for t in range(1, NUM_TRIALS + 1):
+            print(f"  Trial {t}/{NUM_TRIALS}, MEAN_DELAY_MS={mean_delay}, DELAY_MODE={mode}")
+            restart_processor(mode, mean_delay)
+            time.sleep(SLEEP_START)
+
+            before = retrans_segs()
+            mbps = run_iperf()
+            after = retrans_segs()
+            goodputs.append(mbps)
+            retrans.append(after - before)
+            print(f"    => {mbps:.2f} Mbit/s, {after - before} retransmitted segments")
+
+        avg = statistics.mean(goodputs)
+        stdev = statistics.stdev(goodputs) if NUM_TRIALS > 1 else 0.0
+        margin = 1.96 * stdev / math.sqrt(NUM_TRIALS)
+        results.append((mean_delay, avg, avg - margin, avg + margin, statistics.mean(retrans)))
+
+    csv_path = os.path.join(run_dir, f"goodput_{mode}.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Mean Delay (ms)", "Avg Goodput (Mbps)", "Lower CI", "Upper CI",
+                         "Avg Retransmitted Segments"])
+        writer.writerows(results)
+    print(f"  → CSV written to {csv_path}")
+    return results
+
+
+def plot(all_results, run_dir):
+    plt.figure()
+    for mode, results in all_results.items():
+        delays, avgs, lows, highs, _ = zip(*results)
+        err = [[a - l for a, l in zip(avgs, lows)], [h - a for a, h in zip(avgs, highs)]]
+        plt.errorbar(delays, avgs, yerr=err, fmt='o-', capsize=5, label=mode)
+    plt.xlabel("MEAN_DELAY_MS")
+    plt.ylabel("TCP goodput (Mbit/s)")
+    plt.title("TCP goodput sec → insec by DELAY_MODE")
+    plt.legend()
+    plt.grid(True)
+    plot_path = os.path.join(run_dir, "goodput_by_delay_mode.png")
+    plt.savefig(plot_path)
+    plt.close()
+    print(f"  → Plot saved to {plot_path}")
+
+
+def main():
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(RESULTS_ROOT, ts)
+    os.makedirs(run_dir, exist_ok=True)
+
+    # TCP iperf server on insec for all runs
+    subprocess.run(["docker", "exec", "insec", "bash", "-lc", "pkill -x iperf || true"], check=False)
+    subprocess.run(["docker", "exec", "-d", "insec", "iperf", "-s"], check=True)
+    time.sleep(1)
+
+    all_results = {}
+    try:
+        for mode in MODES:
+            print(f"\n=== DELAY_MODE={mode} ===")
+            all_results[mode] = run_mode(mode, run_dir)
+    finally:
+        subprocess.run(["docker", "exec", "insec", "bash", "-lc", "pkill -x iperf || true"],
+                       check=False)
+    plot(all_results, run_dir)
+
+    print(f"\n{'mean ms':>8} " + " ".join(f"{m + ' Mbps':>17}" for m in MODES))
+    for i, mean_delay in enumerate(MEAN_DELAYS):
+        print(f"{mean_delay:>8} " + " ".join(f"{all_results[m][i][1]:>17.2f}" for m in MODES))
+    print("\n=== Goodput Benchmark Complete ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Load generator for the python-processor: where does main.py saturate?
+
+For each offered rate (a fixed --rate, or a --ramp START STOP STEP in
+pps), pre-builds rate × --duration synthetic Ethernet frames
+(synth.TrafficMix: --flows, --sizes, --covert-ratio), publishes them to
+inpktsec, or inpktinsec for the --insec-ratio share of replies, at that
+rate and records what comes back on
+outpktsec/outpktinsec in a separate subscriber process. Every payload
+ends with a sequence number, so each forwarded frame is matched to its
+send time. Per step:
+
+  sent_pps       rate the publisher actually achieved
+  delivered_pps  matched frames per second, first send to last arrival
+  loss_pct       frames that never came back
+  latency        publish → forwarded, p50/p90/p99/max; this includes the
+                 processor's random delay (--mean-delay-ms 0 turns it
+                 off on the running processor, see control.py; the
+                 previous delay config is restored at the end)
+
+The next step starts once nothing has arrived for --drain seconds. The
+ramp stops after a step that loses more than half its frames. The curve
+is written to benchmark_results/load_curve.csv and load_curve.png; the
+saturation point reported is the highest offered rate delivered in full
+(loss at most --max-loss, delivered within 5% of sent).
+
+Needs a processor running against the NATS server, e.g. main.py next
+to a local `nats-server`. Against the compose stack (localhost:4222) the
+switch is subscribed as well and writes every forwarded frame out on
+the sec/insec LANs, so the hosts there see the synthetic traffic and
+the switch competes for the same server; prefer a standalone processor
+for numbers.
+Mitigation rules that zero ICMP payloads erase the sequence number of
+covert frames, which then count as lost.
+"""
+import os
+import sys
+import csv
+import time
+import asyncio
+import argparse
+import multiprocessing as mp
+from array import array
+
+import numpy as np
+import matplotlib.pyplot as plt
+from nats.aio.client import Client as NATS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code", "python-processor"))
+import synth
+
+OUTPUT_DIR = "benchmark_results"
+OUT_SUBJECTS = ("outpktsec", "outpktinsec")
+PROBE_SEQ = (1 << 63) - 1
+# non-IP frame: forwarded by the processor without parsing or detection
+PROBE = bytes(12) + b"\x88\xb5" + PROBE_SEQ.to_bytes(8, "big")
+
+
+def receiver(nats_url, ready, received, conn):
+    """Subscriber process: (sequence number, arrival time) of every forwarded frame."""
+    seqs, times = array("q"), array("d")
+
+    async def run():
+        nc = NATS()
+        await nc.connect(nats_url)
+
+        async def on_out(msg):
+            seqs.append(int.from_bytes(msg.data[-8:], "big") & PROBE_SEQ)
+            times.append(time.monotonic())
+            received.value += 1
+
+        for subject in OUT_SUBJECTS:
+            await nc.subscribe(subject, cb=on_out, pending_msgs_limit=1 << 20,
+                               pending_bytes_limit=1 << 30)
+        await nc.flush()
+        ready.set()
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await nc.close()
+
+    asyncio.run(run())
+    conn.send((np.frombuffer(seqs, dtype=np.int64), np.frombuffer(times)))
+
+
+async def publish_step(nc, frames, rate):
+    """Publish `frames` at `rate` pps; returns their send times (time.monotonic)."""
+    n = len(frames)
+    t_send = np.empty(n)
+    clock = time.monotonic
+    publish = nc.publish
+    start = clock()
+    i = 0
+    while i < n:
+        due = min(n, int((clock() - start) * rate) + 1)
+        while i < due:
+            subject, frame = frames[i]
+            t_send[i] = clock()
+            await publish(subject, frame)
+            i += 1
+        # hands the batch to the socket and waits for the next frame's slot
+        await asyncio.sleep(max(0.0, start + i / rate - clock()))
+    await nc.flush()
+    return t_send
+
+
+async def wait_idle(received, idle, limit):
+    """Return once no frame has arrived for `idle` seconds (at most `limit`)."""
+    deadline = time.monotonic() + limit
+    last = -1
+    while received.value != last and time.monotonic() < deadline:
+        last = received.value
+        await asyncio.sleep(idle)
+
+
+def step_stats(rate, base, t_send, seqs, times):
+    n = len(t_send)
+    sel = (seqs >= base) & (seqs < base + n)
+    idx, first = np.unique(seqs[sel] - base, return_index=True)
+    arrival = times[sel][first]
+    latency = (arrival - t_send[idx]) * 1000.0
+    sent_s = t_send[-1] - t_send[0] if n > 1 else 0.0
+    span = arrival.max() - t_send[0] if len(arrival) else 0.0
+    p50, p90, p99, pmax = (np.percentile(latency, [50, 90, 99, 100]) if len(latency)
+                           else [np.nan] * 4)
+    return {
+        "offered_pps": rate,
+        "sent": n,
+        "sent_pps": round((n - 1) / sent_s, 1) if sent_s > 0 else 0.0,
+        "delivered": len(idx),
+        "delivered_pps": round(len(idx) / span, 1) if span > 0 else 0.0,
+        "loss_pct": round(100.0 * (1 - len(idx) / n), 3),
+        "latency_p50_ms": round(float(p50), 3),
+        "latency_p90_ms": round(float(p90), 3),
+        "latency_p99_ms": round(float(p99), 3),
+        "latency_max_ms": round(float(pmax), 3),
+    }
+
+
+async def set_delay(args):
+    """Apply --mean-delay-ms; returns the delay config it replaced."""
+    from control import send
+    current = await send({}, args.nats, expect=args.workers)
+    if len(current) < args.workers:
+        raise RuntimeError(f"only {len(current)} of {args.workers} processors answered")
+    previous = current[0]["config"]["delay"]
+    acks = await send({"delay": {"mean_ms": args.mean_delay_ms}}, args.nats,
+                      expect=args.workers)
+    if len(acks) < args.workers or not all(a["ok"] for a in acks):
+        await restore_delay(args, previous)
+        raise RuntimeError(f"processor did not accept the delay change: {acks}")
+    print(f"MEAN_DELAY_MS={args.mean_delay_ms} (config version {acks[0]['version']}, "
+          f"was {previous['mean_ms']})")
+    return previous
+
+
+async def restore_delay(args, previous):
+    from control import send
+    acks = await send({"delay": previous}, args.nats, expect=args.workers)
+    if len(acks) < args.workers or not all(a["ok"] for a in acks):
+        print(f"could not restore the delay config {previous}: {acks}")
+    else:
+        print(f"delay config restored to {previous}")
+
+
+async def sweep(args, rates, received):
+    previous = await set_delay(args) if args.mean_delay_ms is not None else None
+    try:
+        return await ramp(args, rates, received)
+    finally:
+        if previous is not None:
+            await restore_delay(args, previous)
+
+
+async def ramp(args, rates, received):
+    nc = NATS()
+    await nc.connect(args.nats, pending_size=64 * 1024 * 1024)
+
+    # wait until the processor forwards
+    deadline = time.monotonic() + 30
+    while received.value == 0:
+        if time.monotonic() > deadline:
+            raise RuntimeError("no frame came back within 30s; is the processor running?")
+        await nc.publish("inpktsec", PROBE)
+        await asyncio.sleep(0.5)
+    await wait_idle(received, args.drain, args.max_drain)
+
+    mix = synth.TrafficMix(flows=args.flows, sizes=tuple(args.sizes),
+                           covert_ratio=args.covert_ratio, seed=args.seed, tag=True,
+                           insec_ratio=args.insec_ratio)
+    steps = []  # (rate, first sequence number, send times)
+    for rate in rates:
+        base = mix.count
+        frames = [next(mix)[:2] for _ in range(int(rate * args.duration))]
+        before = received.value
+        print(f"▶️  {rate:,.0f} pps for {args.duration:g}s ({len(frames)} frames)…", flush=True)
+        t_send = await publish_step(nc, frames, rate)
+        await wait_idle(received, args.drain, args.max_drain)
+        steps.append((rate, base, t_send))
+        back = received.value - before
+        print(f"   {back}/{len(frames)} back", flush=True)
+        if back < len(frames) / 2:
+            print("   more than half lost; stopping the ramp")
+            break
+    await nc.close()
+    return steps
+
+
+def plot(rows, path):
+    delivered = [r["delivered_pps"] for r in rows]
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    for key, label in (("latency_p50_ms", "p50"), ("latency_p99_ms", "p99")):
+        ax1.plot(delivered, [r[key] for r in rows], marker="o", label=label)
+    ax1.set_xlabel("Delivered (pps)")
+    ax1.set_ylabel("Latency (ms)")
+    ax1.set_title("Latency vs throughput")
+    ax1.legend()
+    ax1.grid(True)
+    offered = [r["offered_pps"] for r in rows]
+    ax2.plot(offered, delivered, marker="o", label="delivered")
+    ax2.plot(offered, offered, linestyle="--", color="grey", label="offered")
+    ax2.set_xlabel("Offered (pps)")
+    ax2.set_ylabel("Delivered (pps)")
+    ax2.set_title("Delivered vs offered rate")
+    ax2.legend()
+    ax2.grid(True)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="python-processor load generator")
+    parser.add_argument("--nats", default="nats://localhost:4222")
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--rate", type=float, help="one fixed rate (pps)")
+    rate.add_argument("--ramp", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                      default=[1000, 30000, 1000], help="ramp of rates (pps)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per rate")
+    parser.add_argument("--drain", type=float, default=1.0,
+                        help="idle seconds that end a step (must exceed the processor's delay)")
+    parser.add_argument("--max-drain", type=float, default=30.0)
+    parser.add_argument("--flows", type=int, default=100)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, 1400],
+                        help="payload sizes (bytes)")
+    parser.add_argument("--covert-ratio", type=float, default=0.0)
+    parser.add_argument("--insec-ratio", type=float, default=0.5,
+                        help="share of benign frames sent as replies on inpktinsec")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mean-delay-ms", type=float,
+                        help="set the running processor's mean delay first (0: no delay)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processor workers that must acknowledge --mean-delay-ms")
+    parser.add_argument("--max-loss", type=float, default=0.1, help="percent, for the saturation point")
+    args = parser.parse_args()
+
+    if args.rate:
+        rates = [args.rate]
+    else:
+        start, stop, step = args.ramp
+        rates = list(np.arange(start, stop + step / 2, step))
+
+    ctx = mp.get_context("spawn")
+    ready, received = ctx.Event(), ctx.Value("q", 0, lock=False)
+    parent, child = ctx.Pipe()
+    sub = ctx.Process(target=receiver, args=(args.nats, ready, received, child), daemon=True)
+    sub.start()
+    if not ready.wait(30):
+        sys.exit("subscriber could not connect to NATS")
+    try:
+        steps = asyncio.run(sweep(args, rates, received))
+    finally:
+        parent.send("stop")
+        seqs, times = parent.recv()
+        sub.join(10)
+
+    rows = [step_stats(rate, base, t_send, seqs, times) for rate, base, t_send in steps]
+    print(f"\n{'offered':>9} {'sent':>9} {'delivered':>10} {'loss %':>7} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in rows:
+        print(f"{r['offered_pps']:>9,.0f} {r['sent_pps']:>9,.0f} {r['delivered_pps']:>10,.0f} "
+              f"{r['loss_pct']:>7.2f} {r['latency_p50_ms']:>8.2f} {r['latency_p90_ms']:>8.2f} "
+              f"{r['latency_p99_ms']:>8.2f} {r['latency_max_ms']:>8.2f}")
+    full = [r for r in rows if r["loss_pct"] <= args.max_loss
+            and r["delivered_pps"] >= 0.95 * r["sent_pps"]]
+    if full:
+        best = max(full, key=lambda r: r["offered_pps"])
+        print(f"\nSaturation: {best['offered_pps']:,.0f} pps delivered in full "
+              f"(p99 {best['latency_p99_ms']:.2f} ms)"
+              + ("; the ramp never exceeded it" if best is rows[-1] else ""))
+    else:
+        print("\nSaturation: below the lowest offered rate")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_path = os.path.join(OUTPUT_DIR, "load_curve.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["offered_pps"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results saved to {csv_path}")
+    if rows:
+        plot_path = os.path.join(OUTPUT_DIR, "load_curve.png")
+        plot(rows, plot_path)
+        print(f"Plot saved to {plot_path}")
+
+
+if __name__ == "__main__":
+    main()
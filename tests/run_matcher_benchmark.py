@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Scan-cost benchmark for the detector's multi-pattern marker matcher.
+
+For growing marker-set sizes and each --sizes payload length, scans the
+same payload corpus (one payload in ten carries a marker) with
+  * substring : one C `in` search per marker (MarkerMatcher's path up
+                to matcher.SUBSTRING_MAX markers)
+  * trie re   : one re.search() of the trie-shaped regex, then the
+                Aho-Corasick DFA walk for payloads it matches (the path
+                above SUBSTRING_MAX)
+  * dfa walk  : the DFA walk over every payload, for reference
+  * scan      : MarkerMatcher.scan() with the default threshold
+and reports the cost per payload byte. `scan` should follow the cheaper
+of the first two columns, and the trie regex should stay nearly flat as
+the pattern count grows. All paths must report the same markers for
+every payload (exits non-zero otherwise). No docker needed.
+"""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+from matcher import MarkerMatcher, SUBSTRING_MAX
+
+OUTPUT_DIR = "benchmark_results"
+PATTERN_COUNTS = [1, 2, 4, 8, 16, 50, 100, 250, 500]
+
+
+def random_word(rng, lo=6, hi=16):
+    return bytes(rng.choice(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:")
+                 for _ in range(rng.randint(lo, hi)))
+
+
+def build_payloads(rng, markers, count, size):
+    payloads = []
+    for i in range(count):
+        body = bytearray(rng.getrandbits(8) for _ in range(size))
+        if i % 10 == 0:  # every tenth payload carries a marker
+            m = rng.choice(markers)
+            pos = rng.randint(0, size - len(m))
+            body[pos:pos + len(m)] = m
+        payloads.append(memoryview(bytes(body)))
+    return payloads
+
+
+def time_scan(fn, payloads, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for p in payloads:
+            fn(p)
+    elapsed = time.perf_counter() - start
+    nbytes = rounds * sum(len(p) for p in payloads)
+    return elapsed / nbytes * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Marker matcher benchmark")
+    parser.add_argument("--payloads", type=int, default=500)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[128, 1400],
+                        help="Payload bytes")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    all_markers = [b"CovertChannel"] + [random_word(rng) for _ in range(max(PATTERN_COUNTS))]
+    results = []
+    print(f"SUBSTRING_MAX={SUBSTRING_MAX}")
+    print(f"{'size':>5} {'patterns':>8} {'substring':>10} {'trie re':>8} {'dfa walk':>9} "
+          f"{'scan':>7}  (ns/B)")
+    for size in args.sizes:
+        for n in PATTERN_COUNTS:
+            markers = all_markers[:n]
+            payloads = build_payloads(rng, markers, args.payloads, size)
+            substring = MarkerMatcher(markers, substring_max=n)
+            trie = MarkerMatcher(markers, substring_max=0)
+            default = MarkerMatcher(markers)
+            expected = [[i for i, m in enumerate(markers) if m in bytes(p)] for p in payloads]
+            for name, m in (("substring", substring), ("trie re", trie), ("scan", default)):
+                if [m.scan(p) for p in payloads] != expected:
+                    print(f"{name} disagrees with a plain substring search for {n} patterns")
+                    sys.exit(1)
+
+            sub_ns = time_scan(substring.scan, payloads, args.rounds)
+            trie_ns = time_scan(trie.scan, payloads, args.rounds)
+            walk_ns = time_scan(trie.walk, payloads, args.rounds)
+            scan_ns = time_scan(default.scan, payloads, args.rounds)
+            results.append((size, n, round(sub_ns, 2), round(trie_ns, 2),
+                            round(walk_ns, 2), round(scan_ns, 2)))
+            print(f"{size:>5} {n:>8} {sub_ns:>10.2f} {trie_ns:>8.2f} {walk_ns:>9.2f} "
+                  f"{scan_ns:>7.2f}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_path = os.path.join(OUTPUT_DIR, "matcher_benchmark.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["payload_bytes", "patterns", "substring_ns_per_byte",
+                         "trie_re_ns_per_byte", "dfa_walk_ns_per_byte", "scan_ns_per_byte"])
+        writer.writerows(results)
+    print(f"Results saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
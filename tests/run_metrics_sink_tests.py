@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Round-trip test for the processor's MetricsSink (metrics_sink.py).
+
+For both formats ("csv" and the columnar "bin"), writes rows in several
+batches, reopens the file to append more, and reads everything back
+(csv module / read_columnar), checking that
+  * every row comes back, in order, with its values,
+  * appending to a file written with another schema raises ValueError,
+  * a writer-thread failure (the file turned into a directory) is
+    raised by close() instead of being lost.
+No docker needed.
+"""
+import os
+import sys
+import csv
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+from metrics_sink import MetricsSink, read_columnar
+from pipeline import DETECTION_SCHEMA
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(n):
+        TP, FP, TN, FN = (rng.randint(0, 10 ** 6) for _ in range(4))
+        rows.append((1.7e9 + i * 0.01, TP, FP, TN, FN,
+                     round(rng.random(), 3), round(rng.random(), 3), round(rng.random(), 3)))
+    return rows
+
+
+def write(path, fmt, rows, batch_rows):
+    sink = MetricsSink(path, DETECTION_SCHEMA, fmt=fmt, batch_rows=batch_rows)
+    for row in rows:
+        sink.write(row)
+    sink.close()
+    return sink.rows_written
+
+
+def read_back(path, fmt):
+    names = [name for name, _ in DETECTION_SCHEMA]
+    if fmt == "bin":
+        cols = read_columnar(path)
+        return list(zip(*(cols[name] for name in names))), names
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        types = [float if code == "d" else int for _, code in DETECTION_SCHEMA]
+        return [tuple(t(v) for t, v in zip(types, line)) for line in reader], header
+
+
+def round_trip(tmp, fmt, count, rng):
+    path = os.path.join(tmp, f"detection_metrics.{fmt}")
+    first, second = make_rows(count, rng), make_rows(count // 3, rng)
+    written = write(path, fmt, first, batch_rows=97)
+    written += write(path, fmt, second, batch_rows=1000)  # appends, no second header
+    rows, header = read_back(path, fmt)
+    ok = rows == first + second and written == len(rows)
+    ok = ok and header == [name for name, _ in DETECTION_SCHEMA]
+    print(f"{fmt}: wrote {written} rows in two sessions, read back {len(rows)}: "
+          f"{'match' if ok else 'MISMATCH'}")
+    return ok
+
+
+def schema_mismatch(tmp, fmt):
+    path = os.path.join(tmp, f"detection_metrics.{fmt}")
+    try:
+        MetricsSink(path, [("t", "d"), ("other", "q")], fmt=fmt)
+    except ValueError as e:
+        print(f"{fmt}: appending with another schema rejected ({e})")
+        return True
+    print(f"{fmt}: appending with another schema was NOT rejected")
+    return False
+
+
+def writer_failure(tmp, fmt):
+    path = os.path.join(tmp, f"broken.{fmt}")
+    sink = MetricsSink(path, DETECTION_SCHEMA, fmt=fmt, batch_rows=10)
+    os.remove(path)
+    os.mkdir(path)  # the writer thread's open(path, "ab") now fails
+    for row in make_rows(5, random.Random(0)):
+        sink.write(row)
+    try:
+        sink.close()
+    except RuntimeError as e:
+        print(f"{fmt}: writer failure raised by close(): {e} ({e.__cause__!r})")
+        return True
+    print(f"{fmt}: writer failure was swallowed")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MetricsSink round-trip test")
+    parser.add_argument("--count", type=int, default=10000, help="rows in the first session")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    tmp = tempfile.mkdtemp(prefix="metrics-sink-")
+    try:
+        ok = True
+        for fmt in ("csv", "bin"):
+            ok = round_trip(tmp, fmt, args.count, rng) and ok
+            ok = schema_mismatch(tmp, fmt) and ok
+            ok = writer_failure(tmp, fmt) and ok
+    finally:
+        shutil.rmtree(tmp)
+
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,105 @@
 #!/usr/bin/env python3
 import os
-import subprocess
-import time
+import sys
 import csv
+import json
 import math
 import statistics
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agent_client import AgentClient, AgentError
+from covert_score import score_files, write_scores
+
 # --- CONFIG ---
 PHASE4_ROOT = "TPPhase4_results"
 INTERVALS   = [0.5, 1.0, 1.5, 2.0]     # seconds
 NUM_TRIALS  = 5
 MESSAGE     = "Secret: Operation Mincemeat"
-BITS        = len(MESSAGE) * 8        # total bits
-SLEEP_HEAD  = 2                       # head start for receiver
-SLEEP_BETWEEN_TRIALS = 5              # seconds
+RECV_TIMEOUT = 10                     # receiver gives up this long after the sender
+MANIFEST    = "/tmp/covert_manifest.csv"   # per-packet records inside the containers
+RECEIVED    = "/tmp/covert_received.csv"
+CONTROL     = "/code/python-processor/control.py"  # live reconfiguration client
 # ---------------------------------------
 
-def run_capacity_test(mitigate_mode, run_dir):
+def start_processor(proc):
+    """(Re)start main.py under the processor agent; returns once it is subscribed."""
+    # the copy configure-processor.sh starts at boot would see every frame too
+    proc.exec(["pkill", "-f", "/code/python-processor/main.py"])
+    reply = proc.start("processor", ["python3", "/code/python-processor/main.py"],
+                       env={"MITIGATE_ACTIVE": "0"}, ready="running →")
+    print(f"  processor ready in {reply['ready_s']:.2f}s")
+
+def set_mitigation(proc, mitigate_mode):
+    """Switch mitigation on the running processor; returns the new config version."""
+    reply = proc.exec(["python3", CONTROL, "--mitigate", str(mitigate_mode)])
+    if reply["rc"] != 0:
+        raise AgentError({"error": reply["output"].strip()})
+    ack = json.loads(reply["output"].splitlines()[-1])
+    print(f"  MITIGATE_ACTIVE={mitigate_mode} (config version {ack['version']})")
+    return ack["version"]
+
+def run_capacity_test(mitigate_mode, run_dir, sec, insec, proc):
     """
-    Runs NUM_TRIALS for each INTERVAL, toggling MITIGATE_ACTIVE inside
-    the python-processor container, and collects capacity bps.
+    Runs NUM_TRIALS for each INTERVAL with mitigation switched to
+    `mitigate_mode` on the running processor, and collects capacity as the goodput the
+    receiver decoded (scored from the send manifests and receive logs).
     """
     results = []
+    trials = []  # (interval, name)
+    set_mitigation(proc, mitigate_mode)
 
     for interval in INTERVALS:
-        capacities = []
         for t in range(1, NUM_TRIALS+1):
             print(f"  Trial {t}/{NUM_TRIALS}, interval {interval}s, MITIGATE={mitigate_mode}")
+            sec.exec(["rm", "-f", MANIFEST])
+            insec.exec(["rm", "-f", RECEIVED])
 
-            # 1) Restart & launch processor with mitigation toggle
-            subprocess.run(["docker", "restart", "-t", "2", "python-processor"], check=True)
-            # kill any old processor
-            subprocess.run([
-                "docker","exec","python-processor",
-                "bash","-lc",
-                "pkill -f '/code/python-processor/main.py' || true"
-            ], check=False)
-            # start it fresh
-            subprocess.run([
-                "docker","exec","-d","python-processor","bash","-lc",
-                f"export MITIGATE_ACTIVE={mitigate_mode} && python3 /code/python-processor/main.py"
-            ], check=True)
-
-            # 2) Launch receiver
-            recv_cmd = [
-                "docker", "exec", "-d", "insec",
+            # 1) Launch receiver; start() returns once its capture is open
+            insec.start("receiver", [
                 "python3", "/code/insec/covert_receiver.py",
                 "--iface", "eth0",
-                "--count", str(len(MESSAGE))
-            ]
-            recv_proc = subprocess.Popen(recv_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            time.sleep(SLEEP_HEAD)
-
-            # 3) Run sender & measure elapsed
-            start = time.time()
-            send_cmd = [
-                "docker", "exec", "sec",
-                "python3", "/code/sec/covert_sender.py",
-                "--dest", "10.0.0.21",
-                "--message", MESSAGE,
-                "--interval", str(interval)
-            ]
-            subprocess.run(send_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            elapsed = time.time() - start
-
-            # 4) Stop receiver
-            try:
-                recv_stdout, recv_stderr = recv_proc.communicate(timeout=10)
-            except subprocess.TimeoutExpired:
-                recv_proc.kill()
-    
+                "--count", str(len(MESSAGE)),
+                "--timeout", str(len(MESSAGE) * interval + RECV_TIMEOUT),
+                "--log", RECEIVED
+            ], ready="Capture ready")
 
-            # 5) Compute capacity
-            cap = BITS/elapsed if elapsed > 0 else 0.0
-            capacities.append(cap)
-            print(f"    => elapsed {elapsed:.2f}s, capacity {cap:.2f}bps")
+            # 2) Run sender in the sec agent; elapsed covers the sending only
+            reply = sec.call("/code/sec/covert_sender.py", "send_covert_data",
+                             destination="10.0.0.21", message=MESSAGE, interval=interval,
+                             manifest=MANIFEST)
+            elapsed = reply["elapsed_s"]
 
-            time.sleep(SLEEP_BETWEEN_TRIALS)
+            # 3) Wait for the receiver
+            try:
+                insec.wait("receiver", timeout=RECV_TIMEOUT + 5)
+            except AgentError:
+                insec.stop("receiver")
+
+            # 4) Keep the packet records
+            name = f"interval_{interval}_trial_{t}"
+            try:
+                sec.fetch(MANIFEST, os.path.join(run_dir, f"manifest_{name}.csv"))
+                insec.fetch(RECEIVED, os.path.join(run_dir, f"received_{name}.csv"))
+                trials.append((interval, name))
+            except AgentError as e:
+                print(f"    => no packet records ({e}); trial left out")
+            print(f"    => sent in {elapsed:.2f}s")
 
-        # summarize
+    # score all trials at once and summarize per interval
+    scores = score_files([(os.path.join(run_dir, f"manifest_{name}.csv"),
+                           os.path.join(run_dir, f"received_{name}.csv")) for _i, name in trials])
+    write_scores(os.path.join(run_dir, "trial_scores.csv"), [name for _i, name in trials], scores)
+    for interval in INTERVALS:
+        capacities = [float(scores["goodput_bps"][k]) for k, (i, _n) in enumerate(trials) if i == interval]
+        if not capacities:
+            continue
         avg   = statistics.mean(capacities)
-        stdev = statistics.stdev(capacities) if NUM_TRIALS>1 else 0.0
-        margin = 1.96*stdev/math.sqrt(NUM_TRIALS)
+        stdev = statistics.stdev(capacities) if len(capacities)>1 else 0.0
+        margin = 1.96*stdev/math.sqrt(len(capacities))
         results.append((interval, avg, avg-margin, avg+margin))
+        print(f"  interval {interval}s: goodput {avg:.2f}bps over {len(capacities)} trials")
 
     # save CSV
     csv_path = os.path.join(run_dir, "mitigation_capacity.csv")
@@ -113,11 +128,17 @@ def run_capacity_test(mitigate_mode, run_dir):
 def main():
     os.makedirs(PHASE4_ROOT, exist_ok=True)
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    for mode in (0,1):
-        print(f"\n=== Running Phase 4: MITIGATE_ACTIVE={mode} ===")
-        run_dir = os.path.join(PHASE4_ROOT, f"{ts}-MITIGATE_{mode}")
-        os.makedirs(run_dir, exist_ok=True)
-        run_capacity_test(mode, run_dir)
+    sec, insec, proc = AgentClient("sec"), AgentClient("insec"), AgentClient("python-processor")
+    # one warm processor for both modes; mitigation is switched live
+    start_processor(proc)
+    try:
+        for mode in (0,1):
+            print(f"\n=== Running Phase 4: MITIGATE_ACTIVE={mode} ===")
+            run_dir = os.path.join(PHASE4_ROOT, f"{ts}-MITIGATE_{mode}")
+            os.makedirs(run_dir, exist_ok=True)
+            run_capacity_test(mode, run_dir, sec, insec, proc)
+    finally:
+        proc.stop("processor")
     print("\n=== Phase 4 Mitigation Benchmark Complete ===")
 
 if __name__ == "__main__":
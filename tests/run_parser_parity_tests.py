@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Differential test of the processor's two header parsers.
+
+Every frame of a mixed corpus (IPv4/IPv6, TCP with options, UDP, ICMP,
+ICMPv6, GRE, ESP, IPv6 extension headers, first and later fragments of
+both IP versions, 802.1Q and QinQ, ARP, Ethernet padding, plus random
+synth.TrafficMix frames) is decoded by fastpath.parse() and by
+fastpath.parse_scapy(), and every HeaderView field must agree:
+PARSER_MODE=fast only hands the frames it rejects to Scapy, so both have
+to describe a frame the same way. The same frames cut short at random
+lengths must not crash parse_scapy(), and wherever parse() accepts a
+cut frame the two must agree there too. TCP/UDP headers cut short by
+the frame or by the IP length, and TCP data offsets below 5 or past the
+end, must be rejected by parse() and described by parse_scapy() like a
+non-first fragment (no l4_off or ports, payload right after L3). Exits
+non-zero on any difference. No docker needed.
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+import fastpath
+import synth
+from scapy.all import (Ether, Dot1Q, IP, IPv6, IPv6ExtHdrHopByHop, IPv6ExtHdrRouting,
+                       IPv6ExtHdrDestOpt, IPv6ExtHdrFragment, ICMP, ICMPv6EchoRequest,
+                       TCP, UDP, GRE, ESP, ARP, Raw)
+
+FIELDS = ("vlan", "ethertype", "l3_off", "version", "ip_id", "proto", "src", "dst",
+          "l4_off", "sport", "dport", "payload_off")
+SRC_MAC, DST_MAC = "02:42:0a:01:00:15", "02:42:0a:00:00:15"
+
+
+def build_corpus():
+    eth = Ether(src=SRC_MAC, dst=DST_MAC)
+    v4 = IP(src="10.1.0.21", dst="10.0.0.21")
+    v6 = IPv6(src="fd00::1", dst="fd00::2")
+    frames = [
+        eth / IP(dst="10.0.0.21", id=ord("S"), flags="DF") / ICMP() / "CovertChannel:S",
+        eth / v4 / ICMP(type=0) / ("x" * 56),
+        eth / v4 / TCP(sport=40000, dport=80, flags="PA") / ("y" * 200),
+        eth / v4 / TCP(sport=40000, dport=443, options=[("MSS", 1460), ("WScale", 7),
+                                                         ("SAckOK", b""), ("NOP", None)]) / "opts",
+        eth / v4 / UDP(sport=5000, dport=8888) / "Hello, InSecureNet!",
+        eth / v4 / UDP(sport=53, dport=53),                      # padded to 60 bytes
+        eth / IP(src="10.1.0.21", dst="10.0.0.21", options=[b"\x94\x04\x00\x00"]) / UDP() / "ra",
+        eth / v4 / GRE() / IP(dst="192.0.2.1") / UDP() / "gre",
+        eth / v4 / ESP(spi=1, seq=1) / ("e" * 32),
+        eth / IP(src="10.1.0.21", dst="10.0.0.21", proto=132) / ("s" * 40),  # SCTP as raw bytes
+        eth / IP(src="10.1.0.21", dst="10.0.0.21", flags="MF", frag=0) / UDP(sport=1, dport=2) / ("f" * 64),
+        eth / IP(src="10.1.0.21", dst="10.0.0.21", proto=17, frag=9) / ("g" * 64),
+        eth / Dot1Q(vlan=10) / v4 / UDP(sport=1, dport=2) / "vlan",
+        eth / Dot1Q(vlan=20) / Dot1Q(vlan=30) / v4 / TCP(sport=3, dport=4) / "qinq",
+        eth / Dot1Q(vlan=40) / ARP(),
+        eth / v6 / TCP(sport=443, dport=50000) / ("z" * 100),
+        eth / v6 / UDP(sport=546, dport=547) / "dhcpv6",
+        eth / v6 / ICMPv6EchoRequest(id=7, seq=1) / "ping6",
+        eth / v6 / GRE() / "gre6",
+        eth / v6 / IPv6ExtHdrHopByHop() / UDP(sport=9, dport=10) / "hbh",
+        eth / v6 / IPv6ExtHdrRouting() / IPv6ExtHdrDestOpt() / TCP(sport=11, dport=12) / "rt",
+        eth / v6 / IPv6ExtHdrFragment(nh=17, offset=0, m=1) / UDP(sport=13, dport=14) / ("h" * 48),
+        eth / v6 / IPv6ExtHdrFragment(nh=17, offset=6) / ("i" * 48),
+        eth / v6 / IPv6ExtHdrFragment(nh=58, offset=0) / ICMPv6EchoRequest() / "frag6",
+        eth / ARP(),
+        Ether(src=SRC_MAC, dst=DST_MAC, type=0x88B5) / Raw(bytes(16)),
+    ]
+    corpus = [bytes(f) for f in frames]
+    mix = synth.TrafficMix(flows=50, covert_ratio=0.2, insec_ratio=0.5, seed=7)
+    corpus += [next(mix)[1] for _ in range(200)]
+    return corpus
+
+
+def build_truncated_l4():
+    """(frame, L4 offset) pairs whose TCP/UDP header does not fit."""
+    eth = Ether(src=SRC_MAC, dst=DST_MAC)
+    v4 = IP(src="10.1.0.21", dst="10.0.0.21")
+    v6 = IPv6(src="fd00::1", dst="fd00::2")
+    v4_l4, v6_l4 = 14 + 20, 14 + 40
+    tcp = bytes(eth / v4 / TCP(sport=40000, dport=80) / ("y" * 40))
+    udp = bytes(eth / v4 / UDP(sport=5000, dport=8888) / ("u" * 40))
+    tcp6 = bytes(eth / v6 / TCP(sport=443, dport=50000) / ("z" * 40))
+    udp6 = bytes(eth / v6 / UDP(sport=546, dport=547) / ("d" * 40))
+    hbh6 = bytes(eth / v6 / IPv6ExtHdrHopByHop() / TCP(sport=9, dport=10) / ("h" * 40))
+    return [
+        (tcp[:v4_l4 + 12], v4_l4),                                         # frame ends in TCP
+        (bytes(eth / IP(src="10.1.0.21", dst="10.0.0.21", len=20 + 12)
+               / TCP(sport=1, dport=2) / ("y" * 40)), v4_l4),             # IP length ends in TCP
+        (bytes(eth / v4 / TCP(sport=3, dport=4, dataofs=15) / "short"), v4_l4),  # options past end
+        (bytes(eth / v4 / TCP(sport=5, dport=6, dataofs=3) / ("y" * 40)), v4_l4),
+        (udp[:v4_l4 + 4], v4_l4),
+        (bytes(eth / IP(src="10.1.0.21", dst="10.0.0.21", len=20 + 6)
+               / UDP(sport=7, dport=8) / ("u" * 40)), v4_l4),
+        (tcp6[:v6_l4 + 19], v6_l4),
+        (bytes(eth / IPv6(src="fd00::1", dst="fd00::2", plen=10)
+               / TCP(sport=11, dport=12) / ("z" * 40)), v6_l4),
+        (udp6[:v6_l4 + 6], v6_l4),
+        (hbh6[:v6_l4 + 8 + 16], v6_l4 + 8),
+    ]
+
+
+def fragment_like(data, l4):
+    """Problems with parse/parse_scapy on a frame whose L4 header does not fit."""
+    problems = []
+    if fastpath.parse(data) is not None:
+        problems.append("parse() accepted it")
+    view = fastpath.parse_scapy(data)
+    got = (view.l4_off, view.sport, view.dport, view.payload_off)
+    if got != (None, 0, 0, l4):
+        problems.append(f"parse_scapy gave l4_off={got[0]} ports={got[1]}->{got[2]} "
+                        f"payload_off={got[3]}, want no L4 and payload_off={l4}")
+    return problems
+
+
+def differences(data):
+    fast = fastpath.parse(data)
+    slow = fastpath.parse_scapy(data)
+    if fast is None:
+        return None
+    diffs = []
+    for name in FIELDS:
+        a, b = getattr(fast, name), getattr(slow, name)
+        if isinstance(a, memoryview):
+            a, b = bytes(a), bytes(b)
+        if a != b:
+            diffs.append(f"{name}: fast={a!r} scapy={b!r}")
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fastpath.parse vs. parse_scapy")
+    parser.add_argument("--cuts", type=int, default=5, help="truncated copies per frame")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    corpus = build_corpus()
+    compared = mismatched = truncated = rejected = 0
+    for data in corpus:
+        cases = [(data, "full")]
+        cases += [(data[:rng.randrange(1, len(data))], "cut") for _ in range(args.cuts)]
+        for frame, kind in cases:
+            try:
+                diffs = differences(frame)
+            except Exception as e:
+                print(f"parse_scapy raised on a {kind} {len(frame)}-byte frame: {e!r}")
+                mismatched += 1
+                continue
+            truncated += kind == "cut"
+            if diffs is None:
+                rejected += 1
+                if kind == "full":
+                    print(f"fast path rejected a full frame: {frame.hex()}")
+                    mismatched += 1
+                continue
+            compared += 1
+            if diffs:
+                mismatched += 1
+                print(f"{kind} frame {fastpath.parse(frame)!r}:")
+                for line in diffs:
+                    print(f"    {line}")
+
+    cut_l4 = build_truncated_l4()
+    for frame, l4 in cut_l4:
+        problems = fragment_like(frame, l4)
+        if problems:
+            mismatched += 1
+            print(f"truncated L4 {frame.hex()}:")
+            for line in problems:
+                print(f"    {line}")
+
+    print(f"{len(corpus)} frames + {truncated} truncated copies + {len(cut_l4)} truncated "
+          f"TCP/UDP headers: {compared} compared, {rejected} left to the Scapy fallback, "
+          f"{mismatched} mismatches")
+    ok = mismatched == 0
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
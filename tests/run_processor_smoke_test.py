@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Startup smoke test for the python-processor (main.py) with its
+Prometheus exporter enabled.
+
+Starts main.py against a NATS server with METRICS_PORT set, waits until
+/metrics answers, forwards one frame inpktsec → outpktinsec, checks that
+the scrape now counts it, and stops the processor with SIGTERM, which
+must end it cleanly (exit code 0). Catches anything that breaks
+start-up or shutdown, e.g. the exporter scraping the processor before
+its pipeline exists.
+
+Needs prometheus_client and a reachable NATS server, e.g. the compose
+one on localhost:4222 (`docker compose up -d nats`) or a local
+`nats-server`.
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from nats.aio.client import Client as NATS
+
+PROCESSOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "code", "python-processor")
+sys.path.insert(0, PROCESSOR_DIR)
+import synth
+
+
+def scrape(port):
+    """The /metrics text, or None while nothing answers."""
+    try:
+        with urllib.request.urlopen(f"http://localhost:{port}/metrics", timeout=1) as r:
+            return r.read().decode()
+    except OSError:
+        return None
+
+
+async def forward_one(nats_url, timeout):
+    """Publish one frame on inpktsec; True once it comes back on outpktinsec."""
+    nc = NATS()
+    await nc.connect(nats_url)
+    done = asyncio.Event()
+
+    async def on_out(msg):
+        done.set()
+
+    await nc.subscribe("outpktinsec", cb=on_out)
+    frame = synth.ipv4_frame("10.1.0.21", "10.0.0.21", synth.PROTO_UDP, 5000, 8888, b"smoke")
+    await nc.publish("inpktsec", frame)
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    await nc.close()
+    return done.is_set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="python-processor startup smoke test")
+    parser.add_argument("--nats", default="nats://localhost:4222")
+    parser.add_argument("--metrics-port", type=int, default=18000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="smoke-")
+    log_path = os.path.join(workdir, "processor.log")
+    env = dict(os.environ, NATS_SURVEYOR_SERVERS=args.nats, METRICS_PORT=str(args.metrics_port),
+               MEAN_DELAY_MS="0", NATS_MONITOR_URL="", RESULTS_DIR=workdir)
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(PROCESSOR_DIR, "main.py")],
+                                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    checks = {}
+    try:
+        deadline = time.monotonic() + args.timeout
+        text = None
+        while text is None and proc.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.2)
+            text = scrape(args.metrics_port)
+        checks["/metrics answers"] = text is not None
+        if text is not None:
+            checks["frame forwarded"] = asyncio.run(forward_one(args.nats, 5.0))
+            text = scrape(args.metrics_port) or ""
+            checks["scrape counts it"] = 'processor_packets_in_total{subject="inpktsec"} 1.0' in text
+    finally:
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+        try:
+            code = proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            code = proc.wait()
+    checks["clean shutdown"] = code == 0
+
+    for name, ok in checks.items():
+        print(f"{name:>18}: {'ok' if ok else 'FAILED'}")
+    ok = all(checks.values()) and len(checks) == 4
+    if not ok:
+        with open(log_path) as f:
+            print(f"\nprocessor output ({log_path}):\n{f.read()}")
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
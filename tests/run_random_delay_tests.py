@@ -2,36 +2,33 @@ import subprocess
 import time
 import re
 import csv
+import json
+import sys
 import matplotlib.pyplot as plt
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agent_client import AgentClient, AgentError
+
 # List of mean delays (in milliseconds) to test.
 mean_delays = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 200]
 results = []
 
-# Path to the python processor file.
-processor_file = "code/python-processor/main.py"
+# Control client of the running processor (see code/python-processor/control.py)
+CONTROL = "/code/python-processor/control.py"
 
 
 # Standardized output directory name at the top level.
 OUTPUT_DIR = "TPPhase1_results"
 
-def update_mean_delay(new_delay):
-    """Update the MEAN_DELAY_MS value in the processor file."""
-    print(f"Updating MEAN_DELAY_MS to {new_delay} ms in {processor_file}")
-    with open(processor_file, "r") as f:
-        lines = f.readlines()
-    with open(processor_file, "w") as f:
-        for line in lines:
-            if line.strip().startswith("MEAN_DELAY_MS"):
-                f.write(f"MEAN_DELAY_MS = {new_delay}\n")
-            else:
-                f.write(line)
-
-def restart_processor():
-    """Restart the python-processor container using docker compose."""
-    print("Restarting python-processor container...")
-    subprocess.run(["docker", "compose", "restart", "python-processor"], check=True)
+def update_mean_delay(proc, new_delay):
+    """Switch the running processor to the new mean delay; no restart needed."""
+    print(f"Setting MEAN_DELAY_MS to {new_delay} ms")
+    reply = proc.exec(["python3", CONTROL, "--mean-delay-ms", str(new_delay)])
+    if reply["rc"] != 0:
+        raise AgentError({"error": reply["output"].strip()})
+    ack = json.loads(reply["output"].splitlines()[-1])
+    print(f"Processor at config version {ack['version']}")
 
 def run_ping_test():
     """Run a ping test in the 'sec' container and return the output."""
@@ -56,12 +53,13 @@ def parse_avg_rtt(ping_output):
 
 # Ensure the standard output directory exists.
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+proc = AgentClient("python-processor")
 
 for delay in mean_delays:
     print(f"\nTesting with MEAN_DELAY_MS = {delay}")
-    update_mean_delay(delay)
-    restart_processor()
-    time.sleep(15)
+    update_mean_delay(proc, delay)
+    # let frames delayed under the previous setting drain
+    time.sleep(1)
     
     ping_output = run_ping_test()
     avg_rtt = parse_avg_rtt(ping_output)
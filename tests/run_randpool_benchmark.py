@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Cost, distribution and reproducibility check for the processor's random pools.
+
+  * cost per draw of random.uniform / random.randint / random.getrandbits
+    vs. a randpool.RandomPool (background refill);
+  * sample mean of every DELAY_DIST distribution vs. the configured
+    mean (uniform: mean/2, since it is U(0, MEAN_DELAY_MS));
+  * two pools with the same RANDOM_SEED must yield identical sequences
+    across many block refills, with and without the refill thread.
+
+Exits non-zero if a distribution is off by more than 2% or a seeded
+sequence differs. No docker needed.
+"""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "code", "python-processor"))
+from randpool import DISTRIBUTIONS, make_delay_pool, make_ip_id_pool, seed_for
+
+OUTPUT_DIR = "benchmark_results"
+
+
+def ns_per_call(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Random pool benchmark")
+    parser.add_argument("--draws", type=int, default=1_000_000)
+    parser.add_argument("--mean-delay-ms", type=float, default=200)
+    parser.add_argument("--block", type=int, default=65536)
+    args = parser.parse_args()
+    failed = False
+    results = []
+
+    mean = args.mean_delay_ms / 1000.0
+    pool = make_delay_pool("uniform", args.mean_delay_ms, block=args.block)
+    ids = make_ip_id_pool(block=args.block)
+    rows = [
+        ("delay", "random.uniform", ns_per_call(lambda: random.uniform(0, mean), args.draws)),
+        ("delay", "RandomPool.draw", ns_per_call(pool.draw, args.draws)),
+        ("ip_id", "random.randint", ns_per_call(lambda: random.randint(0, 0xFFFF), args.draws)),
+        ("ip_id", "random.getrandbits", ns_per_call(lambda: random.getrandbits(16), args.draws)),
+        ("ip_id", "RandomPool.getrandbits", ns_per_call(lambda: ids.getrandbits(16), args.draws)),
+    ]
+    pool.close()
+    ids.close()
+    print(f"{'value':>6} {'source':>24} {'ns/draw':>8}")
+    for value, source, ns in rows:
+        print(f"{value:>6} {source:>24} {ns:>8.1f}")
+        results.append((value, source, round(ns, 1)))
+
+    print(f"\n{'dist':>12} {'expected ms':>12} {'sample ms':>10}")
+    for dist in DISTRIBUTIONS:
+        p = make_delay_pool(dist, args.mean_delay_ms, block=args.block, seed=1)
+        sample = [p.draw() for _ in range(args.draws)]
+        p.close()
+        expected = args.mean_delay_ms / (2 if dist == "uniform" else 1)
+        got = sum(sample) / len(sample) * 1000
+        ok = abs(got - expected) <= 0.02 * expected and min(sample) >= 0
+        failed |= not ok
+        print(f"{dist:>12} {expected:>12.1f} {got:>10.1f}{'' if ok else '  MISMATCH'}")
+
+    n = 5 * args.block + 123
+    seqs = []
+    for prefetch in (2, 2, 0):
+        p = make_delay_pool("exponential", args.mean_delay_ms, block=args.block,
+                            prefetch=prefetch, seed=seed_for(42, "delay", 0))
+        seqs.append([p.draw() for _ in range(n)])
+        p.close()
+    other = make_delay_pool("exponential", args.mean_delay_ms, block=args.block,
+                            prefetch=0, seed=seed_for(42, "delay", 1))
+    reproducible = seqs[0] == seqs[1] == seqs[2]
+    independent = other.draw() != seqs[0][0]
+    failed |= not (reproducible and independent)
+    print(f"\nseeded sequences over {n} draws: "
+          f"{'identical' if reproducible else 'DIFFER'}; other shard "
+          f"{'independent' if independent else 'SAME'}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_path = os.path.join(OUTPUT_DIR, "randpool_benchmark.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["value", "source", "ns_per_draw"])
+        writer.writerows(results)
+    print(f"Results saved to {csv_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Loss vs. offered rate of the covert receiver backends.
+
+Sends covert packets with code/sec/covert_sender.py's raw mode to
+127.0.0.1 at increasing rates while code/insec/covert_receiver.py
+captures on the loopback interface, once with the AF_PACKET ring
+backend and once with the Scapy sniff() fallback. On loopback nothing
+else is in the path, so any missing packet was lost by the receiver.
+
+Needs root (raw and packet sockets), Scapy and matplotlib; the Scapy
+backend also needs tcpdump to compile its capture filter. The insec
+container has neither /tests nor code/sec mounted and no matplotlib, so
+run it on a Linux host from the repository root:
+    sudo python3 tests/run_receiver_benchmark.py
+Results go to receiver_results/<timestamp>/ in the current directory.
+"""
+import os
+import re
+import sys
+import csv
+import math
+import time
+import argparse
+import subprocess
+import matplotlib.pyplot as plt
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODE = os.path.join(HERE, "..", "code")
+sys.path.insert(0, os.path.join(CODE, "sec"))
+from covert_sender import send_covert_data_raw
+
+RECEIVER = os.path.join(CODE, "insec", "covert_receiver.py")
+RESULTS_ROOT = "receiver_results"
+MESSAGE = "Secret: Operation Mincemeat"
+RATES = [100, 500, 1000, 2000, 5000, 10000, 20000]   # packets/s
+BACKENDS = ["scapy", "ring"]
+
+
+def run_one(backend, rate, duration, head_start):
+    repeat = max(1, math.ceil(rate * duration / len(MESSAGE)))
+    expected = repeat * len(MESSAGE)
+    recv = subprocess.Popen(
+        [sys.executable, RECEIVER, "--iface", "lo", "--count", str(expected),
+         "--backend", backend, "--quiet", "--timeout", str(duration + head_start + 5)],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    time.sleep(head_start)
+    sent, elapsed, _late = send_covert_data_raw("127.0.0.1", MESSAGE, 1.0 / rate, repeat=repeat)
+    out, _ = recv.communicate()
+    m = re.search(r"Captured (\d+) covert packets \((\w+)(?:, (\d+) kernel drops)?", out)
+    if not m:
+        print(out)
+        return sent, sent / elapsed, 0, "", None
+    drops = int(m.group(3)) if m.group(3) else None
+    return sent, sent / elapsed, int(m.group(1)), m.group(2), drops
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Covert receiver loss vs. rate")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of traffic per rate")
+    parser.add_argument("--head-start", type=float, default=2.0, help="receiver start-up time (s)")
+    parser.add_argument("--rates", type=int, nargs="+", default=RATES)
+    args = parser.parse_args()
+
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(RESULTS_ROOT, ts)
+    os.makedirs(run_dir, exist_ok=True)
+
+    rows = []
+    print(f"{'backend':>8} {'rate':>7} {'achieved':>9} {'sent':>7} {'captured':>9} {'loss %':>7} {'drops':>6}")
+    for backend in BACKENDS:
+        for rate in args.rates:
+            sent, achieved, got, used, drops = run_one(backend, rate, args.duration, args.head_start)
+            loss = 100.0 * (1 - got / sent)
+            rows.append((backend, used, rate, round(achieved), sent, got, round(loss, 2),
+                         "" if drops is None else drops))
+            print(f"{backend:>8} {rate:>7} {achieved:>9.0f} {sent:>7} {got:>9} {loss:>7.2f} "
+                  f"{'' if drops is None else drops:>6}")
+            if used and used != backend:
+                print(f"  (receiver fell back to {used})")
+
+    csv_path = os.path.join(run_dir, "receiver_loss.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Backend", "Backend Used", "Offered Rate (pps)", "Achieved Rate (pps)",
+                         "Sent", "Captured", "Loss (%)", "Kernel Drops"])
+        writer.writerows(rows)
+    print(f"  → CSV written to {csv_path}")
+
+    plt.figure()
+    for backend in BACKENDS:
+        pts = [(r[3], r[6]) for r in rows if r[0] == backend]
+        plt.plot(*zip(*pts), "o-", label=backend)
+    plt.xscale("log")
+    plt.xlabel("Offered rate (packets/s)")
+    plt.ylabel("Receiver loss (%)")
+    plt.title("Covert receiver loss vs. rate (loopback)")
+    plt.legend()
+    plt.grid(True)
+    plot_path = os.path.join(run_dir, "receiver_loss.png")
+    plt.savefig(plot_path)
+    plt.close()
+    print(f"  → Plot saved to {plot_path}")
+
+
+if __name__ == "__main__":
+    main()
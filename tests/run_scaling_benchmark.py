@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the sharded python-processor (launcher.py).
+
+For each worker count (1 included), starts the launcher against a NATS
+server, pushes a burst of frames spread over many flows into inpktsec
+and counts what comes back on outpktinsec. Reports delivered pps per
+worker count. The random delay is off (MEAN_DELAY_MS=0) and the delay
+queue holds the whole burst, so the numbers are processing throughput.
+
+With --partitions P (default 64), frames are published the way the
+switch does with FLOW_PARTITIONS=P, on "inpktsec.<p>"
+(launcher.flow_partition), and the workers subscribe to their
+partitions. --partitions 0 measures launcher.py's relay instead.
+
+Needs a reachable NATS server, e.g. the compose one on localhost:4222
+(`docker compose up -d nats`) or a local `nats-server`.
+"""
+import os
+import sys
+import csv
+import time
+import signal
+import asyncio
+import tempfile
+import argparse
+import subprocess
+from nats.aio.client import Client as NATS
+from scapy.all import Ether, IP, UDP
+
+PROCESSOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "code", "python-processor")
+LAUNCHER = os.path.join(PROCESSOR_DIR, "launcher.py")
+sys.path.insert(0, PROCESSOR_DIR)
+from launcher import flow_partition
+OUTPUT_DIR = "benchmark_results"
+
+
+def build_frames(flows, size, partitions):
+    """(subject, frame) per flow; partitioned like the switch when `partitions`."""
+    pad = b"x" * size
+    frames = [bytes(Ether() / IP(src=f"10.1.{i // 250}.{i % 250 + 1}", dst="10.0.0.21")
+                    / UDP(sport=10000 + i, dport=8888) / pad)
+              for i in range(flows)]
+    return [(f"inpktsec.{flow_partition(f, partitions)}" if partitions else "inpktsec", f)
+            for f in frames]
+
+
+async def measure(nats_url, frames, count, idle_timeout, probe_subject):
+    nc = NATS()
+    await nc.connect(nats_url)
+    received = 0
+    last_recv = 0.0
+    ready = asyncio.Event()
+
+    async def on_out(msg):
+        nonlocal received, last_recv
+        if msg.data.endswith(b"probe"):
+            ready.set()
+            return
+        received += 1
+        last_recv = time.perf_counter()
+
+    await nc.subscribe("outpktinsec", cb=on_out)
+
+    # wait until the workers are up: non-IP probes go through shard 0
+    probe = bytes(Ether(type=0x88B5)) + b"probe"
+    deadline = time.monotonic() + 30
+    while not ready.is_set():
+        if time.monotonic() > deadline:
+            raise RuntimeError("processor did not come up within 30s")
+        await nc.publish(probe_subject, probe)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+    await asyncio.sleep(1)  # let any late probes drain
+
+    start = time.perf_counter()
+    for i in range(count):
+        subject, frame = frames[i % len(frames)]
+        await nc.publish(subject, frame)
+        if i % 1000 == 999:
+            await nc.flush()
+    await nc.flush()
+
+    previous = -1
+    while received != previous and received < count:
+        previous = received
+        await asyncio.sleep(idle_timeout)
+    await nc.close()
+    elapsed = (last_recv or time.perf_counter()) - start
+    return received, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="python-processor scaling benchmark")
+    parser.add_argument("--nats", default="nats://localhost:4222")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--count", type=int, default=50000, help="Frames per run")
+    parser.add_argument("--flows", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=64, help="Payload bytes")
+    parser.add_argument("--partitions", type=int, default=64,
+                        help="flow partitions, as FLOW_PARTITIONS on the switch (0: launcher relay)")
+    args = parser.parse_args()
+
+    frames = build_frames(args.flows, args.size, args.partitions)
+    # non-IP frames are in partition 0
+    probe_subject = "inpktsec.0" if args.partitions else "inpktsec"
+    worker_counts = sorted({1, *[n for n in (2, 4, 8, 16, 32) if n <= args.max_workers],
+                            args.max_workers})
+    if args.partitions:
+        worker_counts = [n for n in worker_counts if n <= args.partitions]
+    env = dict(os.environ, NATS_SURVEYOR_SERVERS=args.nats, LOG_INTERVAL_MS="5000",
+               MEAN_DELAY_MS="0", DELAY_QUEUE_MAX=str(args.count), METRICS_PORT="0",
+               FLOW_PARTITIONS=str(args.partitions))
+    results = []
+    for workers in worker_counts:
+        print(f"\n▶️  {workers} worker(s)")
+        workdir = tempfile.mkdtemp(prefix="scaling-")
+        proc = subprocess.Popen([sys.executable, LAUNCHER, "--workers", str(workers)],
+                                cwd=workdir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            received, elapsed = asyncio.run(measure(args.nats, frames, args.count, 2.0,
+                                                    probe_subject))
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        pps = received / elapsed if elapsed > 0 else 0.0
+        print(f"   delivered {received}/{args.count} in {elapsed:.2f}s → {pps:,.0f} pps")
+        results.append((workers, received, round(elapsed, 3), round(pps)))
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_path = os.path.join(OUTPUT_DIR, "scaling_benchmark.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["workers", "delivered", "elapsed_s", "pps"])
+        writer.writerows(results)
+    print(f"\nResults saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()